@@ -11,7 +11,11 @@ from output import OutputLoader
 from storage.loader import StorageBackendLoader
 from storage.memcache_proxy import MemcacheProxy
 
-def get_storage(storage_type, nodes_uri, classes_uri, **kwargs):
+def get_storage(storage_type, nodes_uri, classes_uri, cache_dir=None,
+                **kwargs):
+    # only the storage backends that parse files take a cache directory
+    if cache_dir is not None:
+        kwargs['cache_dir'] = cache_dir
     storage_class = StorageBackendLoader(storage_type).load()
     return MemcacheProxy(storage_class(nodes_uri, classes_uri, **kwargs))
 
@@ -20,3 +24,17 @@ def output(data, fmt, pretty_print=False):
     output_class = OutputLoader(fmt).load()
     outputter = output_class()
     return outputter.dump(data, pretty_print=pretty_print)
+
+
+def output_to(stream, data, fmt, pretty_print=False, **kwargs):
+    '''
+    Writes the same document as output() returns to the stream, incrementally
+    if the outputter supports it.
+    '''
+    loader = OutputLoader(fmt)
+    try:
+        outputter = loader.load('StreamingOutputter')()
+    except AttributeError:
+        stream.write(output(data, fmt, pretty_print))
+        return
+    outputter.dump_to(data, stream, pretty_print=pretty_print, **kwargs)
@@ -12,11 +12,16 @@
 #
 
 import os, sys, posix, optparse
+from hashlib import sha1
 
-from reclass import get_storage, output
+from reclass import get_storage, output_to
 from reclass.core import Core
-from reclass.errors import ReclassException
+from reclass.snapshot import make_settings, write_snapshot, SnapshotStore
+from reclass.daemon import DaemonClient
+from reclass.errors import ReclassException, SnapshotError
 from reclass.config import find_and_read_configfile, get_options
+from reclass.defaults import OPT_LIST_CACHE_DIR
+from reclass.utils.privatedir import make_private_dir
 from reclass.version import *
 from reclass.constants import MODE_NODEINFO
 
@@ -30,6 +35,38 @@ def node_to_node(nodeinfo):
         nodeinfo['parameters']['__reclass__'][i] = nodeinfo[i]
     return nodeinfo['parameters']
 
+def list_cache_path(directory, settings):
+    """
+    return the path of the snapshot caching the inventory of --list for the
+    given settings, or None if the directory cannot be created, or is not
+    private to the current user (snapshots are pickles)
+    """
+    directory = os.path.abspath(os.path.expanduser(directory))
+    try:
+        reason = make_private_dir(directory)
+    except OSError, e:
+        reason = e.strerror
+    if reason is not None:
+        print >>sys.stderr, 'Cannot cache the inventory in {0}: {1}' \
+                .format(directory, reason)
+        return None
+    key = sha1(repr(sorted(settings.items()))).hexdigest()
+    return os.path.join(directory, 'ansible-{0}.snapshot'.format(key))
+
+def write_list_cache(path, storage, class_mappings, settings, jobs):
+    """
+    compile the inventory into the snapshot at path and return it, or None
+    if the snapshot cannot be written
+    """
+    try:
+        return write_snapshot(path, storage, class_mappings, settings, jobs)
+    except SnapshotError, e:
+        print >>sys.stderr, e.message
+    except (IOError, OSError), e:
+        print >>sys.stderr, 'Cannot write snapshot {0}: {1}'.format(
+            path, e.strerror)
+    return None
+
 def cli():
     try:
         # this adapter has to be symlinked to ansible_dir, so we can use this
@@ -53,6 +90,12 @@ def cli():
                              default=defaults.get('applications_postfix'),
                              help='postfix to append to applications to '\
                                   'turn them into groups')
+            group.add_option('--list-cache-dir', dest='list_cache_dir',
+                             default=defaults.get('list_cache_dir',
+                                                  OPT_LIST_CACHE_DIR),
+                             help='directory to cache the inventory of '\
+                                  '--list in, for --host to answer from '\
+                                  '(empty to not cache) [%default]')
             parser.add_option_group(group)
 
         options = get_options(RECLASS_NAME, VERSION, DESCRIPTION,
@@ -66,16 +109,42 @@ def cli():
                               add_options_cb=add_ansible_options_group,
                               defaults=defaults)
 
-        storage = get_storage(options.storage_type, options.nodes_uri,
-                              options.classes_uri)
         class_mappings = defaults.get('class_mappings')
         no_meta = defaults.get('no_meta')
-        reclass = Core(storage, class_mappings)
+        storage = get_storage(options.storage_type, options.nodes_uri,
+                              options.classes_uri,
+                              cache_dir=options.cache_dir)
+        settings = make_settings(options.storage_type, options.nodes_uri,
+                                 options.classes_uri, class_mappings)
+        snapshot = list_cache = None
+        if options.snapshot:
+            snapshot = SnapshotStore(options.snapshot, settings)
+        elif options.list_cache_dir:
+            path = list_cache_path(options.list_cache_dir, settings)
+            if path is not None:
+                # the cache is missing or stale until the next --list, which
+                # is nothing to complain about
+                snapshot = list_cache = SnapshotStore(path, settings,
+                                                      quiet=True)
+        daemon = DaemonClient(options.socket, settings)
+        reclass = Core(storage, class_mappings, jobs=options.jobs,
+                       snapshot=snapshot, daemon=daemon)
 
+        # the host_vars of the inventory are written to the output one by one
+        nodes_path = None
         if options.mode == MODE_NODEINFO:
             data = node_to_node(reclass.nodeinfo(options.hostname))
         else:
-            data = reclass.inventory()
+            data = None
+            if list_cache is not None and list_cache.get() is None:
+                # a running daemon answers the --host calls just as well
+                data = daemon.inventory()
+                if data is None:
+                    data = write_list_cache(list_cache.path, storage,
+                                            class_mappings, settings,
+                                            options.jobs)
+            if data is None:
+                data = reclass.inventory()
             # Ansible inventory is only the list of groups. Groups are the set
             # of classes plus the set of applications with the postfix added:
             groups = data['classes']
@@ -94,8 +163,11 @@ def cli():
                     hostvars[node] = node_to_node(nodeinfo)
                 data = groups
                 data['_meta'] = {'hostvars': hostvars}
+                nodes_path = ('_meta', 'hostvars')
 
-        print output(data, options.output, options.pretty_print)
+        output_to(sys.stdout, data, options.output, options.pretty_print,
+                  nodes_path=nodes_path)
+        sys.stdout.write('\n')
 
     except ReclassException, e:
         e.exit_with_message(sys.stderr)
@@ -9,8 +9,11 @@
 
 import os, sys, posix
 
-from reclass import get_storage, output
+from reclass import get_storage, output_to
 from reclass.core import Core
+from reclass.snapshot import make_settings, SnapshotStore
+from reclass.daemon import DaemonClient
+from reclass.utils.fingerprint import FingerprintWatch
 from reclass.errors import ReclassException
 from reclass.config import find_and_read_configfile, get_options, \
         path_mangler
@@ -18,43 +21,145 @@ from reclass.constants import MODE_NODEINFO
 from reclass.defaults import *
 from reclass.version import *
 
+# the storage, a watch of its fingerprint and the Core for every set of
+# arguments the adapter has been called with in this process, so that the
+# classes are only read and merged once when the pillar of many minions is
+# refreshed. The fingerprint is only checked once a second (see
+# FingerprintWatch), rather than for every minion
+_reclass_cache = {}
+
+def _make_core(storage, storage_type, nodes_uri, classes_uri, class_mappings,
+               jobs, snapshot, socket):
+    settings = make_settings(storage_type, nodes_uri, classes_uri,
+                             class_mappings, default_environment='base')
+    if snapshot is not None:
+        snapshot = SnapshotStore(snapshot, settings)
+    return Core(storage, class_mappings, jobs=jobs, snapshot=snapshot,
+                daemon=DaemonClient(socket, settings))
+
+
+def _get_reclass(storage_type, nodes_uri, classes_uri, class_mappings,
+                 input_data, jobs, cache_dir, snapshot, socket):
+    key = (storage_type, nodes_uri, classes_uri, tuple(class_mappings or ()),
+           jobs, cache_dir, snapshot, socket)
+    cached = _reclass_cache.get(key)
+    if cached is not None and cached[1].changed_paths():
+        # files have changed, added or removed since, so start over
+        cached = None
+    if cached is None:
+        storage = get_storage(storage_type, nodes_uri, classes_uri,
+                              default_environment='base', cache_dir=cache_dir)
+        try:
+            cached = [storage, FingerprintWatch(storage.fingerprint()), None]
+        except NotImplementedError:
+            # changes could not be noticed, so nothing is kept
+            _reclass_cache.pop(key, None)
+            cached = [storage, None, None]
+        else:
+            _reclass_cache[key] = cached
+    storage, watch, core = cached
+
+    if input_data is not None:
+        # snapshots and the daemon know nothing about the pillar data, which
+        # differs from one minion to the next
+        return Core(storage, class_mappings, input_data=input_data, jobs=jobs)
+    if core is None or core.has_mutators():
+        # Core applies the mutators of all nodes resolved so far, so one
+        # that has come across mutators cannot be used for other nodes
+        core = cached[2] = _make_core(storage, storage_type, nodes_uri,
+                                      classes_uri, class_mappings, jobs,
+                                      snapshot, socket)
+    return core
+
+
+def _get_pillar(minion_id, data):
+    params = data.get('parameters', {})
+    params['__reclass__'] = {}
+    params['__reclass__']['nodename'] = minion_id
+    params['__reclass__']['applications'] = data['applications']
+    params['__reclass__']['classes'] = data['classes']
+    params['__reclass__']['environment'] = data['environment']
+    return params
+
+
 def ext_pillar(minion_id, pillar,
                storage_type=OPT_STORAGE_TYPE,
                inventory_base_uri=OPT_INVENTORY_BASE_URI,
                nodes_uri=OPT_NODES_URI,
                classes_uri=OPT_CLASSES_URI,
                class_mappings=None,
-               propagate_pillar_data_to_reclass=False):
+               propagate_pillar_data_to_reclass=False,
+               jobs=OPT_JOBS,
+               cache_dir=OPT_CACHE_DIR,
+               snapshot=OPT_SNAPSHOT,
+               socket=OPT_SOCKET):
 
     nodes_uri, classes_uri = path_mangler(inventory_base_uri,
                                           nodes_uri, classes_uri)
-    storage = get_storage(storage_type, nodes_uri, classes_uri,
-                          default_environment='base')
     input_data = None
     if propagate_pillar_data_to_reclass:
         input_data = pillar
-    reclass = Core(storage, class_mappings, input_data=input_data)
+    reclass = _get_reclass(storage_type, nodes_uri, classes_uri,
+                           class_mappings, input_data, jobs, cache_dir,
+                           snapshot, socket)
+
+    return _get_pillar(minion_id, reclass.nodeinfo(minion_id))
+
+
+def ext_pillar_many(minion_ids, pillars=None,
+                    storage_type=OPT_STORAGE_TYPE,
+                    inventory_base_uri=OPT_INVENTORY_BASE_URI,
+                    nodes_uri=OPT_NODES_URI,
+                    classes_uri=OPT_CLASSES_URI,
+                    class_mappings=None,
+                    propagate_pillar_data_to_reclass=False,
+                    jobs=OPT_JOBS,
+                    cache_dir=OPT_CACHE_DIR,
+                    snapshot=OPT_SNAPSHOT,
+                    socket=OPT_SOCKET):
+    '''
+    Returns a dictionary of what ext_pillar() returns for each of the
+    minions, resolving them together. pillars maps the minion IDs to their
+    pillar data, which is only needed with propagate_pillar_data_to_reclass.
+    '''
+    if propagate_pillar_data_to_reclass:
+        # the pillar data of every minion goes into its own Core
+        pillars = pillars or {}
+        return dict((minion_id,
+                     ext_pillar(minion_id, pillars.get(minion_id, {}),
+                                storage_type=storage_type,
+                                inventory_base_uri=inventory_base_uri,
+                                nodes_uri=nodes_uri,
+                                classes_uri=classes_uri,
+                                class_mappings=class_mappings,
+                                propagate_pillar_data_to_reclass=True,
+                                jobs=jobs,
+                                cache_dir=cache_dir,
+                                snapshot=snapshot,
+                                socket=socket))
+                    for minion_id in minion_ids)
 
-    data = reclass.nodeinfo(minion_id)
-    params = data.get('parameters', {})
-    params['__reclass__'] = {}
-    params['__reclass__']['nodename'] = minion_id
-    params['__reclass__']['applications'] = data['applications']
-    params['__reclass__']['classes'] = data['classes']
-    params['__reclass__']['environment'] = data['environment']
-    return params
+    nodes_uri, classes_uri = path_mangler(inventory_base_uri,
+                                          nodes_uri, classes_uri)
+    reclass = _get_reclass(storage_type, nodes_uri, classes_uri,
+                           class_mappings, None, jobs, cache_dir,
+                           snapshot, socket)
+    nodes = reclass.nodeinfo_many(minion_ids)
+    return dict((minion_id, _get_pillar(minion_id, data))
+                for minion_id, data in nodes.iteritems())
 
 
 def top(minion_id, storage_type=OPT_STORAGE_TYPE,
         inventory_base_uri=OPT_INVENTORY_BASE_URI, nodes_uri=OPT_NODES_URI,
         classes_uri=OPT_CLASSES_URI,
-        class_mappings=None):
+        class_mappings=None, jobs=OPT_JOBS, cache_dir=OPT_CACHE_DIR,
+        snapshot=OPT_SNAPSHOT, socket=OPT_SOCKET):
 
     nodes_uri, classes_uri = path_mangler(inventory_base_uri,
                                           nodes_uri, classes_uri)
-    storage = get_storage(storage_type, nodes_uri, classes_uri,
-                          default_environment='base')
-    reclass = Core(storage, class_mappings, input_data=None)
+    reclass = _get_reclass(storage_type, nodes_uri, classes_uri,
+                           class_mappings, None, jobs, cache_dir, snapshot,
+                           socket)
 
     if inventory_base_uri not in sys.path:
       sys.path.append(inventory_base_uri)
@@ -106,16 +211,25 @@ def cli():
                               inventory_base_uri=options.inventory_base_uri,
                               nodes_uri=options.nodes_uri,
                               classes_uri=options.classes_uri,
-                              class_mappings=class_mappings)
+                              class_mappings=class_mappings,
+                              jobs=options.jobs,
+                              cache_dir=options.cache_dir,
+                              snapshot=options.snapshot,
+                              socket=options.socket)
         else:
             data = top(minion_id=None,
                        storage_type=options.storage_type,
                        inventory_base_uri=options.inventory_base_uri,
                        nodes_uri=options.nodes_uri,
                        classes_uri=options.classes_uri,
-                       class_mappings=class_mappings)
-
-        print output(data, options.output, options.pretty_print)
+                       class_mappings=class_mappings,
+                       jobs=options.jobs,
+                       cache_dir=options.cache_dir,
+                       snapshot=options.snapshot,
+                       socket=options.socket)
+
+        output_to(sys.stdout, data, options.output, options.pretty_print)
+        sys.stdout.write('\n')
 
     except ReclassException, e:
         e.exit_with_message(sys.stderr)
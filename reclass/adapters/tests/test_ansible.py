@@ -0,0 +1,96 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass.adapters import ansible
+from reclass.core import Core
+from reclass.snapshot import make_settings
+from reclass.tests.inventory import InventoryTestCase
+import json, os, stat, sys
+from StringIO import StringIO
+import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+class TestListCache(InventoryTestCase):
+
+    def setUp(self):
+        super(TestListCache, self).setUp()
+        self._cache_dir = os.path.join(self._tmpdir, 'cache')
+
+    def _cli(self, *args):
+        argv = [os.path.join(self._tmpdir, 'hosts'), '--socket', '',
+                '--list-cache-dir', self._cache_dir] + list(args)
+        with mock.patch.object(sys, 'argv', argv), \
+                mock.patch('sys.stdout', new_callable=StringIO) as stdout:
+            with self.assertRaises(SystemExit):
+                ansible.cli()
+        return json.loads(stdout.getvalue())
+
+    def test_list_cache_path(self):
+        path = ansible.list_cache_path(self._cache_dir, self._settings)
+        self.assertEqual(os.path.dirname(path), self._cache_dir)
+        mode = os.stat(self._cache_dir).st_mode
+        self.assertEqual(stat.S_IMODE(mode), 0700)
+        settings = make_settings('yaml_fs', 'nodes', 'classes', None)
+        self.assertNotEqual(ansible.list_cache_path(self._cache_dir, settings),
+                            path)
+
+    def test_list_cache_path_error(self):
+        with mock.patch('sys.stderr', new_callable=StringIO):
+            path = ansible.list_cache_path(
+                    os.path.join(self._nodes_dir, 'node1.yml', 'cache'),
+                    self._settings)
+        self.assertIsNone(path)
+
+    def test_list_cache_path_writable_by_others(self):
+        os.mkdir(self._cache_dir)
+        os.chmod(self._cache_dir, 0777)
+        with mock.patch('sys.stderr', new_callable=StringIO) as stderr:
+            path = ansible.list_cache_path(self._cache_dir, self._settings)
+        self.assertIsNone(path)
+        self.assertIn('writable by other users', stderr.getvalue())
+
+    def test_host_untrusted_list_cache(self):
+        self._cli('--list')
+        os.chmod(self._cache_dir, 0777)
+        with mock.patch('sys.stderr', new_callable=StringIO), \
+                mock.patch('reclass.adapters.ansible.SnapshotStore') as store:
+            self.assertEqual(self._cli('--host', 'node1')['value'], 1)
+        self.assertFalse(store.called)
+
+    def test_write_list_cache(self):
+        path = ansible.list_cache_path(self._cache_dir, self._settings)
+        ret = ansible.write_list_cache(path, self._storage(), None,
+                                       self._settings, 1)
+        self.assertListEqual(ret['classes']['base'], ['node1'])
+        self.assertTrue(os.path.exists(path))
+
+    def test_write_list_cache_error(self):
+        path = os.path.join(self._tmpdir, 'missing', 'inventory.snapshot')
+        with mock.patch('sys.stderr', new_callable=StringIO) as stderr:
+            self.assertIsNone(ansible.write_list_cache(
+                    path, self._storage(), None, self._settings, 1))
+        self.assertIn(path, stderr.getvalue())
+
+    def test_host_from_list(self):
+        groups = self._cli('--list')
+        self.assertListEqual(groups['base'], ['node1'])
+        with mock.patch.object(Core, '_nodeinfo') as _nodeinfo:
+            hostvars = self._cli('--host', 'node1')
+        self.assertFalse(_nodeinfo.called)
+        self.assertEqual(hostvars['value'], 1)
+
+    def test_host_stale(self):
+        self._cli('--list')
+        self._write('classes/base.yml', 'parameters:\n  value: 22\n')
+        self.assertEqual(self._cli('--host', 'node1')['value'], 22)
+
+if __name__ == '__main__':
+    unittest.main()
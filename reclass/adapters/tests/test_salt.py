@@ -0,0 +1,118 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass import get_storage
+from reclass.adapters import salt
+from reclass.tests.inventory import InventoryTestCase
+from reclass.utils.fingerprint import CHECK_INTERVAL
+import os, time
+import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+class TestSaltAdapter(InventoryTestCase):
+
+    FILES = dict(InventoryTestCase.FILES, **{
+        'nodes/node2.yml': 'classes: [base]\nparameters:\n  own: 2\n',
+    })
+
+    def setUp(self):
+        super(TestSaltAdapter, self).setUp()
+        salt._reclass_cache.clear()
+
+    def tearDown(self):
+        salt._reclass_cache.clear()
+        super(TestSaltAdapter, self).tearDown()
+
+    def _ext_pillar(self, minion_id, pillar={}, **kwargs):
+        return salt.ext_pillar(minion_id, pillar,
+                               inventory_base_uri=self._tmpdir, socket='',
+                               **kwargs)
+
+    def test_ext_pillar(self):
+        ret = self._ext_pillar('node2')
+        self.assertEqual(ret['value'], 1)
+        self.assertEqual(ret['own'], 2)
+        self.assertEqual(ret['__reclass__']['applications'], ['app'])
+
+    def test_storage_reused(self):
+        with mock.patch('reclass.adapters.salt.get_storage',
+                        side_effect=get_storage) as get:
+            self._ext_pillar('node1')
+            self._ext_pillar('node2')
+            salt.top('node1', inventory_base_uri=self._tmpdir, socket='')
+        self.assertEqual(get.call_count, 1)
+
+    def test_classes_read_once(self):
+        self._ext_pillar('node1')
+        storage = salt._reclass_cache.values()[0][0]
+        with mock.patch.object(storage.real_storage, 'get_class') as get:
+            self._ext_pillar('node2')
+        self.assertFalse(get.called)
+
+    def test_changed_file(self):
+        self._ext_pillar('node1')
+        self._write('classes/base.yml', 'parameters:\n  value: 22\n')
+        self.assertEqual(self._ext_pillar('node1')['value'], 22)
+
+    def test_changes_checked_once_per_interval(self):
+        self._ext_pillar('node1')
+        self._ext_pillar('node1')
+        self._write('classes/base.yml', 'parameters:\n  value: 22\n')
+        with mock.patch('reclass.utils.fingerprint.stat_key') as stat_key:
+            self.assertEqual(self._ext_pillar('node2')['value'], 1)
+        self.assertFalse(stat_key.called)
+        later = time.time() + CHECK_INTERVAL + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual(self._ext_pillar('node2')['value'], 22)
+
+    def test_new_file(self):
+        self._ext_pillar('node1')
+        self._write('nodes/node3.yml', 'classes: [base]\n')
+        self.assertEqual(self._ext_pillar('node3')['value'], 1)
+
+    def test_pillar_data(self):
+        ret = self._ext_pillar('node1', {'pillar': 'data'},
+                               propagate_pillar_data_to_reclass=True)
+        self.assertEqual(ret['pillar'], 'data')
+        ret = self._ext_pillar('node1', {'pillar': 'data'})
+        self.assertNotIn('pillar', ret)
+
+    def test_mutators_not_shared(self):
+        core = salt._get_reclass('yaml_fs',
+                                 self._nodes_dir, self._classes_dir,
+                                 None, None, 1, None, None, '')
+        with mock.patch.object(core, 'has_mutators', return_value=True):
+            self._ext_pillar('node1')
+        self.assertIsNot(salt._reclass_cache.values()[0][2], core)
+
+    def test_ext_pillar_many(self):
+        ret = salt.ext_pillar_many(['node1', 'node2'],
+                                   inventory_base_uri=self._tmpdir, socket='')
+        for minion_id in ('node1', 'node2'):
+            salt._reclass_cache.clear()
+            expected = self._ext_pillar(minion_id)
+            self.assertDictEqual(ret[minion_id], expected)
+
+    def test_ext_pillar_many_pillar_data(self):
+        ret = salt.ext_pillar_many(['node1', 'node2'],
+                                   {'node1': {'pillar': 'data'}},
+                                   inventory_base_uri=self._tmpdir, socket='',
+                                   propagate_pillar_data_to_reclass=True)
+        self.assertEqual(ret['node1']['pillar'], 'data')
+        self.assertNotIn('pillar', ret['node2'])
+
+    def test_top(self):
+        ret = salt.top(None, inventory_base_uri=self._tmpdir, socket='')
+        self.assertDictEqual(ret, {'base': {'node1': ['app'],
+                                            'node2': ['app']}})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+
+from reclass.errors import ClassNotFound, ClassCycleError
+
+class AncestryIndex(object):
+    '''
+    Caches the transitive ancestry of classes.
+
+    For every class, the index holds the ordered, de-duplicated list of class
+    names that have to be merged to obtain the fully descended class: its
+    ancestors in the order in which the recursive descent would visit them,
+    followed by the class itself. The list of a class is computed from the
+    (cached) lists of its parents, so shared parts of the hierarchy are only
+    ever walked once, and the walk uses an explicit stack rather than
+    recursion, so that deep hierarchies cannot exhaust the interpreter stack.
+
+    Core uses the ancestry to tell whether a class can be merged fully
+    descended (see Core._get_descended()), and in which order the classes
+    are descended, and the URIs of the classes to track which nodes depend
+    on which files.
+    '''
+    def __init__(self, storage):
+        self._storage = storage
+        self._ancestry = {}
+        self._uris = {}
+
+    def __len__(self):
+        return len(self._ancestry)
+
+    def __contains__(self, classname):
+        return classname in self._ancestry
+
+    def _get_class(self, classname, nodename):
+        try:
+            return self._storage.get_class(classname)
+        except ClassNotFound as e:
+            e.set_nodename(nodename)
+            raise e
+
+    def _build(self, classname, nodename):
+        entity = self._get_class(classname, nodename)
+        stack = [(classname, entity, iter(entity.classes.as_list()))]
+        visiting = set([classname])
+        while stack:
+            klass, entity, parents = stack[-1]
+            for parent in parents:
+                if parent in self._ancestry:
+                    continue
+                if parent in visiting:
+                    path = [frame[0] for frame in stack]
+                    cycle = path[path.index(parent):] + [parent]
+                    raise ClassCycleError(cycle, nodename)
+                parent_entity = self._get_class(parent, nodename)
+                stack.append((parent, parent_entity,
+                              iter(parent_entity.classes.as_list())))
+                visiting.add(parent)
+                break
+
+            else:
+                # all parents have been indexed, so we can now compute the
+                # ancestry of the class on the top of the stack
+                stack.pop()
+                visiting.discard(klass)
+                self._ancestry[klass] = \
+                        tuple(self._merge_ancestries(entity.classes.as_list(),
+                                                     set())) + (klass,)
+                self._uris[klass] = entity.uri
+
+    def _merge_ancestries(self, classnames, seen):
+        # the recursive descent does not descend into classes it has already
+        # seen, which is equivalent to skipping seen classes in the (fully
+        # descended) ancestry of every class, because the ancestors of a seen
+        # class will have been seen as well
+        for classname in classnames:
+            for klass in self._ancestry[classname]:
+                if klass not in seen:
+                    seen.add(klass)
+                    yield klass
+
+    def get_ancestry(self, classname, nodename=None):
+        '''
+        Returns the names of the ancestors of the class, followed by the class
+        itself, in the order in which they need to be merged.
+        '''
+        if classname not in self._ancestry:
+            self._build(classname, nodename)
+        return self._ancestry[classname]
+
+    def get_uri(self, classname, nodename=None):
+        '''
+        Returns the URI of the class itself.
+        '''
+        if classname not in self._uris:
+            self._build(classname, nodename)
+        return self._uris[classname]
+
+    def iteruris(self):
+        '''
+        Iterates (classname, uri) pairs of all indexed classes.
+        '''
+        return self._uris.iteritems()
+
+    def invalidate(self, classnames):
+        '''
+        Drops the given classes from the index, as well as all classes that
+        inherit from any of them. Returns the names of all dropped classes.
+        '''
+        classnames = set(classnames)
+        dropped = set(klass for klass, ancestry in self._ancestry.iteritems()
+                      if not classnames.isdisjoint(ancestry))
+        dropped.update(classnames)
+        for klass in dropped:
+            self._ancestry.pop(klass, None)
+            self._uris.pop(klass, None)
+        return dropped
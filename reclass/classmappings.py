@@ -0,0 +1,141 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+
+import re
+import fnmatch
+import shlex
+import bisect
+from reclass.datatypes import Classes
+from reclass.errors import MappingFormatError
+
+GLOB_SPECIAL_CHARACTERS = '*?['
+
+class ClassMappings(object):
+    '''
+    Matches node names against the class mappings from the configuration.
+
+    The mappings are parsed once, when the instance is created: regular
+    expressions (enclosed in slashes) are compiled, globs are translated to
+    regular expressions, and globs without any wildcards are matched by
+    simple string comparison. Matching a node name is then a single pass over
+    the compiled mappings, which yields the mapped classes in the order of the
+    mappings.
+
+    match_all() matches many node names at once. It uses the literal prefix
+    of each glob to narrow down the candidate node names before matching.
+    '''
+    def __init__(self, mappings=None):
+        self._mappings = []
+        if mappings is not None:
+            for mapping in mappings:
+                self._mappings.append(ClassMappings._compile(mapping))
+
+    def __len__(self):
+        return len(self._mappings)
+
+    @staticmethod
+    def _shlex_split(instr):
+        lexer = shlex.shlex(instr, posix=True)
+        lexer.whitespace_split = True
+        lexer.commenters = ''
+        regexp = False
+        if instr[0] == '/':
+            lexer.quotes += '/'
+            lexer.escapedquotes += '/'
+            regexp = True
+        try:
+            key = lexer.get_token()
+        except ValueError, e:
+            raise MappingFormatError('Error in mapping "{0}": missing closing '
+                                     'quote (or slash)'.format(instr))
+        if regexp:
+            key = '/{0}/'.format(key)
+        return key, list(lexer)
+
+    @staticmethod
+    def _compile(mapping):
+        key, klasses = ClassMappings._shlex_split(mapping)
+        if key[0] == '/':
+            try:
+                regexp = re.compile(key[1:-1])
+            except re.error, e:
+                raise MappingFormatError('Error in mapping "{0}": invalid '
+                                         'regular expression: {1}'.format(mapping, e))
+            # regular expressions match anywhere in the node name (search),
+            # and their groups may be referenced in the class names
+            return (regexp.search, '', None, tuple(klasses), True)
+
+        prefix = key
+        for i, c in enumerate(key):
+            if c in GLOB_SPECIAL_CHARACTERS:
+                prefix = key[:i]
+                break
+        if prefix == key:
+            # a glob without wildcards only matches itself
+            return (None, prefix, key, tuple(klasses), False)
+        regexp = re.compile(fnmatch.translate(key))
+        return (regexp.match, prefix, None, tuple(klasses), False)
+
+    @staticmethod
+    def _append(classes, klasses, matched, expand):
+        if expand:
+            for klass in klasses:
+                classes.append_if_new(matched.expand(klass))
+        else:
+            for klass in klasses:
+                classes.append_if_new(klass)
+
+    def match(self, nodename):
+        '''
+        Returns the Classes mapped to the node name.
+        '''
+        ret = Classes()
+        for matcher, prefix, literal, klasses, expand in self._mappings:
+            if literal is not None:
+                matched = nodename == literal
+            else:
+                matched = matcher(nodename)
+            if matched:
+                ClassMappings._append(ret, klasses, matched, expand)
+        return ret
+
+    def match_all(self, nodenames):
+        '''
+        Returns a dictionary of the Classes mapped to each of the node names.
+        '''
+        names = sorted(set(nodenames))
+        matches = dict((n, []) for n in names)
+        for matcher, prefix, literal, klasses, expand in self._mappings:
+            if literal is not None:
+                if literal in matches:
+                    matches[literal].append((klasses, True, False))
+                continue
+
+            if prefix:
+                # the candidates sharing the literal prefix of the glob form
+                # a contiguous range of the sorted node names
+                lo = bisect.bisect_left(names, prefix)
+                hi = lo
+                while hi < len(names) and names[hi].startswith(prefix):
+                    hi += 1
+                candidates = names[lo:hi]
+            else:
+                candidates = names
+
+            for n in candidates:
+                matched = matcher(n)
+                if matched:
+                    matches[n].append((klasses, matched, expand))
+
+        ret = {}
+        for n, matched in matches.iteritems():
+            classes = ret[n] = Classes()
+            for klasses, matched, expand in matched:
+                ClassMappings._append(classes, klasses, matched, expand)
+        return ret
@@ -9,14 +9,22 @@
 
 import sys, os, posix
 
-from reclass import get_storage, output
+from reclass import get_storage, output_to
 from reclass.core import Core
+from reclass.snapshot import make_settings, write_snapshot, SnapshotStore
+from reclass.daemon import serve, DaemonClient
 from reclass.config import find_and_read_configfile, get_options
-from reclass.errors import ReclassException
+from reclass.errors import ReclassException, InvocationError
 from reclass.defaults import *
-from reclass.constants import MODE_NODEINFO
+from reclass.constants import MODE_NODEINFO, MODE_SNAPSHOT, MODE_DAEMON
 from reclass.version import *
 
+EXTRA_MODES = [('--compile-snapshot', MODE_SNAPSHOT, 'snapshot_path', 'PATH',
+                'compile the inventory into a snapshot at PATH'),
+               ('--daemon', MODE_DAEMON, None, None,
+                'answer queries on the socket until terminated'),
+              ]
+
 def main():
     try:
         defaults = {'pretty_print' : OPT_PRETTY_PRINT,
@@ -24,22 +32,56 @@ def main():
                    }
         defaults.update(find_and_read_configfile())
         options = get_options(RECLASS_NAME, VERSION, DESCRIPTION,
+                              extra_modes=EXTRA_MODES,
                               defaults=defaults)
 
-        storage = get_storage(options.storage_type, options.nodes_uri,
-                              options.classes_uri, default_environment='base')
         class_mappings = defaults.get('class_mappings')
-        reclass = Core(storage, class_mappings)
+        settings = make_settings(options.storage_type, options.nodes_uri,
+                                 options.classes_uri, class_mappings,
+                                 default_environment='base')
+
+        storage = get_storage(options.storage_type, options.nodes_uri,
+                              options.classes_uri, default_environment='base',
+                              cache_dir=options.cache_dir)
 
         sys.path.append(options.inventory_base_uri)
 
+        if options.mode == MODE_SNAPSHOT:
+            write_snapshot(options.snapshot_path, storage, class_mappings,
+                           settings, jobs=options.jobs)
+            sys.exit(posix.EX_OK)
+
+        elif options.mode == MODE_DAEMON:
+            if not options.socket:
+                raise InvocationError('The daemon needs a --socket')
+            serve(options.socket, settings, cache_dir=options.cache_dir,
+                  jobs=options.jobs)
+            sys.exit(posix.EX_OK)
+
+        snapshot = None
+        if options.snapshot:
+            snapshot = SnapshotStore(options.snapshot, settings)
+        reclass = Core(storage, class_mappings, jobs=options.jobs,
+                       snapshot=snapshot,
+                       daemon=DaemonClient(options.socket, settings))
+
         if options.mode == MODE_NODEINFO:
             data = reclass.nodeinfo(options.nodename)
 
         else:
             data = reclass.inventory()
 
-        print output(data, options.output, options.pretty_print)
+        output_to(sys.stdout, data, options.output, options.pretty_print)
+        sys.stdout.write('\n')
+
+        if options.stats:
+            stats = reclass.cache_stats()
+            lookups = stats['hits'] + stats['misses']
+            print >>sys.stderr, 'descended classes: {0} hits, {1} misses ' \
+                    '({2:.1f}% hit rate), {3} cached'.format(
+                        stats['hits'], stats['misses'],
+                        100.0 * stats['hits'] / lookups if lookups else 0.0,
+                        stats['entries'])
 
     except ReclassException, e:
         e.exit_with_message(sys.stderr)
@@ -7,9 +7,10 @@
 # Released under the terms of the Artistic Licence 2.0
 #
 
-import yaml, os, optparse, posix, sys
+import os, optparse, posix, sys
 
 import errors
+from utils import libyaml
 from defaults import *
 from constants import MODE_NODEINFO, MODE_INVENTORY
 
@@ -29,6 +30,9 @@ def make_db_options_group(parser, defaults={}):
     ret.add_option('-c', '--classes-uri', dest='classes_uri',
                    default=defaults.get('classes_uri', OPT_CLASSES_URI),
                    help='the URI to the classes storage [%default]')
+    ret.add_option('--cache-dir', dest='cache_dir',
+                   default=defaults.get('cache_dir', OPT_CACHE_DIR),
+                   help='the directory to cache parsed files in [%default]')
     return ret
 
 
@@ -45,9 +49,32 @@ def make_output_options_group(parser, defaults={}):
     return ret
 
 
+def make_compile_options_group(parser, defaults={}):
+    ret = optparse.OptionGroup(parser, 'Compilation options',
+                               'Configure how {0} resolves nodes'.format(parser.prog))
+    ret.add_option('-j', '--jobs', dest='jobs', type='int',
+                   default=defaults.get('jobs', OPT_JOBS),
+                   help='the number of processes to resolve nodes with '
+                        '[%default]')
+    ret.add_option('--stats', dest='stats', action='store_true',
+                   default=defaults.get('stats', OPT_STATS),
+                   help='print cache statistics to stderr [%default]')
+    ret.add_option('--snapshot', dest='snapshot',
+                   default=defaults.get('snapshot', OPT_SNAPSHOT),
+                   help='answer from this snapshot while it is up to date '
+                        '[%default]')
+    ret.add_option('--socket', dest='socket',
+                   default=defaults.get('socket', OPT_SOCKET),
+                   help='the socket of the daemon to ask, if one is running, '
+                        'or to listen on (empty to not use a daemon) '
+                        '[%default]')
+    return ret
+
+
 def make_modes_options_group(parser, inventory_shortopt, inventory_longopt,
                              inventory_help, nodeinfo_shortopt,
-                             nodeinfo_longopt, nodeinfo_dest, nodeinfo_help):
+                             nodeinfo_longopt, nodeinfo_dest, nodeinfo_help,
+                             extra_modes=()):
 
     def _mode_checker_cb(option, opt_str, value, parser):
         if hasattr(parser.values, 'mode'):
@@ -56,6 +83,12 @@ def make_modes_options_group(parser, inventory_shortopt, inventory_longopt,
         if option == parser.get_option(nodeinfo_longopt):
             setattr(parser.values, 'mode', MODE_NODEINFO)
             setattr(parser.values, nodeinfo_dest, value)
+        elif option.get_opt_string() in extra_modes_by_opt:
+            mode, dest = extra_modes_by_opt[option.get_opt_string()]
+            setattr(parser.values, 'mode', mode)
+            if dest is not None:
+                setattr(parser.values, dest, value)
+            setattr(parser.values, nodeinfo_dest, None)
         else:
             setattr(parser.values, 'mode', MODE_INVENTORY)
             setattr(parser.values, nodeinfo_dest, None)
@@ -69,6 +102,16 @@ def make_modes_options_group(parser, inventory_shortopt, inventory_longopt,
                    default=None, dest=nodeinfo_dest, type='string',
                    action='callback', callback=_mode_checker_cb,
                    help=nodeinfo_help)
+    extra_modes_by_opt = {}
+    for longopt, mode, dest, metavar, help in extra_modes:
+        extra_modes_by_opt[longopt] = (mode, dest)
+        if dest is None:
+            ret.add_option(longopt, action='callback',
+                           callback=_mode_checker_cb, help=help)
+        else:
+            ret.add_option(longopt, type='string', metavar=metavar,
+                           action='callback', callback=_mode_checker_cb,
+                           help=help)
     return ret
 
 
@@ -81,15 +124,27 @@ def make_parser_and_checker(name, version, description,
                             nodeinfo_dest='nodename',
                             nodeinfo_help='output information for a specific node',
                             add_options_cb=None,
+                            extra_modes=(),
                             defaults={}):
-
+    '''
+    extra_modes lists the modes besides inventory and nodeinfo, as tuples of
+    the long option, the mode constant, the destination of the argument of
+    the option and its metavar, or None for options without argument, and
+    the help text.
+    '''
+    version = '{0} (YAML: {1})'.format(version, libyaml.IMPLEMENTATION)
     parser = optparse.OptionParser(version=version)
     parser.prog = name
     parser.version = version
     parser.description = description.capitalize()
-    parser.usage = '%prog [options] ( {0} | {1} {2} )'.format(inventory_longopt,
-                                                             nodeinfo_longopt,
-                                                             nodeinfo_dest.upper())
+    modes = [inventory_longopt,
+             '{0} {1}'.format(nodeinfo_longopt, nodeinfo_dest.upper())]
+    for longopt, mode, dest, metavar, help in extra_modes:
+        if dest is None:
+            modes.append(longopt)
+        else:
+            modes.append('{0} {1}'.format(longopt, metavar))
+    parser.usage = '%prog [options] ( {0} )'.format(' | '.join(modes))
     parser.epilog = 'Exactly one mode has to be specified.'
 
     db_group = make_db_options_group(parser, defaults)
@@ -98,6 +153,9 @@ def make_parser_and_checker(name, version, description,
     output_group = make_output_options_group(parser, defaults)
     parser.add_option_group(output_group)
 
+    compile_group = make_compile_options_group(parser, defaults)
+    parser.add_option_group(compile_group)
+
     if callable(add_options_cb):
         add_options_cb(parser, defaults)
 
@@ -105,14 +163,15 @@ def make_parser_and_checker(name, version, description,
                                            inventory_longopt, inventory_help,
                                            nodeinfo_shortopt,
                                            nodeinfo_longopt, nodeinfo_dest,
-                                           nodeinfo_help)
+                                           nodeinfo_help, extra_modes)
     parser.add_option_group(modes_group)
 
     def option_checker(options, args):
         if len(args) > 0:
             parser.error('No arguments allowed')
         elif not hasattr(options, 'mode') \
-                or options.mode not in (MODE_NODEINFO, MODE_INVENTORY):
+                or options.mode not in (MODE_NODEINFO, MODE_INVENTORY) \
+                    + tuple(mode[1] for mode in extra_modes):
             parser.error('You need to specify exactly one mode '\
                          '({0} or {1})'.format(inventory_longopt,
                                                nodeinfo_longopt))
@@ -120,6 +179,8 @@ def make_parser_and_checker(name, version, description,
                 and not getattr(options, nodeinfo_dest, None):
             parser.error('Mode {0} needs {1}'.format(nodeinfo_longopt,
                                                      nodeinfo_dest.upper()))
+        elif options.jobs < 1:
+            parser.error('Need at least one job')
         elif options.inventory_base_uri is None and options.nodes_uri is None:
             parser.error('Must specify --inventory-base-uri or --nodes-uri')
         elif options.inventory_base_uri is None and options.classes_uri is None:
@@ -161,6 +222,7 @@ def get_options(name, version, description,
                             nodeinfo_dest='nodename',
                             nodeinfo_help='output information for a specific node',
                             add_options_cb=None,
+                            extra_modes=(),
                             defaults={}):
 
     parser, checker = make_parser_and_checker(name, version, description,
@@ -171,6 +233,7 @@ def get_options(name, version, description,
                                               nodeinfo_longopt, nodeinfo_dest,
                                               nodeinfo_help,
                                               add_options_cb,
+                                              extra_modes,
                                               defaults=defaults)
     options, args = parser.parse_args()
     checker(options, args)
@@ -193,7 +256,7 @@ def find_and_read_configfile(filename=CONFIG_FILE_NAME,
         f = os.path.join(d, filename)
         if os.access(f, os.R_OK):
             vvv('Using config file: {0}'.format(f))
-            return yaml.safe_load(file(f))
+            return libyaml.safe_load(file(f))
         elif os.path.isfile(f):
             raise PermissionsError('cannot read %s' % f)
     return {}
@@ -16,3 +16,5 @@ class _Constant(object):
 
 MODE_NODEINFO = _Constant('NODEINFO')
 MODE_INVENTORY = _Constant('INVENTORY')
+MODE_SNAPSHOT = _Constant('SNAPSHOT')
+MODE_DAEMON = _Constant('DAEMON')
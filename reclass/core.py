@@ -9,71 +9,95 @@
 
 import time
 #import types
-import re
+import os
 #import sys
-import fnmatch
-import shlex
 import inspect
-from reclass.datatypes import Entity, Classes, Parameters, Mutators
-from reclass.errors import MappingFormatError, ClassNotFound
+import itertools
+import multiprocessing
+import cPickle as pickle
+from reclass.datatypes import Entity, Classes, Applications, Parameters, \
+        Mutators
+from reclass.ancestry import AncestryIndex
+from reclass.classmappings import ClassMappings
+from reclass.storage.memcache_proxy import MemcacheProxy
+from reclass.errors import ClassNotFound
+
+# mutators asking for any of these arguments need the entire inventory to be
+# resolved, even if only a single node was requested
+INVENTORY_MUTATOR_ARGS = frozenset(('inventory', 'nodes', 'classes',
+                                    'applications'))
+
+# the number of nodes Core.iternodes() loads and groups at a time (see
+# Core._group_nodes()), which bounds the memory it needs besides the nodes
+# the caller keeps
+ITERNODES_WINDOW = 256
+
+# the Core instance of a worker process of Core.inventory(), see
+# _init_worker() below
+_worker_core = None
+
+def _init_worker(core):
+    global _worker_core
+    # every worker gets its own cache in front of the real storage, instead
+    # of sharing whatever the parent had cached at the time of the fork
+    storage = core._storage
+    if isinstance(storage, MemcacheProxy):
+        storage = MemcacheProxy(storage.real_storage)
+    _worker_core = Core(storage, core._class_mappings, core._input_data)
+
+def _compile_group(nodenames):
+    core = _worker_core
+    hits, misses = core._descended_hits, core._descended_misses
+    ret = []
+    try:
+        for nodename, entity in core._compile_entities(nodenames):
+            ret.append((nodename,
+                        (core._nodeinfo_as_dict(nodename, entity),
+                         entity.mutators.as_list(),
+                         core._dependencies[nodename]),
+                        None))
+    except Exception, e:
+        # the nodes of a group are compiled in the order of the inventory, so
+        # the error belongs to the next node. It is passed on rather than
+        # raised, so that the parent raises the error of the first node to
+        # fail in the order of the inventory, like the serial path does
+        ret.append((nodenames[len(ret)], None, e))
+    for nodename in nodenames:
+        # the parent keeps what it needs of the nodes
+        core._storage.invalidate_node(nodename)
+        core._dependencies.pop(nodename, None)
+    stats = (core._descended_hits - hits, core._descended_misses - misses)
+    return ret, stats
+
 
 class Core(object):
 
-    def __init__(self, storage, class_mappings, input_data=None):
+    def __init__(self, storage, class_mappings, input_data=None, jobs=1,
+                 snapshot=None, daemon=None):
         self._storage = storage
+        if not isinstance(class_mappings, ClassMappings):
+            class_mappings = ClassMappings(class_mappings)
         self._class_mappings = class_mappings
         self._input_data = input_data
+        self._jobs = jobs
         self._mutators = Mutators()
+        self._ancestry = AncestryIndex(storage)
+        self._descended = {}
+        self._descended_hits = 0
+        self._descended_misses = 0
+        self._dependencies = {}
+        self._node_order = None
+        self._snapshot = snapshot
+        self._daemon = daemon
 
     @staticmethod
     def _get_timestamp():
         return time.strftime('%c')
 
-    @staticmethod
-    def _match_regexp(key, nodename):
-        return re.search(key, nodename)
-
-    @staticmethod
-    def _match_glob(key, nodename):
-        return fnmatch.fnmatchcase(nodename, key)
-
-    @staticmethod
-    def _shlex_split(instr):
-        lexer = shlex.shlex(instr, posix=True)
-        lexer.whitespace_split = True
-        lexer.commenters = ''
-        regexp = False
-        if instr[0] == '/':
-            lexer.quotes += '/'
-            lexer.escapedquotes += '/'
-            regexp = True
-        try:
-            key = lexer.get_token()
-        except ValueError, e:
-            raise MappingFormatError('Error in mapping "{0}": missing closing '
-                                     'quote (or slash)'.format(instr))
-        if regexp:
-            key = '/{0}/'.format(key)
-        return key, list(lexer)
-
     def _get_class_mappings_entity(self, nodename):
         if not self._class_mappings:
             return Entity(name='empty (class mappings)')
-        c = Classes()
-        for mapping in self._class_mappings:
-            matched = False
-            key, klasses = Core._shlex_split(mapping)
-            if key[0] == ('/'):
-                matched = Core._match_regexp(key[1:-1], nodename)
-                if matched:
-                    for klass in klasses:
-                        c.append_if_new(matched.expand(klass))
-
-            else:
-                if Core._match_glob(key, nodename):
-                    for klass in klasses:
-                        c.append_if_new(klass)
-
+        c = self._class_mappings.match(nodename)
         return Entity(classes=c,
                       name='class mappings for node {0}'.format(nodename))
 
@@ -83,48 +107,161 @@ class Core(object):
         p = Parameters(self._input_data)
         return Entity(parameters=p, name='input data')
 
+    def _get_class(self, klass, nodename):
+        try:
+            return self._storage.get_class(klass)
+        except ClassNotFound, e:
+            e.set_nodename(nodename)
+            raise e
+
+    @staticmethod
+    def _is_composable(entity):
+        # merging the entity yields the same result as merging the entities
+        # it was merged from one by one, unless a parameter changed between
+        # a scalar and a dictionary or list along the way, or the order of
+        # more than one mutator would be reversed
+        return not entity.parameters.type_changed \
+                and len(entity.mutators) <= 1
+
+    def _descend(self, klass, nodename):
+        entity = self._get_class(klass, nodename)
+        ret = Entity(name='descended {0}'.format(klass))
+        try:
+            self._merge_classes(ret, entity.classes.as_list(), set(), nodename)
+            ret.merge(entity)
+        except TypeError:
+            # the parameters of the ancestors cannot be merged in this order,
+            # which does not matter unless the class is actually merged like
+            # this, in which case the error is raised again
+            return None
+        if not Core._is_composable(ret):
+            return None
+        return ret
+
+    def _get_descended(self, klass, nodename):
+        '''
+        Returns the class entity with all its ancestors merged into it, but not
+        interpolated, or None if it cannot be merged as a whole.
+        '''
+        if klass in self._descended:
+            self._descended_hits += 1
+            return self._descended[klass]
+        # the ancestry lists every ancestor after its own ancestors, so the
+        # descended entities of the parents are available by the time a class
+        # is merged
+        for ancestor in self._ancestry.get_ancestry(klass, nodename):
+            if ancestor not in self._descended:
+                self._descended_misses += 1
+                self._descended[ancestor] = self._descend(ancestor, nodename)
+        return self._descended[klass]
+
+    def _merge_classes(self, merge_base, classnames, seen, nodename):
+        # this is the recursive descent into the classes, with an explicit
+        # stack. A class none of whose ancestors have been seen is merged
+        # fully descended, which is equivalent to descending into it
+        frames = [(None, iter(classnames))]
+        while frames:
+            klass, parents = frames[-1]
+            for parent in parents:
+                if parent in seen:
+                    continue
+                ancestry = self._ancestry.get_ancestry(parent, nodename)
+                if seen.isdisjoint(ancestry):
+                    descended = self._get_descended(parent, nodename)
+                    if descended is not None:
+                        merge_base.merge(descended)
+                        seen.update(ancestry)
+                        continue
+                entity = self._get_class(parent, nodename)
+                frames.append((parent, iter(entity.classes.as_list())))
+                break
+
+            else:
+                frames.pop()
+                if klass is not None:
+                    merge_base.merge(self._get_class(klass, nodename))
+                    seen.add(klass)
+
+    def cache_stats(self):
+        '''
+        Returns the number of hits and misses of the cache of fully descended
+        classes, and the number of cached classes.
+        '''
+        return {'hits': self._descended_hits,
+                'misses': self._descended_misses,
+                'entries': len(self._descended)}
+
     def _recurse_entity(self, entity, merge_base=None, seen=None, nodename=None):
         if seen is None:
-            seen = {}
+            seen = set()
 
         if merge_base is None:
             merge_base = Entity(name='empty (@{0})'.format(nodename))
 
-        for klass in entity.classes.as_list():
-            if klass not in seen:
-                try:
-                    class_entity = self._storage.get_class(klass)
-                except ClassNotFound, e:
-                    e.set_nodename(nodename)
-                    raise e
-
-                descent = self._recurse_entity(class_entity, seen=seen,
-                                               nodename=nodename)
-                # on every iteration, we merge the result of the recursive
-                # descent into what we have so far…
-                merge_base.merge(descent)
-                seen[klass] = True
-
-        # … and finally, we merge what we have at this level into the
+        self._merge_classes(merge_base, entity.classes.as_list(), seen,
+                            nodename)
+
+        # finally, we merge what we have at this level into the
         # result of the iteration, so that elements at the current level
         # overwrite stuff defined by parents
         merge_base.merge(entity)
         return merge_base
 
-    def _nodeinfo(self, nodename):
-        node_entity = self._storage.get_node(nodename)
+    def _merge_node_classes(self, node_entity):
+        # everything the node inherits, i.e. all of the node except its own
+        # entity, which only depends on the effective classes of the node
+        # (see _group_nodes())
         base_entity = Entity(name='base')
         base_entity.merge(self._get_class_mappings_entity(node_entity.name))
         base_entity.merge(self._get_input_data_entity())
-        seen = {}
+        seen = set()
         merge_base = self._recurse_entity(base_entity, seen=seen,
-                                          nodename=base_entity.name)
-        ret = self._recurse_entity(node_entity, merge_base, seen=seen,
-                                   nodename=node_entity.name)
+                                          nodename=node_entity.name)
+        self._merge_classes(merge_base, node_entity.classes.as_list(), seen,
+                            node_entity.name)
+        return merge_base
+
+    def _nodeinfo(self, nodename, node_entity=None, merge_base=None):
+        if node_entity is None:
+            node_entity = self._storage.get_node(nodename)
+        if merge_base is None:
+            merge_base = self._merge_node_classes(node_entity)
+        ret = merge_base
+        ret.merge(node_entity)
         ret.interpolate()
         self._mutators.push(ret.mutators)
+        self._dependencies[nodename] = self._get_dependencies(node_entity,
+                                                              ret)
         return ret
 
+    @staticmethod
+    def _copy_entity(entity):
+        # merging the entity into an empty one would copy everything but the
+        # mutators, which would end up in reverse order
+        applications = Applications(
+                negation_prefix=entity.applications.negation_prefix)
+        applications.merge_unique(entity.applications)
+        parameters = Parameters(delimiter=entity.parameters.delimiter)
+        parameters.merge(entity.parameters)
+        return Entity(Classes(entity.classes.as_list()), applications,
+                      parameters, uri=entity.uri, name=entity.name,
+                      environment=entity.environment,
+                      mutators=Mutators(reversed(entity.mutators.as_list())))
+
+    @staticmethod
+    def _uri_path(uri):
+        # dependencies are tracked by path, so that callers can pass paths
+        # of changed files as well as the URIs of the storage backend
+        if '://' in uri:
+            return uri.split('://', 1)[1]
+        return os.path.abspath(uri)
+
+    def _get_dependencies(self, node_entity, entity):
+        ret = set(Core._uri_path(self._ancestry.get_uri(klass))
+                  for klass in entity.classes.as_list())
+        ret.add(Core._uri_path(node_entity.uri))
+        return frozenset(ret)
+
     def _nodeinfo_as_dict(self, nodename, entity):
         ret = {'__reclass__' : {'node': entity.name, 'name': nodename,
                                 'uri': entity.uri,
@@ -135,44 +272,301 @@ class Core(object):
         ret.update(entity.as_dict())
         return ret
 
+    @staticmethod
+    def _mutator_args(mutator):
+        args, varargs, keywords, defaults = inspect.getargspec(mutator)
+        return set(args)
+
+    def has_mutators(self):
+        '''
+        Returns whether any of the nodes resolved so far has mutators.
+        '''
+        return len(self._mutators) > 0
+
+    def _mutators_need_inventory(self):
+        for mutator in self._mutators.as_list():
+            if Core._mutator_args(mutator) & INVENTORY_MUTATOR_ARGS:
+                return True
+        return False
+
     def _mutate(self, **kwargs):
         params = set(kwargs.keys())
         mutators = self._mutators.as_deque()
         while len(mutators):
             mutator = mutators.popleft()
-            args, varargs, keywords, defaults = inspect.getargspec(mutator)
-            required = set(args)
+            required = Core._mutator_args(mutator)
             # If the caller passed us all parameters that this mutator requires,
             # call the mutator with the arguments it wants
             if (required & params) == required:
                 args = { arg: value for arg, value in kwargs.items() if arg in required }
                 mutator(**args)
 
+    def _get_snapshot(self):
+        # the snapshot.SnapshotStore given, if its snapshot is up to date
+        if self._snapshot is None:
+            return None
+        return self._snapshot.get()
+
     def nodeinfo(self, nodename):
-        inventory = self.inventory()
-        self._mutate(inventory=inventory, nodename=nodename)
-        return inventory['nodes'][nodename]
+        snapshot = self._get_snapshot()
+        if snapshot is not None:
+            return snapshot.nodeinfo(nodename)
+        if self._daemon is not None:
+            # the daemon.DaemonClient given, which returns None if there is
+            # no daemon to answer
+            ret = self._daemon.nodeinfo(nodename)
+            if ret is not None:
+                return ret
+
+        entity = self._nodeinfo(nodename)
+        if self._mutators_need_inventory():
+            # the node asked for mutators that operate on the entire
+            # inventory, so we have no choice but to resolve all nodes
+            inventory = self.inventory()
+            self._mutate(inventory=inventory, nodename=nodename)
+            return inventory['nodes'][nodename]
+
+        ret = self._nodeinfo_as_dict(nodename, entity)
+        self._mutate(nodeinfo=ret, nodename=nodename)
+        return ret
+
+    def nodeinfo_many(self, nodenames):
+        '''
+        Returns a dictionary of the nodeinfo of each of the nodes, the same as
+        nodeinfo() returns for each of them on its own. The classes shared by
+        the nodes are merged only once, and with more than one job, the nodes
+        are resolved in parallel.
+        '''
+        unique = []
+        seen = set()
+        for n in nodenames:
+            if n not in seen:
+                unique.append(n)
+                seen.add(n)
+        nodenames = unique
+
+        snapshot = self._get_snapshot()
+        if snapshot is not None:
+            return dict((n, snapshot.nodeinfo(n)) for n in nodenames)
+        if self._daemon is not None:
+            ret = {}
+            for n in nodenames:
+                nodeinfo = self._daemon.nodeinfo(n)
+                if nodeinfo is None:
+                    break
+                ret[n] = nodeinfo
+            else:
+                return ret
+
+        mutators = self._mutators.as_list()
+        if self._mutators_need_inventory():
+            # every node needs the entire inventory anyway, see nodeinfo()
+            return self._nodeinfo_from_inventory(mutators, nodenames)
+
+        if self._jobs > 1 and len(nodenames) > 1:
+            compiled = self._compile_nodes_parallel([nodenames])
+        else:
+            compiled = self._compile_nodes(nodenames)
+        ret = {}
+        need_inventory = []
+        for n, nodeinfo, node_mutators in compiled:
+            if not mutators and not node_mutators:
+                ret[n] = nodeinfo
+                continue
+            # mutators only apply to the node they come with, as if it was
+            # resolved on its own
+            core = self._fork(mutators)
+            core._mutators.push(node_mutators)
+            if core._mutators_need_inventory():
+                need_inventory.append(n)
+            else:
+                core._mutate(nodeinfo=nodeinfo, nodename=n)
+                ret[n] = nodeinfo
+        if need_inventory:
+            ret.update(self._nodeinfo_from_inventory(mutators,
+                                                     need_inventory))
+        return ret
+
+    def _nodeinfo_from_inventory(self, mutators, nodenames):
+        # what nodeinfo() returns for nodes whose mutators need the entire
+        # inventory. Compiling the inventory pushes the mutators of every
+        # node, which leaves them in the same order whichever node was asked
+        # for, so the inventory is compiled once and every node is mutated
+        # in a copy of its own
+        for n in nodenames:
+            # fail for a missing node like nodeinfo() does
+            self._storage.get_node(n)
+        core = self._fork(mutators)
+        inventory = pickle.dumps(core.inventory(), pickle.HIGHEST_PROTOCOL)
+        ret = {}
+        for n in nodenames:
+            copy = pickle.loads(inventory)
+            core._mutate(inventory=copy, nodename=n)
+            ret[n] = copy['nodes'][n]
+        return ret
+
+    def _fork(self, mutators):
+        # a Core like a new one given the same arguments and the mutators
+        # would be, which shares the storage and the merged classes
+        core = Core(self._storage, self._class_mappings, self._input_data,
+                    self._jobs, self._snapshot, self._daemon)
+        core._ancestry = self._ancestry
+        core._descended = self._descended
+        core._mutators.push(reversed(mutators))
+        return core
+
+    @staticmethod
+    def _add_to_reverse_map(revmap, names, nodename):
+        for name in names:
+            if name in revmap:
+                revmap[name].append(nodename)
+            else:
+                revmap[name] = [nodename]
+
+    def _group_nodes(self, nodenames):
+        '''
+        Loads the node entities and groups the node names by the effective
+        classes of the nodes, i.e. the classes from the class mappings followed
+        by the classes listed in the node. Returns a dictionary of the entity
+        and the group key of each node, and the node names of each group, in
+        order of the first node of each group.
+        '''
+        entities = dict((n, self._storage.get_node(n)) for n in nodenames)
+        mapped = self._class_mappings.match_all(e.name
+                                                for e in entities.values())
+        nodes = {}
+        groups = {}
+        order = []
+        for n in nodenames:
+            entity = entities[n]
+            key = (tuple(mapped[entity.name].as_list()),
+                   tuple(entity.classes.as_list()))
+            nodes[n] = (entity, key)
+            if key not in groups:
+                groups[key] = []
+                order.append(key)
+            groups[key].append(n)
+        return nodes, [groups[key] for key in order]
+
+    def _compile_entities(self, nodenames):
+        # nodes with the same effective classes inherit the same merged
+        # classes, so those are merged once per group and every node of the
+        # group merges its own entity into a copy of the result
+        nodes, groups = self._group_nodes(nodenames)
+        remaining = dict((nodes[group[0]][1], len(group)) for group in groups)
+        shared = {}
+        for n in nodenames:
+            entity, key = nodes[n]
+            merge_base = None
+            if remaining[key] > 1 or key in shared:
+                if key not in shared:
+                    shared[key] = self._merge_node_classes(entity)
+                remaining[key] -= 1
+                if remaining[key]:
+                    merge_base = Core._copy_entity(shared[key])
+                else:
+                    # the last node of the group can have the original
+                    merge_base = shared.pop(key)
+            yield n, self._nodeinfo(n, entity, merge_base)
+
+    def _compile_nodes(self, nodenames):
+        # yields the mutators of each node along with its nodeinfo
+        for n, entity in self._compile_entities(nodenames):
+            yield (n, self._nodeinfo_as_dict(n, entity),
+                   entity.mutators.as_list())
+
+    def _compile_nodes_parallel(self, windows):
+        # every worker compiles entire groups of nodes (see _group_nodes()),
+        # whose results are buffered until they are due in order. The pool
+        # only gets the groups of one window of nodes at a time
+        pool = multiprocessing.Pool(self._jobs, _init_worker, (self,))
+        try:
+            for nodenames in windows:
+                groups = self._group_nodes(nodenames)[1]
+                chunksize = max(1, len(groups) // (self._jobs * 4))
+                results = pool.imap(_compile_group, groups, chunksize)
+                compiled = {}
+                for n in nodenames:
+                    while n not in compiled:
+                        group, stats = results.next()
+                        self._descended_hits += stats[0]
+                        self._descended_misses += stats[1]
+                        for result in group:
+                            compiled[result[0]] = result[1:]
+                    result, error = compiled.pop(n)
+                    if error is not None:
+                        raise error
+                    d, mutators, deps = result
+                    self._mutators.push(mutators)
+                    self._dependencies[n] = deps
+                    yield n, d, mutators
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _iterwindows(self):
+        nodenames = iter(self._storage.enumerate_nodes())
+        size = ITERNODES_WINDOW * self._jobs
+        while True:
+            window = list(itertools.islice(nodenames, size))
+            if not window:
+                return
+            yield window
+
+    def _iternodes(self, classes, applications, keep_dependencies):
+        if self._jobs > 1:
+            compiled = self._compile_nodes_parallel(self._iterwindows())
+        else:
+            compiled = itertools.chain.from_iterable(
+                    self._compile_nodes(window)
+                    for window in self._iterwindows())
+
+        if keep_dependencies:
+            self._node_order = {}
+        for n, nodeinfo, mutators in compiled:
+            # the entity of the node is not needed anymore
+            self._storage.invalidate_node(n)
+            if keep_dependencies:
+                self._node_order[n] = len(self._node_order)
+            else:
+                self._dependencies.pop(n, None)
+            if classes is not None:
+                Core._add_to_reverse_map(classes, nodeinfo['classes'], n)
+            if applications is not None:
+                Core._add_to_reverse_map(applications,
+                                         nodeinfo['applications'], n)
+            yield n, nodeinfo
+
+    def iternodes(self, classes=None, applications=None):
+        '''
+        Yields (nodename, nodeinfo) for every node, one node at a time and in
+        the order in which the storage enumerates the nodes. The nodes are
+        loaded and resolved ITERNODES_WINDOW at a time (times the number of
+        jobs), and nothing is kept of the nodes that have been yielded.
+
+        If given, the dictionaries classes and applications are filled with
+        the names of the nodes having each class and application as the nodes
+        are yielded. Mutators operating on the entire inventory are not
+        applied, for which inventory() is needed.
+        '''
+        return self._iternodes(classes, applications, False)
 
     def inventory(self):
-        entities = {}
-        for n in self._storage.enumerate_nodes():
-            entities[n] = self._nodeinfo(n)
+        snapshot = self._get_snapshot()
+        if snapshot is not None:
+            return snapshot.inventory()
+        if self._daemon is not None:
+            ret = self._daemon.inventory()
+            if ret is not None:
+                return ret
 
         nodes = {}
         applications = {}
         classes = {}
-        for f, nodeinfo in entities.iteritems():
-            d = nodes[f] = self._nodeinfo_as_dict(f, nodeinfo)
-            for a in d['applications']:
-                if a in applications:
-                    applications[a].append(f)
-                else:
-                    applications[a] = [f]
-            for c in d['classes']:
-                if c in classes:
-                    classes[c].append(f)
-                else:
-                    classes[c] = [f]
+        # recompile() needs to know the files every node depends on
+        for n, nodeinfo in self._iternodes(classes, applications, True):
+            nodes[n] = nodeinfo
         self._mutate(nodes=nodes, classes=classes, applications=applications)
 
         return {'__reclass__' : {'timestamp': Core._get_timestamp()},
@@ -180,3 +574,66 @@ class Core(object):
                 'classes': classes,
                 'applications': applications
                }
+
+    def _patch_reverse_map(self, revmap, name, nodename, member, order):
+        nodenames = revmap.get(name, [])
+        if member == (nodename in nodenames):
+            return
+        if member:
+            nodenames.append(nodename)
+            nodenames.sort(key=lambda n: order.get(n, len(order)))
+            revmap[name] = nodenames
+        else:
+            nodenames.remove(nodename)
+            if not nodenames:
+                del revmap[name]
+
+    def recompile(self, inventory, changed):
+        '''
+        Updates an inventory previously obtained from inventory() in place,
+        recompiling only the nodes whose node or class files are among the
+        changed files (given as paths or storage URIs). Nodes or classes that
+        have been added or removed since require a full inventory run.
+
+        Returns the names of the recompiled nodes.
+        '''
+        changed = set(Core._uri_path(c) for c in changed)
+        nodes = inventory['nodes']
+        affected = [n for n in nodes
+                    if not changed.isdisjoint(self._dependencies.get(n, changed))]
+
+        changed_classes = [klass for klass, uri in self._ancestry.iteruris()
+                           if Core._uri_path(uri) in changed]
+        for klass in changed_classes:
+            self._storage.invalidate_class(klass)
+        for klass in self._ancestry.invalidate(changed_classes):
+            self._descended.pop(klass, None)
+
+        if self._mutators_need_inventory():
+            # mutators may touch any node, so start over rather than
+            # recompiling the affected nodes first
+            return self._recompile_all(inventory)
+
+        order = self._node_order
+        if order is None:
+            order = dict((n, i) for i, n in enumerate(nodes))
+        for n in affected:
+            self._storage.invalidate_node(n)
+            old = nodes[n]
+            new = nodes[n] = self._nodeinfo_as_dict(n, self._nodeinfo(n))
+            for key in ('classes', 'applications'):
+                revmap = inventory[key]
+                for name in set(old[key]).symmetric_difference(new[key]):
+                    self._patch_reverse_map(revmap, name, n, name in new[key],
+                                            order)
+
+        if self._mutators_need_inventory():
+            # the changed files brought such mutators along
+            return self._recompile_all(inventory)
+
+        inventory['__reclass__']['timestamp'] = Core._get_timestamp()
+        return affected
+
+    def _recompile_all(self, inventory):
+        inventory.update(self.inventory())
+        return inventory['nodes'].keys()
@@ -0,0 +1,364 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+'''
+A long-running reclass process answering nodeinfo and inventory queries
+over a Unix socket, and the client Core uses to ask it.
+
+The daemon keeps the storage and the compiled inventory of every set of
+settings (see reclass.snapshot.make_settings) it has been asked about.
+Before answering, it checks the fingerprint of the inventory (see
+reclass.utils.fingerprint). Changed files are recompiled with
+Core.recompile(), while added or removed files make it start over. An
+inventory that cannot be compiled is not compiled again before any of its
+files change.
+
+Requests and responses are pickles, each preceded by its length. The
+socket is only accessible to the user running the daemon, and clients only
+talk to a socket owned by their own user.
+'''
+
+import os, signal, socket, stat, struct, sys
+import SocketServer
+import cPickle as pickle
+
+from reclass import get_storage
+from reclass.core import Core
+from reclass.errors import ReclassException, DaemonError, NodeNotFound
+from reclass.utils.fingerprint import fingerprint, changed_paths
+from reclass.version import VERSION
+
+_LENGTH = struct.Struct('<Q')
+
+# the response telling the client to resolve the nodes itself
+_FALLBACK = ('fallback', None)
+
+
+def _send(fp, obj):
+    data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    fp.write(_LENGTH.pack(len(data)))
+    fp.write(data)
+    fp.flush()
+
+
+def _recv(fp):
+    header = fp.read(_LENGTH.size)
+    if len(header) != _LENGTH.size:
+        raise EOFError
+    length, = _LENGTH.unpack(header)
+    data = fp.read(length)
+    if len(data) != length:
+        raise EOFError
+    return pickle.loads(data)
+
+
+class _Inventory(object):
+    '''
+    The storage and the compiled inventory for one set of settings.
+
+    If the inventory cannot be compiled, the error is kept until any of the
+    files change. A ReclassException answers inventory queries, like it
+    would in a reclass run of its own, while any other error, such as a
+    mutator the daemon cannot import, leaves them to the client. Nodeinfo
+    queries are then answered by resolving each node on its own, and so
+    are they if there are mutators. The nodeinfo or error of such a node is
+    kept just as long.
+    '''
+    def __init__(self, settings, cache_dir, jobs):
+        self._settings = settings
+        self._cache_dir = cache_dir
+        self._jobs = jobs
+        self._reset()
+
+    def _reset(self):
+        s = self._settings
+        storage = get_storage(s['storage_type'], s['nodes_uri'],
+                              s['classes_uri'],
+                              default_environment=s['default_environment'],
+                              cache_dir=self._cache_dir)
+        core = Core(storage, s['class_mappings'], jobs=self._jobs)
+        fingerprint = storage.fingerprint()
+        self._storage, self._core = storage, core
+        self._fingerprint = fingerprint
+        self._nodes = {}
+        try:
+            self._inventory = core.inventory()
+        except Exception, e:
+            self._fail(e)
+            return
+        self._error = None
+
+    def _fail(self, e):
+        if isinstance(e, ReclassException):
+            print >>sys.stderr, e.message
+        else:
+            print >>sys.stderr, 'Cannot compile the inventory: {0}'.format(e)
+        self._inventory = None
+        self._error = e
+
+    def refresh(self):
+        changed = changed_paths(self._fingerprint)
+        if not changed:
+            return
+        # taken before recompiling, so that changes made meanwhile are
+        # noticed by the next refresh
+        current = fingerprint(changed)
+        if self._inventory is None \
+                or any(os.path.isdir(path) or current[path] is None
+                       or self._fingerprint[path] is None
+                       for path in changed):
+            # files have been added or removed, or there is no inventory
+            # to recompile
+            self._reset()
+            return
+        self._nodes = {}
+        try:
+            self._core.recompile(self._inventory, changed)
+        except Exception, e:
+            # the inventory has been recompiled only in part
+            self._fail(e)
+        self._fingerprint.update(current)
+
+    def _resolve(self, nodename):
+        # resolves the node like a separate reclass run would, sharing the
+        # storage and the merged classes
+        return self._core._fork([]).nodeinfo(nodename)
+
+    def _resolve_once(self, nodename):
+        try:
+            ret = self._nodes[nodename]
+        except KeyError:
+            try:
+                ret = self._resolve(nodename)
+            except NodeNotFound:
+                # not kept, as any name may be asked for
+                raise
+            except Exception, e:
+                ret = e
+            self._nodes[nodename] = ret
+        if isinstance(ret, ReclassException):
+            raise ret
+        if isinstance(ret, Exception):
+            return None
+        return ret
+
+    def nodeinfo(self, nodename):
+        '''
+        Returns the nodeinfo of the node, or None to leave it to the client.
+        '''
+        if self._inventory is None or self._core.has_mutators():
+            # mutators may treat a node differently when it is asked for on
+            # its own
+            return self._resolve_once(nodename)
+        if nodename not in self._inventory['nodes']:
+            return self._resolve(nodename)
+        return self._inventory['nodes'][nodename]
+
+    def inventory(self):
+        '''
+        Returns the inventory, or None to leave it to the client.
+        '''
+        if self._inventory is None:
+            if isinstance(self._error, ReclassException):
+                raise self._error
+            return None
+        return self._inventory
+
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            request = _recv(self.rfile)
+        except Exception:
+            return
+        try:
+            response = self.server.answer(request)
+        except ReclassException, e:
+            response = ('error', e)
+        except Exception, e:
+            print >>sys.stderr, 'Cannot answer {0!r}: {1}'.format(request, e)
+            response = _FALLBACK
+        try:
+            _send(self.wfile, response)
+        except socket.error:
+            pass
+
+
+class DaemonServer(SocketServer.UnixStreamServer):
+    '''
+    Answers the queries one at a time, until it is killed.
+    '''
+    def __init__(self, path, cache_dir=None, jobs=1):
+        self._path = path
+        self._cache_dir = cache_dir
+        self._jobs = jobs
+        self._inventories = {}
+        self._unsupported = set()
+        DaemonServer._remove_stale_socket(path)
+        umask = os.umask(0177)
+        try:
+            SocketServer.UnixStreamServer.__init__(self, path, _RequestHandler)
+        finally:
+            os.umask(umask)
+
+    path = property(lambda self: self._path)
+
+    @staticmethod
+    def _remove_stale_socket(path):
+        try:
+            mode = os.lstat(path).st_mode
+        except OSError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise DaemonError(path, 'file exists and is not a socket')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except socket.error:
+            # nobody is listening anymore
+            os.unlink(path)
+            return
+        finally:
+            sock.close()
+        raise DaemonError(path, 'another daemon is listening')
+
+    @staticmethod
+    def _settings_key(settings):
+        return tuple(sorted((k, tuple(v) if isinstance(v, list) else v)
+                            for k, v in settings.iteritems()))
+
+    def _get_inventory(self, settings):
+        key = DaemonServer._settings_key(settings)
+        if key in self._unsupported:
+            return None
+        try:
+            inventory = self._inventories.get(key)
+            if inventory is None:
+                inventory = _Inventory(settings, self._cache_dir, self._jobs)
+                self._inventories[key] = inventory
+            else:
+                inventory.refresh()
+        except ReclassException, e:
+            # the storage cannot be set up, so leave it to the client
+            self._inventories.pop(key, None)
+            print >>sys.stderr, e.message
+            return None
+        except NotImplementedError, e:
+            # the storage cannot be fingerprinted, or does not exist
+            self._unsupported.add(key)
+            print >>sys.stderr, e.message
+            return None
+        return inventory
+
+    def warm_up(self, settings):
+        '''
+        Compiles the inventory for the settings ahead of the first query.
+        '''
+        self._get_inventory(settings)
+
+    def answer(self, request):
+        settings = request['settings']
+        if settings.get('version') != VERSION:
+            return _FALLBACK
+        inventory = self._get_inventory(settings)
+        if inventory is None:
+            return _FALLBACK
+        if request['query'] == 'inventory':
+            ret = inventory.inventory()
+        else:
+            ret = inventory.nodeinfo(request['nodename'])
+        if ret is None:
+            return _FALLBACK
+        return ('ok', ret)
+
+    def server_close(self):
+        SocketServer.UnixStreamServer.server_close(self)
+        try:
+            os.unlink(self._path)
+        except OSError:
+            pass
+
+
+def serve(path, settings=None, cache_dir=None, jobs=1):
+    '''
+    Runs a daemon listening at path until it is interrupted or terminated,
+    after compiling the inventory for the settings if given.
+    '''
+    server = DaemonServer(path, cache_dir=cache_dir, jobs=jobs)
+    # leave through the finally clause below, which removes the socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        if settings is not None:
+            server.warm_up(settings)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+class DaemonClient(object):
+    '''
+    Asks the daemon listening at path, if any, for queries with the given
+    settings. Returns None when there is no daemon or it cannot answer, in
+    which case the caller resolves the nodes itself.
+    '''
+    def __init__(self, path, settings):
+        self._path = path
+        self._settings = settings
+        self._available = bool(path)
+
+    path = property(lambda self: self._path)
+
+    def _connect(self):
+        try:
+            if os.stat(self._path).st_uid != os.getuid():
+                return None
+        except OSError:
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._path)
+        except socket.error:
+            sock.close()
+            return None
+        return sock
+
+    def _query(self, query, nodename=None):
+        if not self._available:
+            return None
+        sock = self._connect()
+        if sock is None:
+            self._available = False
+            return None
+        try:
+            fp = sock.makefile('r+b')
+            try:
+                _send(fp, {'settings': self._settings, 'query': query,
+                           'nodename': nodename})
+                status, value = _recv(fp)
+            finally:
+                fp.close()
+        except (socket.error, EOFError, pickle.UnpicklingError, ValueError):
+            status, value = _FALLBACK
+        finally:
+            sock.close()
+
+        if status == 'ok':
+            return value
+        elif status == 'error':
+            raise value
+        self._available = False
+        return None
+
+    def nodeinfo(self, nodename):
+        return self._query('nodeinfo', nodename)
+
+    def inventory(self):
+        return self._query('inventory')
@@ -8,6 +8,7 @@
 #
 
 from classes import Classes
+from reclass.utils.orderedset import OrderedSet
 
 class Applications(Classes):
     '''
@@ -25,7 +26,7 @@ class Applications(Classes):
                  negation_prefix=DEFAULT_NEGATION_PREFIX):
         self._negation_prefix = negation_prefix
         self._offset = len(negation_prefix)
-        self._negations = []
+        self._negations = OrderedSet()
         super(Applications, self).__init__(iterable)
 
     def _get_negation_prefix(self):
@@ -33,14 +34,13 @@ class Applications(Classes):
     negation_prefix = property(_get_negation_prefix)
 
     def append_if_new(self, item):
+        if item in self._items:
+            return
         self._assert_is_string(item)
         if item.startswith(self._negation_prefix):
             item = item[self._offset:]
-            self._negations.append(item)
-            try:
-                self._items.remove(item)
-            except ValueError:
-                pass
+            self._negations.add(item)
+            self._items.discard(item)
         else:
             super(Applications, self)._append_if_new(item)
 
@@ -49,16 +49,19 @@ class Applications(Classes):
             # we might be extending ourselves to include negated applications,
             # in which case we need to remove our own content accordingly:
             for negation in iterable._negations:
-                try:
-                    self._items.remove(negation)
-                except ValueError:
-                    pass
-            iterable = iterable.as_list()
+                self._items.discard(negation)
+            # and keep the negations, so that they also apply to whatever
+            # we might be merged into
+            self._negations.update(iterable._negations)
+            # the items of another instance are neither negations, nor do
+            # they need to be validated again
+            self._items.update(iterable.as_list())
+            return
         for i in iterable:
             self.append_if_new(i)
 
     def __repr__(self):
-        contents = self._items + \
+        contents = self._items.as_list() + \
                 ['%s%s' % (self._negation_prefix, i) for i in self._negations]
         return "%s(%r, %r)" % (self.__class__.__name__, contents,
                                self._negation_prefix)
@@ -10,17 +10,18 @@
 import types
 import os
 from reclass.errors import InvalidClassnameError
+from reclass.utils.orderedset import OrderedSet
 
 INVALID_CHARACTERS_FOR_CLASSNAMES = ' ' + os.sep
 
 class Classes(object):
     '''
-    A very limited ordered set of strings with O(n) uniqueness constraints. It
+    A very limited ordered set of strings with O(1) uniqueness constraints. It
     is neither a proper list or a proper set, on purpose, to keep things
     simple.
     '''
     def __init__(self, iterable=None):
-        self._items = []
+        self._items = OrderedSet()
         if iterable is not None:
             self.merge_unique(iterable)
 
@@ -29,10 +30,10 @@ class Classes(object):
 
     def __eq__(self, rhs):
         if isinstance(rhs, list):
-            return self._items == rhs
+            return self._items.as_list() == rhs
         else:
             try:
-                return self._items == rhs._items
+                return self._items.as_list() == rhs._items.as_list()
             except AttributeError as e:
                 return False
 
@@ -40,11 +41,13 @@ class Classes(object):
         return not self.__eq__(rhs)
 
     def as_list(self):
-        return self._items[:]
+        return self._items.as_list()
 
     def merge_unique(self, iterable):
-        if isinstance(iterable, self.__class__):
-            iterable = iterable.as_list()
+        if type(iterable) is type(self):
+            # the items of another instance have already been validated
+            self._items.update(iterable.as_list())
+            return
         # Cannot just call list.extend here, as iterable's items might not
         # be unique by themselves, or in the context of self.
         for i in iterable:
@@ -61,14 +64,16 @@ class Classes(object):
                 raise InvalidClassnameError(c, item)
 
     def _append_if_new(self, item):
-        if item not in self._items:
-            self._items.append(item)
+        self._items.add(item)
 
     def append_if_new(self, item):
+        if item in self._items:
+            # an item can only have been added after validation
+            return
         self._assert_is_string(item)
         self._assert_valid_characters(item)
         self._append_if_new(item)
 
     def __repr__(self):
         return '%s(%r)' % (self.__class__.__name__,
-                           self._items)
+                           self._items.as_list())
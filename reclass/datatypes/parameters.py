@@ -8,7 +8,8 @@
 #
 import types
 
-from reclass.defaults import PARAMETER_INTERPOLATION_DELIMITER
+from reclass.defaults import PARAMETER_INTERPOLATION_DELIMITER, \
+        PARAMETER_INTERPOLATION_SENTINELS
 from reclass.utils.dictpath import DictPath
 from reclass.utils.refvalue import RefValue
 from reclass.errors import InfiniteRecursionError, UndefinedVariableError
@@ -33,44 +34,203 @@ class Parameters(object):
          topological order. Therefore, deep references work. Cyclical
          references cause an error.
 
+      3. merging another Parameters instance does not copy its nested
+         dictionaries and lists if they do not contain references and there
+         is nothing to merge them with. Those are shared between both
+         instances instead, and copied by whichever instance first needs to
+         write into them (copy-on-write). as_dict() hands out a dictionary
+         that shares nothing with other instances.
+
+         The same applies to the nested dictionaries and lists of a
+         dictionary being merged, which is scanned once for strings that
+         could contain references beforehand, and the scalars of a
+         dictionary without references merged into another are copied
+         without looking at them.
+
+      4. with lazy=True, the mapping passed to the constructor is only
+         merged when the instance is first used, e.g. merged into another
+         instance, so that the parameters of entities that are never merged
+         (e.g. classes that are only loaded for their list of classes) are
+         never walked.
+
     To support these specialities, this class only exposes very limited
     functionality and does not try to be a really mapping object.
     '''
     DEFAULT_PATH_DELIMITER = PARAMETER_INTERPOLATION_DELIMITER
 
-    def __init__(self, mapping=None, delimiter=None):
+    def __init__(self, mapping=None, delimiter=None, lazy=False):
         if delimiter is None:
             delimiter = Parameters.DEFAULT_PATH_DELIMITER
         self._delimiter = delimiter
         self._base = {}
         self._occurrences = {}
+        # the containers created by this instance, which it may modify in
+        # place, indexed by their id. The containers are kept in the dict so
+        # that their ids cannot be reused by other containers while this
+        # instance is alive
+        self._owned = {}
+        # the ids of the (owned) containers that contain references, and can
+        # therefore not be shared
+        self._refs = set()
+        # whether any container has been shared with another instance
+        self._shared = False
+        # whether a dictionary or list has been merged onto a scalar, or
+        # replaced by one, in which case merging the parameters of several
+        # entities one by one may differ from merging the result of merging
+        # them into each other
+        self._type_changed = False
+        # the mapping to merge when the instance is first used
+        self._pending = None
         if mapping is not None:
-            # we initialise by merging, otherwise the list of references might
-            # not be updated
-            self.merge(mapping)
+            if lazy:
+                if not isinstance(mapping, dict):
+                    raise TypeError('Cannot merge %s objects into %s' %
+                                    (type(mapping), self.__class__.__name__))
+                self._pending = mapping
+            else:
+                # we initialise by merging, otherwise the list of references
+                # might not be updated
+                self.merge(mapping)
 
     delimiter = property(lambda self: self._delimiter)
 
+    def _get_type_changed(self):
+        self._merge_pending()
+        return self._type_changed
+    type_changed = property(_get_type_changed)
+
+    def _merge_pending(self):
+        if self._pending is not None:
+            mapping, self._pending = self._pending, None
+            self.merge(mapping)
+
     def __len__(self):
+        self._merge_pending()
         return len(self._base)
 
     def __repr__(self):
+        self._merge_pending()
         return '%s(%r, %r)' % (self.__class__.__name__, self._base,
                                self.delimiter)
 
     def __eq__(self, other):
-        return isinstance(other, type(self)) \
-                and self._base == other._base \
+        if not isinstance(other, type(self)):
+            return False
+        self._merge_pending()
+        other._merge_pending()
+        return self._base == other._base \
                 and self._delimiter == other._delimiter
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def as_dict(self):
+        self._merge_pending()
+        if self._shared:
+            self._unshare()
         return self._base.copy()
 
-    def _update_scalar(self, cur, new, path):
-        if isinstance(cur, RefValue) and path in self._occurrences:
+    def _own(self, container):
+        self._owned[id(container)] = container
+        return container
+
+    def _writable(self, container):
+        # returns the container if it may be modified in place, or a copy of
+        # it, which is then owned by this instance
+        if container is self._base or id(container) in self._owned:
+            return container
+        return self._own(type(container)(container))
+
+    def _is_shareable(self, container):
+        return id(container) not in self._refs
+
+    def _share(self, other, container):
+        # neither instance owns a shared container anymore, so that both copy
+        # it before writing
+        other._owned.pop(id(container), None)
+        self._shared = True
+        return container
+
+    def _has_references(self, value):
+        return isinstance(value, RefValue) or id(value) in self._refs
+
+    def _unshare(self):
+        # replaces all shared containers with copies owned by this instance.
+        # A container shared at several paths (e.g. by way of a reference to
+        # a dictionary) is copied only once, so that the copies remain
+        # identical objects
+        copies = {}
+        stack = [self._base]
+        visited = set()
+        while stack:
+            container = stack.pop()
+            if isinstance(container, dict):
+                items = container.items()
+            else:
+                items = enumerate(container)
+            for key, value in items:
+                if not isinstance(value, (dict, list)):
+                    continue
+                if id(value) in self._owned:
+                    if id(value) not in visited:
+                        visited.add(id(value))
+                        stack.append(value)
+                    continue
+                if id(value) not in copies:
+                    # keep a reference to the original, so that its id
+                    # cannot be reused while we are walking
+                    copies[id(value)] = (value, self._writable(value))
+                    visited.add(id(copies[id(value)][1]))
+                    stack.append(copies[id(value)][1])
+                container[key] = copies[id(value)][1]
+        self._shared = False
+
+    def _find_references(self, value, found, seen):
+        # adds the ids of the containers in value that contain (or may
+        # contain) references to found, as well as those of containers that
+        # appear more than once, which must not be shared, or else they would
+        # be aliased in the result. Returns whether value contains references
+        if isinstance(value, dict):
+            values = value.itervalues()
+        elif isinstance(value, list):
+            values = iter(value)
+        elif isinstance(value, types.StringTypes):
+            return PARAMETER_INTERPOLATION_SENTINELS[0] in value
+        else:
+            return isinstance(value, RefValue)
+
+        refs = id(value) in seen
+        seen.add(id(value))
+        for v in values:
+            if self._find_references(v, found, seen):
+                refs = True
+        if refs:
+            found.add(id(value))
+        return refs
+
+    def _scan(self, mapping):
+        # returns a Parameters instance holding mapping, which can serve as
+        # the source of a merge, so that the containers without references
+        # are shared, rather than walked
+        ret = Parameters(delimiter=self.delimiter)
+        ret._base = mapping
+        self._find_references(mapping, ret._refs, set())
+        return ret
+
+    def _update_scalar(self, cur, new, parent, key):
+        # the path of the value is only needed if references are involved, so
+        # we do not create it for every value merged
+        path = None
+        if isinstance(cur, (dict, list)):
+            self._type_changed = True
+            if self._has_references(cur):
+                # the scalar replaces a container holding references, which
+                # must not be interpolated anymore
+                path = parent.new_subpath(key)
+                self._move_occurrences(path, None)
+        elif isinstance(cur, RefValue):
+            path = parent.new_subpath(key)
+        if path is not None and path in self._occurrences:
             # If the current value already holds a RefValue, we better forget
             # the occurrence, or else interpolate() will later overwrite
             # unconditionally. If the new value is a RefValue, the occurrence
@@ -90,6 +250,11 @@ class Parameters(object):
             # at all
             ret = new
 
+        elif PARAMETER_INTERPOLATION_SENTINELS[0] not in new:
+            # the new value is a string without the opening sentinel, so it
+            # cannot contain any references
+            return new
+
         else:
             # the new value is a string, let's see if it contains references,
             # by way of wrapping it in a RefValue and querying the result
@@ -104,24 +269,65 @@ class Parameters(object):
         # we just created, in a dict indexed by the dictionary path, instead
         # of just a list. The keys are required to resolve dependencies during
         # interpolation
+        if path is None:
+            path = parent.new_subpath(key)
         self._occurrences[path] = ret
         return ret
 
-    def _extend_list(self, cur, new, path):
+    def _move_occurrences(self, path, new_path):
+        # moves the occurrences at or below path to new_path, or forgets them
+        # if new_path is None
+        prefix = path.path
+        for occurrence in self._occurrences.keys():
+            if occurrence.path[:len(prefix)] != prefix:
+                continue
+            refvalue = self._occurrences.pop(occurrence)
+            if new_path is not None:
+                moved = DictPath(self.delimiter,
+                                 new_path.path + occurrence.path[len(prefix):])
+                self._occurrences[moved] = refvalue
+
+    def _extend_list(self, cur, new, path, source=None):
+        refs = False
         if isinstance(cur, list):
-            ret = cur
+            ret = self._writable(cur)
             offset = len(cur)
         else:
-            ret = [cur]
+            ret = self._own([cur])
             offset = 1
-
-        for i in xrange(len(new)):
-            ret.append(self._merge_recurse(None, new[i], path.new_subpath(offset + i)))
+            self._type_changed = True
+            if self._has_references(cur):
+                # the value now lives at the first index of the list
+                self._move_occurrences(path, path.new_subpath(0))
+                refs = True
+
+        if source is not None and source._is_shareable(new):
+            # the new list contains no references, so its elements can be
+            # taken over as they are, without creating a path for each
+            for value in new:
+                if isinstance(value, (dict, list)):
+                    self._share(source, value)
+            ret.extend(new)
+        else:
+            # only the elements that may contain references need to be merged
+            # one by one, so that the references are tracked at their index
+            sentinel = PARAMETER_INTERPOLATION_SENTINELS[0]
+            for i in xrange(len(new)):
+                value = new[i]
+                if isinstance(value, (dict, list, RefValue)) \
+                        or (isinstance(value, types.StringTypes)
+                            and sentinel in value):
+                    value = self._merge_recurse(None, value, path, offset + i,
+                                                source)
+                    refs = refs or self._has_references(value)
+                ret.append(value)
+        if refs:
+            self._refs.add(id(ret))
         return ret
 
-    def _merge_dict(self, cur, new, path):
+    def _merge_dict(self, cur, new, path, source=None):
         if isinstance(cur, dict):
-            ret = cur
+            ret = self._writable(cur)
         else:
             # nothing sensible to do
             raise TypeError('Cannot merge dict into {0} '
@@ -134,87 +340,150 @@ class Parameters(object):
             ret.update(new)
             return ret
 
+        if source is not None and source._is_shareable(new) \
+                and not self._has_references(cur):
+            # neither dictionary contains references, so there are neither
+            # occurrences to update nor references to collect
+            return self._update_dict(ret, new, path, source)
+
+        refs = False
         for key, newvalue in new.iteritems():
-            ret[key] = self._merge_recurse(ret.get(key), newvalue,
-                                           path.new_subpath(key))
+            cur = ret.get(key)
+            if cur is None and key in ret \
+                    and isinstance(newvalue, (dict, list)):
+                # the container replaces None
+                self._type_changed = True
+            value = self._merge_recurse(cur, newvalue, path, key, source)
+            ret[key] = value
+            refs = refs or self._has_references(value)
+        if refs:
+            self._refs.add(id(ret))
         return ret
 
-    def _merge_recurse(self, cur, new, path=None):
-        if path is None:
-            path = DictPath(self.delimiter)
+    def _update_dict(self, ret, new, path, source):
+        for key, newvalue in new.iteritems():
+            cur = ret.get(key)
+            if isinstance(newvalue, (dict, list)):
+                if cur is None and key in ret:
+                    self._type_changed = True
+                ret[key] = self._merge_recurse(cur, newvalue, path, key,
+                                               source)
+            else:
+                if isinstance(cur, (dict, list)):
+                    self._type_changed = True
+                ret[key] = newvalue
+        return ret
 
+    def _merge_recurse(self, cur, new, parent, key, source=None):
         if isinstance(new, dict):
             if cur is None:
-                cur = {}
-            return self._merge_dict(cur, new, path)
+                if source is not None and source._is_shareable(new):
+                    # there is nothing to merge with, and no references to
+                    # collect, so we can just use the container of the source
+                    return self._share(source, new)
+                cur = self._own({})
+            return self._merge_dict(cur, new, parent.new_subpath(key), source)
 
         elif isinstance(new, list):
             if cur is None:
-                cur = []
-            return self._extend_list(cur, new, path)
+                if source is not None and source._is_shareable(new):
+                    return self._share(source, new)
+                cur = self._own([])
+            return self._extend_list(cur, new, parent.new_subpath(key),
+                                     source)
 
         else:
-            return self._update_scalar(cur, new, path)
+            return self._update_scalar(cur, new, parent, key)
 
     def merge(self, other):
+        self._merge_pending()
         if isinstance(other, dict):
-            self._base = self._merge_recurse(self._base, other, None)
+            if self.delimiter is None:
+                source = None
+            else:
+                source = self._scan(other)
+            self._base = self._merge_dict(self._base, other,
+                                          DictPath(self.delimiter), source)
 
         elif isinstance(other, self.__class__):
-            self._base = self._merge_recurse(self._base, other._base,
-                                             None)
+            other._merge_pending()
+            if other.delimiter == self.delimiter:
+                source = other
+            else:
+                # the containers of the source may hold strings that are
+                # references with our delimiter, so we need to walk them
+                source = None
+            self._base = self._merge_dict(self._base, other._base,
+                                          DictPath(self.delimiter), source)
+            if other._type_changed:
+                self._type_changed = True
 
         else:
             raise TypeError('Cannot merge %s objects into %s' % (type(other),
                             self.__class__.__name__))
 
     def has_unresolved_refs(self):
+        self._merge_pending()
         return len(self._occurrences) > 0
 
     def interpolate(self):
-        while self.has_unresolved_refs():
-            # we could use a view here, but this is simple enough:
-            # _interpolate_inner removes references from the refs hash after
-            # processing them, so we cannot just iterate the dict
-            path, refvalue = self._occurrences.iteritems().next()
-            self._interpolate_inner(path, refvalue)
-
-    def _interpolate_inner(self, path, refvalue):
-        self._occurrences[path] = True  # mark as seen
-        for ref in refvalue.get_references():
-            path_from_ref = DictPath(self.delimiter, ref)
-            try:
-                refvalue_inner = self._occurrences[path_from_ref]
-
-                # If there is no reference, then this will throw a KeyError,
-                # look further down where this is caught and execution passed
-                # to the next iteration of the loop
-                #
-                # If we get here, then the ref references another parameter,
-                # requiring us to recurse, dereferencing first those refs that
-                # are most used and are thus at the leaves of the dependency
-                # tree.
-
-                if refvalue_inner is True:
-                    # every call to _interpolate_inner replaces the value of
-                    # the saved occurrences of a reference with True.
-                    # Therefore, if we encounter True instead of a refvalue,
-                    # it means that we have already processed it and are now
-                    # faced with a cyclical reference.
-                    raise InfiniteRecursionError(path, ref)
-                self._interpolate_inner(path_from_ref, refvalue_inner)
-
-            except KeyError as e:
-                # not actually an error, but we are done resolving all
-                # dependencies of the current ref, so move on
+        if not self.has_unresolved_refs():
+            return
+
+        # build the dependency graph in a single pass: for every reference
+        # that refers to another value holding references, there is an edge
+        # from the path of the reference to the path of that value
+        dependencies = {}
+        for path, refvalue in self._occurrences.iteritems():
+            edges = []
+            refs = refvalue.get_references()
+            if refvalue.delimiter == self.delimiter:
+                # the paths of the references have already been split
+                paths = refvalue.get_reference_paths()
+            else:
+                paths = [DictPath(self.delimiter, ref) for ref in refs]
+            for ref, path_from_ref in zip(refs, paths):
+                if path_from_ref in self._occurrences:
+                    edges.append((ref, path_from_ref))
+            dependencies[path] = edges
+
+        # resolve the values in topological order, i.e. resolve all values a
+        # value depends on before the value itself, using an explicit stack
+        # rather than recursion, which the length of reference chains could
+        # otherwise exhaust. Values are resolved in the same order in which
+        # a recursive descent would resolve them
+        for path in self._occurrences.keys():
+            if path not in self._occurrences:
+                # already resolved as a dependency of an earlier value
                 continue
-
+            stack = [(path, iter(dependencies[path]))]
+            visiting = set([path])
+            while stack:
+                current, edges = stack[-1]
+                for ref, path_from_ref in edges:
+                    if path_from_ref not in self._occurrences:
+                        continue
+                    if path_from_ref in visiting:
+                        paths = [frame[0] for frame in stack]
+                        cycle = paths[paths.index(path_from_ref):]
+                        raise InfiniteRecursionError(current, ref,
+                                                     cycle + [path_from_ref])
+                    stack.append((path_from_ref,
+                                  iter(dependencies[path_from_ref])))
+                    visiting.add(path_from_ref)
+                    break
+
+                else:
+                    stack.pop()
+                    visiting.discard(current)
+                    self._interpolate_value(current)
+
+    def _interpolate_value(self, path):
         try:
-            new = refvalue.render(self._base)
+            new = self._occurrences[path].render(self._base)
             path.set_value(self._base, new)
 
             # finally, remove the reference from the occurrences cache
             del self._occurrences[path]
         except UndefinedVariableError as e:
             raise UndefinedVariableError(e.var, path)
-
@@ -44,6 +44,26 @@ class TestApplications(unittest.TestCase):
         a.append_if_new(TESTLIST2[2])
         self.assertSequenceEqual(a, TESTLIST1[::2])
 
+    def test_negate_then_readd(self):
+        a = Applications(['a', 'b', 'c'])
+        a.merge_unique(['~a', 'd', 'a'])
+        self.assertListEqual(a.as_list(), ['b', 'c', 'd', 'a'])
+
+    def test_merge_unique_keeps_negations(self):
+        a = Applications()
+        a.merge_unique(Applications(['~a', 'b']))
+        c = Applications(['a', 'c'])
+        c.merge_unique(a)
+        self.assertListEqual(c.as_list(), ['c', 'b'])
+
+    def test_merge_unique_negation_once(self):
+        a = Applications(['b'])
+        a.merge_unique(Applications(['~a']))
+        a.merge_unique(Applications(['~a']))
+        a.merge_unique(['~a'])
+        self.assertListEqual(a._negations.as_list(), ['a'])
+        self.assertEqual('%r' % a, "Applications(['b', '~a'], '~')")
+
     def test_repr_empty(self):
         negater = '%%'
         a = Applications(negation_prefix=negater)
@@ -105,6 +105,14 @@ class TestClasses(unittest.TestCase):
         with self.assertRaises(TypeError):
             c.merge_unique([0,1,2])
 
+    def test_merge_unique_instance_not_revalidated(self):
+        c1 = Classes(TESTLIST1)
+        c2 = Classes(TESTLIST2)
+        with mock.patch.object(Classes, 'append_if_new') as m:
+            c1.merge_unique(c2)
+            self.assertFalse(m.called)
+        self.assertListEqual(c1.as_list(), TESTLIST1 + TESTLIST2)
+
     def test_repr_empty(self):
         c = Classes()
         self.assertEqual('%r' % c, '%s(%r)' % (c.__class__.__name__, []))
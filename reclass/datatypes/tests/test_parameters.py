@@ -7,6 +7,7 @@
 # Released under the terms of the Artistic Licence 2.0
 #
 from reclass.datatypes import Parameters
+from reclass.utils.dictpath import DictPath
 from reclass.defaults import PARAMETER_INTERPOLATION_SENTINELS
 from reclass.errors import InfiniteRecursionError
 import unittest
@@ -241,5 +242,200 @@ class TestParametersNoMock(unittest.TestCase):
         with self.assertRaises(InfiniteRecursionError):
             p.interpolate()
 
+    def test_interpolate_infrecursion_cycle(self):
+        d = {'foo': 'bar'.join(PARAMETER_INTERPOLATION_SENTINELS),
+             'bar': 'meep'.join(PARAMETER_INTERPOLATION_SENTINELS),
+             'meep': 'foo'.join(PARAMETER_INTERPOLATION_SENTINELS),
+             'other': 42}
+        p = Parameters(d)
+        with self.assertRaises(InfiniteRecursionError) as e:
+            p.interpolate()
+        rotations = [' -> '.join(c) for c in (('foo', 'bar', 'meep', 'foo'),
+                                              ('bar', 'meep', 'foo', 'bar'),
+                                              ('meep', 'foo', 'bar', 'meep'))]
+        self.assertTrue(any(r in e.exception.message for r in rotations))
+
+    def test_interpolate_long_chain(self):
+        length = 5000
+        d = dict(('v{0}'.format(i),
+                  'v{0}'.format(i + 1).join(PARAMETER_INTERPOLATION_SENTINELS))
+                 for i in xrange(length))
+        d['v{0}'.format(length)] = 42
+        p = Parameters(d)
+        p.interpolate()
+        self.assertFalse(p.has_unresolved_refs())
+        self.assertEqual(p.as_dict()['v0'], 42)
+
+    def test_merge_scalar_over_dict_with_references(self):
+        p = Parameters(dict(dict={'one': '${two}'}, two=2))
+        p.merge(dict(dict=None))
+        p.merge(dict(dict={'one': 1}))
+        p.interpolate()
+        self.assertDictEqual(p.as_dict(), dict(dict={'one': 1}, two=2))
+
+    def test_merge_list_into_reference(self):
+        p = Parameters(dict(key='${two}', two=2))
+        p.merge(dict(key=[3]))
+        p.interpolate()
+        self.assertDictEqual(p.as_dict(), dict(key=[2, 3], two=2))
+
+    def test_type_changed(self):
+        p = Parameters(dict(key=1))
+        p.merge(dict(key=2))
+        self.assertFalse(p.type_changed)
+        p.merge(dict(key=[2]))
+        self.assertTrue(p.type_changed)
+
+    def test_type_changed_scalar_over_dict(self):
+        p = Parameters(dict(key={'one': 1}))
+        p.merge(dict(key={'two': 2}))
+        self.assertFalse(p.type_changed)
+        p.merge(dict(key=None))
+        self.assertTrue(p.type_changed)
+
+    def test_merge_shares_subtrees(self):
+        p1 = Parameters(dict(dict=SIMPLE))
+        p2 = Parameters()
+        p2.merge(p1)
+        self.assertIs(p2._base['dict'], p1._base['dict'])
+
+    def test_merge_does_not_share_references(self):
+        p1 = Parameters(dict(dict={'one': '${two}'}, two=2))
+        p2 = Parameters()
+        p2.merge(p1)
+        self.assertIsNot(p2._base['dict'], p1._base['dict'])
+        p2.interpolate()
+        self.assertDictEqual(p2.as_dict()['dict'], {'one': 2})
+        self.assertTrue(p1.has_unresolved_refs())
+
+    def test_merge_copies_on_write(self):
+        p1 = Parameters(dict(dict=SIMPLE, list=[1]))
+        p2 = Parameters()
+        p2.merge(p1)
+        p2.merge(dict(dict={'four': 4}, list=[2]))
+        self.assertDictEqual(p1.as_dict(), dict(dict=SIMPLE, list=[1]))
+        goal = SIMPLE.copy()
+        goal['four'] = 4
+        self.assertDictEqual(p2.as_dict(), dict(dict=goal, list=[1, 2]))
+
+    def test_source_copies_on_write(self):
+        p1 = Parameters(dict(dict=SIMPLE))
+        p2 = Parameters()
+        p2.merge(p1)
+        p1.merge(dict(dict={'four': 4}))
+        self.assertDictEqual(p2.as_dict(), dict(dict=SIMPLE))
+
+    def test_as_dict_unshares(self):
+        p1 = Parameters(dict(dict={'nested': SIMPLE}))
+        p2 = Parameters()
+        p2.merge(p1)
+        ret = p2.as_dict()
+        self.assertIsNot(ret['dict'], p1._base['dict'])
+        self.assertIsNot(ret['dict']['nested'], p1._base['dict']['nested'])
+        self.assertDictEqual(ret, dict(dict={'nested': SIMPLE}))
+
+    def test_as_dict_keeps_identical_references(self):
+        p1 = Parameters(dict(dict=SIMPLE))
+        p2 = Parameters(dict(copy='${dict}'))
+        p2.merge(p1)
+        p2.interpolate()
+        ret = p2.as_dict()
+        self.assertIsNot(ret['dict'], p1._base['dict'])
+        self.assertIs(ret['copy'], ret['dict'])
+
+    def test_merge_dict_shares_subtrees_without_references(self):
+        mapping = dict(dict={'nested': SIMPLE}, refs={'one': '${dict:nested}'})
+        p = Parameters(mapping)
+        self.assertIs(p._base['dict'], mapping['dict'])
+        self.assertIsNot(p._base['refs'], mapping['refs'])
+        p.interpolate()
+        self.assertDictEqual(p.as_dict()['refs'], {'one': SIMPLE})
+
+    def test_merge_dict_does_not_modify_mapping(self):
+        mapping = dict(dict={'nested': {'one': 1}}, list=[1])
+        p = Parameters(mapping)
+        p.merge(dict(dict={'nested': {'two': 2}}, list=[2]))
+        self.assertDictEqual(mapping, dict(dict={'nested': {'one': 1}},
+                                           list=[1]))
+        self.assertDictEqual(p.as_dict(),
+                             dict(dict={'nested': {'one': 1, 'two': 2}},
+                                  list=[1, 2]))
+
+    def test_merge_dict_does_not_alias_subtrees(self):
+        # e.g. YAML anchors and aliases
+        alias = {'one': 1}
+        p = Parameters(dict(first=alias, second=alias))
+        ret = p.as_dict()
+        self.assertIsNot(ret['first'], ret['second'])
+        self.assertDictEqual(ret['second'], alias)
+
+    def test_merge_dicts_without_references(self):
+        p = Parameters(dict(dict={'one': [1], 'two': 2, 'three': None}))
+        p.merge(dict(dict={'one': 1, 'three': {'four': 4}}))
+        self.assertTrue(p.type_changed)
+        self.assertDictEqual(p.as_dict(),
+                             dict(dict={'one': 1, 'two': 2,
+                                        'three': {'four': 4}}))
+
+    def test_merge_dicts_without_references_over_references(self):
+        p = Parameters(dict(dict={'one': '${two}'}, two=2))
+        p.merge(dict(dict={'one': 1}))
+        p.interpolate()
+        self.assertDictEqual(p.as_dict(), dict(dict={'one': 1}, two=2))
+
+    def test_extend_list_without_references(self):
+        p1 = Parameters(dict(list=[{'one': 1}, 2, 'three']))
+        p2 = Parameters(dict(list=[0]))
+        with mock.patch.object(DictPath, 'new_subpath') as m:
+            p2.merge(p1)
+            # for the list itself, but none for its elements
+            self.assertEqual(m.call_count, 1)
+        self.assertIs(p2._base['list'][1], p1._base['list'][0])
+        p2.merge(dict(list=[{'one': 2}]))
+        self.assertDictEqual(p1.as_dict(), dict(list=[{'one': 1}, 2, 'three']))
+        self.assertDictEqual(p2.as_dict(),
+                             dict(list=[0, {'one': 1}, 2, 'three', {'one': 2}]))
+
+    def test_extend_list_with_references(self):
+        p = Parameters(dict(list=[1], two=2))
+        p.merge(dict(list=[2, '${two}', {'three': '${two}'}, 'four']))
+        p.interpolate()
+        self.assertListEqual(p.as_dict()['list'], [1, 2, 2, {'three': 2},
+                                                   'four'])
+
+    def test_lazy_not_walked(self):
+        with mock.patch.object(Parameters, '_merge_dict') as m:
+            p = Parameters(dict(dict=SIMPLE), lazy=True)
+            self.assertFalse(m.called)
+
+    def test_lazy_merged_once(self):
+        p1 = Parameters(dict(dict={'one': '${two}'}, two=2), lazy=True)
+        with mock.patch.object(p1, '_scan', wraps=p1._scan) as m:
+            p2 = Parameters()
+            p2.merge(p1)
+            p3 = Parameters()
+            p3.merge(p1)
+            self.assertEqual(m.call_count, 1)
+        p2.interpolate()
+        self.assertDictEqual(p2.as_dict(), dict(dict={'one': 2}, two=2))
+
+    def test_lazy_equals_eager(self):
+        mapping = dict(dict={'one': 1}, two=2, list=[1])
+        lazy = Parameters(mapping, lazy=True)
+        self.assertEqual(lazy, Parameters(mapping))
+        self.assertEqual(len(lazy), 3)
+        lazy = Parameters(dict(one='${two}', two=2), lazy=True)
+        self.assertTrue(lazy.has_unresolved_refs())
+
+    def test_lazy_merge_into(self):
+        p = Parameters(dict(list=[1], scalar=1), lazy=True)
+        p.merge(dict(list=[2], scalar=[2]))
+        self.assertTrue(p.type_changed)
+        self.assertDictEqual(p.as_dict(), dict(list=[1, 2], scalar=[1, 2]))
+
+    def test_lazy_wrong_type(self):
+        with self.assertRaises(TypeError):
+            Parameters('wrong type', lazy=True)
+
 if __name__ == '__main__':
     unittest.main()
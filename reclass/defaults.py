@@ -16,6 +16,13 @@ OPT_NODES_URI = 'nodes'
 OPT_CLASSES_URI = 'classes'
 OPT_PRETTY_PRINT = True
 OPT_OUTPUT = 'yaml'
+OPT_JOBS = 1
+OPT_STATS = False
+OPT_CACHE_DIR = None
+OPT_SNAPSHOT = None
+OPT_SOCKET = os.path.join(os.path.expanduser('~'), '.reclass.sock')
+OPT_LIST_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache',
+                                  RECLASS_NAME)
 
 CONFIG_FILE_SEARCH_PATH = [os.getcwd(),
                            os.path.expanduser('~'),
@@ -12,6 +12,12 @@ import traceback
 
 from reclass.defaults import PARAMETER_INTERPOLATION_SENTINELS
 
+def _restore_exception(cls, state):
+    e = cls.__new__(cls)
+    e.__dict__.update(state)
+    return e
+
+
 class ReclassException(Exception):
 
     def __init__(self, rc=posix.EX_SOFTWARE, msg=None):
@@ -29,6 +35,12 @@ class ReclassException(Exception):
         else:
             return 'No error message provided.'
 
+    def __reduce__(self):
+        # subclasses take all sorts of constructor arguments, so restore
+        # instances from their state when unpickling them, e.g. when they
+        # have been raised in a worker process
+        return (_restore_exception, (self.__class__, self.__dict__))
+
     def exit_with_message(self, out=sys.stderr):
         print >>out, self.message
         if self._traceback:
@@ -119,6 +131,26 @@ class ClassNotFound(NotFoundError):
         self._nodename = nodename
 
 
+class ClassCycleError(ReclassException):
+
+    def __init__(self, cycle, nodename=None, rc=posix.EX_DATAERR):
+        super(ClassCycleError, self).__init__(rc=rc, msg=None)
+        self._cycle = cycle
+        self._nodename = nodename
+
+    def _get_message(self):
+        if self._nodename:
+            msg = "Class '{0}' (in ancestry of node '{1}') inherits from " \
+                  "itself: {2}"
+        else:
+            msg = "Class '{0}' inherits from itself: {2}"
+        return msg.format(self._cycle[0], self._nodename,
+                          ' -> '.join(self._cycle))
+
+    def set_nodename(self, nodename):
+        self._nodename = nodename
+
+
 class InterpolationError(ReclassException):
 
     def __init__(self, msg, rc=posix.EX_DATAERR):
@@ -158,14 +190,18 @@ class IncompleteInterpolationError(InterpolationError):
 
 class InfiniteRecursionError(InterpolationError):
 
-    def __init__(self, path, ref):
+    def __init__(self, path, ref, cycle=None):
         super(InfiniteRecursionError, self).__init__(msg=None)
         self._path = path
         self._ref = ref.join(PARAMETER_INTERPOLATION_SENTINELS)
+        self._cycle = cycle
 
     def _get_message(self):
         msg = "Infinite recursion while resolving {0} at {1}"
-        return msg.format(self._ref, self._path)
+        msg = msg.format(self._ref, self._path)
+        if self._cycle:
+            msg += ': ' + ' -> '.join(str(p) for p in self._cycle)
+        return msg
 
 
 class MappingError(ReclassException):
@@ -211,3 +247,25 @@ class DuplicateNodeNameError(NameError):
               "definition in '{3}'. Nodes can only be defined once " \
               "per inventory."
         return msg.format(self._storage, self._name, self._uris[1], self._uris[0])
+
+
+class SnapshotError(ReclassException):
+
+    def __init__(self, path, reason, rc=posix.EX_DATAERR):
+        super(SnapshotError, self).__init__(rc=rc, msg=None)
+        self._path = path
+        self._reason = reason
+
+    def _get_message(self):
+        return "Cannot use snapshot {0}: {1}".format(self._path, self._reason)
+
+
+class DaemonError(ReclassException):
+
+    def __init__(self, path, reason, rc=posix.EX_UNAVAILABLE):
+        super(DaemonError, self).__init__(rc=rc, msg=None)
+        self._path = path
+        self._reason = reason
+
+    def _get_message(self):
+        return "Cannot listen on {0}: {1}".format(self._path, self._reason)
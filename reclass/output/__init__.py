@@ -15,6 +15,37 @@ class OutputterBase(object):
         raise NotImplementedError, "dump() method not yet implemented"
 
 
+class StreamingOutputterBase(OutputterBase):
+    '''
+    An outputter that can also write the document to a stream incrementally,
+    producing exactly the same document as dump().
+
+    The values of the dictionary found by following nodes_path from the top
+    of the document (the nodes of an inventory, by default) are serialised
+    and written one at a time, so that the document never exists as a whole
+    in memory. Those values must not share any objects. Documents without
+    such a dictionary are written in one go.
+    '''
+    NODES_PATH = ('nodes',)
+
+    def dump_to(self, data, stream, pretty_print=False, nodes_path=NODES_PATH):
+        raise NotImplementedError, "dump_to() method not yet implemented"
+
+    @staticmethod
+    def _get_nodes(data, nodes_path):
+        # returns the dictionary at nodes_path, or None if there is none, or
+        # it is empty and hence not worth streaming
+        if not nodes_path:
+            return None
+        for key in nodes_path:
+            if not isinstance(data, dict) or key not in data:
+                return None
+            data = data[key]
+        if not isinstance(data, dict) or not data:
+            return None
+        return data
+
+
 class OutputLoader(object):
 
     def __init__(self, outputter):
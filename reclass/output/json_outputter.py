@@ -6,12 +6,63 @@
 # Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
 # Released under the terms of the Artistic Licence 2.0
 #
-from reclass.output import OutputterBase
+from reclass.output import OutputterBase, StreamingOutputterBase
 import json
 
+# stands in for the nodes while the rest of the document is serialised
+_PLACEHOLDER = '\0reclass nodes\0'
+
 class Outputter(OutputterBase):
 
-    def dump(self, data, pretty_print=False):
+    @staticmethod
+    def _get_format(pretty_print):
         separators = (',', ': ') if pretty_print else (',', ':')
         indent = 2 if pretty_print else None
+        return indent, separators
+
+    def dump(self, data, pretty_print=False):
+        indent, separators = Outputter._get_format(pretty_print)
         return json.dumps(data, indent=indent, separators=separators)
+
+
+class StreamingOutputter(Outputter, StreamingOutputterBase):
+
+    def dump_to(self, data, stream, pretty_print=False,
+                nodes_path=StreamingOutputterBase.NODES_PATH):
+        nodes = StreamingOutputterBase._get_nodes(data, nodes_path)
+        if nodes is None:
+            stream.write(self.dump(data, pretty_print))
+            return
+
+        # serialise the document without the nodes first. Replacing the value
+        # of a key does not change the order of the dictionary
+        parent = data
+        for key in nodes_path[:-1]:
+            parent = parent[key]
+        parent[nodes_path[-1]] = _PLACEHOLDER
+        try:
+            head = self.dump(data, pretty_print)
+        finally:
+            parent[nodes_path[-1]] = nodes
+        prefix, suffix = head.split(json.dumps(_PLACEHOLDER), 1)
+
+        # the nodes are nested at a deeper level of indentation than they
+        # are serialised at, and strings in JSON cannot contain line breaks
+        indent, separators = Outputter._get_format(pretty_print)
+        item_separator, key_separator = separators
+        if indent is None:
+            newline_indent = closing_indent = ''
+        else:
+            newline_indent = '\n' + ' ' * (indent * (len(nodes_path) + 1))
+            closing_indent = '\n' + ' ' * (indent * len(nodes_path))
+
+        stream.write(prefix)
+        stream.write('{')
+        for i, (nodename, nodeinfo) in enumerate(nodes.iteritems()):
+            if i > 0:
+                stream.write(item_separator)
+            value = json.dumps(nodeinfo, indent=indent, separators=separators)
+            stream.write(newline_indent + json.dumps(nodename) + key_separator
+                         + value.replace('\n', newline_indent))
+        stream.write(closing_indent + '}')
+        stream.write(suffix)
@@ -0,0 +1,64 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass import output, output_to
+from StringIO import StringIO
+import unittest
+
+def _make_inventory():
+    nodes = {}
+    for i in range(20):
+        shared = {'nested': ['one', 'two']}
+        nodes['node{0}'.format(i)] = {
+            '__reclass__': {'node': 'node{0}'.format(i)},
+            'classes': ['one', 'two'],
+            'applications': [u'ünïcode'],
+            'parameters': {'copy': shared, 'original': shared,
+                           'long': 'word ' * 30, 'number': 1.5,
+                           'empty': {}, 'none': None}}
+    return {'__reclass__': {'timestamp': 'now'},
+            'nodes': nodes,
+            'classes': {'one': sorted(nodes), 'two': sorted(nodes)},
+            'applications': {u'ünïcode': sorted(nodes)}}
+
+
+class TestStreamingOutputters(unittest.TestCase):
+
+    def _assertIdentical(self, data, **kwargs):
+        for fmt in ('json', 'yaml'):
+            for pretty_print in (False, True):
+                stream = StringIO()
+                output_to(stream, data, fmt, pretty_print, **kwargs)
+                self.assertEqual(stream.getvalue(),
+                                 output(data, fmt, pretty_print))
+
+    def test_inventory(self):
+        self._assertIdentical(_make_inventory())
+
+    def test_inventory_anchors(self):
+        stream = StringIO()
+        output_to(stream, _make_inventory(), 'yaml')
+        self.assertIn('&id020', stream.getvalue())
+
+    def test_inventory_unchanged(self):
+        data = _make_inventory()
+        output_to(StringIO(), data, 'json')
+        self.assertDictEqual(data, _make_inventory())
+
+    def test_nodes_path(self):
+        data = {'group': ['node1'],
+                '_meta': {'hostvars': _make_inventory()['nodes']}}
+        self._assertIdentical(data, nodes_path=('_meta', 'hostvars'))
+
+    def test_no_nodes(self):
+        self._assertIdentical({'nodes': {}, 'classes': {}})
+        self._assertIdentical(['not', 'a', 'dictionary'])
+        self._assertIdentical(_make_inventory(), nodes_path=None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,10 +6,67 @@
 # Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
 # Released under the terms of the Artistic Licence 2.0
 #
-from reclass.output import OutputterBase
+from reclass.output import OutputterBase, StreamingOutputterBase
 import yaml
+from reclass.utils import libyaml
 
 class Outputter(OutputterBase):
 
     def dump(self, data, pretty_print=False):
-        return yaml.dump(data, default_flow_style=not pretty_print)
+        return yaml.dump(data, Dumper=libyaml.Dumper,
+                         default_flow_style=not pretty_print)
+
+
+class StreamingOutputter(Outputter, StreamingOutputterBase):
+
+    @staticmethod
+    def _serialize(dumper, data):
+        # what Dumper.represent() does, but without starting a new document,
+        # and forgetting about the objects once they have been written. The
+        # numbering of anchors continues across calls
+        node = dumper.represent_data(data)
+        dumper.anchor_node(node)
+        dumper.serialize_node(node, None, None)
+        dumper.represented_objects = {}
+        dumper.object_keeper = []
+        dumper.alias_key = None
+        dumper.serialized_nodes = {}
+        dumper.anchors = {}
+
+    @staticmethod
+    def _emit_mapping(dumper, mapping, path):
+        # emits the events the representer and serialiser would emit for the
+        # dictionary, serialising the values one by one
+        dumper.emit(yaml.MappingStartEvent(None, u'tag:yaml.org,2002:map',
+                                           True,
+                                           flow_style=dumper.default_flow_style))
+        for key in sorted(mapping):
+            StreamingOutputter._serialize(dumper, key)
+            if path and key == path[0]:
+                StreamingOutputter._emit_mapping(dumper, mapping[key],
+                                                 path[1:])
+            else:
+                StreamingOutputter._serialize(dumper, mapping[key])
+        dumper.emit(yaml.MappingEndEvent())
+
+    def dump_to(self, data, stream, pretty_print=False,
+                nodes_path=StreamingOutputterBase.NODES_PATH):
+        nodes = StreamingOutputterBase._get_nodes(data, nodes_path)
+        # the same settings yaml.dump() uses
+        dumper = libyaml.StreamingDumper(stream,
+                                         default_flow_style=not pretty_print,
+                                         encoding='utf-8')
+        try:
+            dumper.open()
+            if nodes is None:
+                dumper.represent(data)
+            else:
+                dumper.emit(yaml.DocumentStartEvent(
+                    explicit=dumper.use_explicit_start,
+                    version=dumper.use_version, tags=dumper.use_tags))
+                StreamingOutputter._emit_mapping(dumper, data, nodes_path)
+                dumper.emit(yaml.DocumentEndEvent(
+                    explicit=dumper.use_explicit_end))
+            dumper.close()
+        finally:
+            dumper.dispose()
@@ -0,0 +1,344 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+'''
+Snapshots of a compiled inventory, from which nodeinfo and inventory
+queries can be answered without resolving any nodes.
+
+A snapshot file starts with SNAPSHOT_MAGIC, followed by one pickle per
+node, a pickle of the reverse maps of the inventory and a pickle of the
+fingerprint of the files the inventory was compiled from (see
+reclass.utils.fingerprint). Next comes the index of the nodes: the names
+of the nodes, followed by a table of one fixed-width entry per node,
+sorted by name, with the offset and length of the name and of the records
+of the node. The header comes last: a pickle with the settings the
+inventory was compiled with and the offsets of the index, the reverse maps
+and the fingerprint. The file ends with the offset of the header.
+
+A snapshot is stale as soon as any of the fingerprinted files or
+directories has changed, or when it is used with different settings.
+
+Snapshots are read through a read-only memory map, so that the processes
+on a host that read the same snapshot share its pages, and a query only
+touches the pages of the header, of the entries of the index its binary
+search compares, and of the node it asks for. Telling whether the snapshot
+is stale takes a stat of every fingerprinted path, however, which
+SnapshotStore does at most once every CHECK_INTERVAL seconds (see
+reclass.utils.fingerprint.FingerprintWatch). A new snapshot replaces the
+old one by renaming, which SnapshotStore notices with the next query.
+'''
+
+import mmap, os, posix, sys, struct, tempfile
+import cPickle as pickle
+
+from reclass.core import Core
+from reclass.errors import SnapshotError, NodeNotFound
+from reclass.utils.fingerprint import stat_key, FingerprintWatch
+from reclass.version import VERSION
+
+SNAPSHOT_MAGIC = 'RECLASS\0'
+# bump whenever the layout or the contents of the records change
+SNAPSHOT_FORMAT = 3
+
+_TRAILER = struct.Struct('<Q')
+# offset and length of the name, of the record of the node in the inventory
+# and of its record as returned by nodeinfo()
+_ENTRY = struct.Struct('<QIQIQI')
+
+
+def make_settings(storage_type, nodes_uri, classes_uri, class_mappings,
+                  default_environment=None):
+    '''
+    Returns the settings that, besides the files, determine the compiled
+    inventory and so must match for a snapshot to be used.
+    '''
+    return {'version': VERSION,
+            'storage_type': storage_type,
+            'nodes_uri': nodes_uri,
+            'classes_uri': classes_uri,
+            'class_mappings': list(class_mappings or []),
+            'default_environment': default_environment
+           }
+
+
+def _umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def write_snapshot(path, storage, class_mappings, settings, jobs=1):
+    '''
+    Compiles the inventory of the storage and writes it to a snapshot at
+    path. An existing snapshot is replaced atomically, so readers see either
+    the old or the new one. Returns the compiled inventory.
+    '''
+    # taken before anything is read, so that changes made while compiling
+    # make the snapshot stale
+    try:
+        fingerprint = storage.fingerprint()
+    except NotImplementedError, e:
+        raise SnapshotError(path, e.message)
+
+    # created before compiling, so as not to compile for nothing
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), prefix='.snapshot')
+    except OSError, e:
+        raise SnapshotError(path, e.strerror, rc=posix.EX_CANTCREAT)
+    try:
+        fp = os.fdopen(fd, 'wb')
+        try:
+            core = Core(storage, class_mappings, jobs=jobs)
+            inventory = core.inventory()
+            _write_records(fp, storage, class_mappings, jobs, core, inventory,
+                           {'format': SNAPSHOT_FORMAT,
+                            'settings': settings,
+                            'fingerprint': fingerprint
+                           })
+        finally:
+            fp.close()
+        os.chmod(tmp_path, 0666 & ~_umask())
+        os.rename(tmp_path, path)
+    except:
+        os.unlink(tmp_path)
+        raise
+    return inventory
+
+
+def _write_records(fp, storage, class_mappings, jobs, core, inventory,
+                   header):
+
+    def put(obj):
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        offset = fp.tell()
+        fp.write(data)
+        return offset, len(data)
+
+    fp.write(SNAPSHOT_MAGIC)
+    order = list(storage.enumerate_nodes())
+    nodes = inventory['nodes']
+    records = dict((n, put(nodes[n])) for n in order)
+    if core.has_mutators():
+        # mutators may treat a node differently when it is asked for on its
+        # own, so the nodes are also compiled the way nodeinfo() would
+        nodeinfo = Core(storage, class_mappings,
+                        jobs=jobs).nodeinfo_many(order)
+        for n in order:
+            records[n] += put(nodeinfo[n])
+    else:
+        for n in order:
+            records[n] += records[n]
+    header['reverse_maps'] = put((inventory['classes'],
+                                  inventory['applications']))
+    header['fingerprint'] = put(header['fingerprint'])
+
+    names = sorted((_encode(n), n) for n in records)
+    entries = []
+    for name, n in names:
+        entries.append(_ENTRY.pack(fp.tell(), len(name), *records[n]))
+        fp.write(name)
+    header['index'] = (fp.tell(), len(entries))
+    fp.write(''.join(entries))
+    header['__reclass__'] = inventory['__reclass__']
+    offset, length = put(header)
+    fp.write(_TRAILER.pack(offset))
+
+
+def _encode(nodename):
+    # the index compares the names as byte strings
+    if isinstance(nodename, unicode):
+        return nodename.encode('utf-8')
+    return nodename
+
+
+class Snapshot(object):
+    '''
+    A snapshot file, answering queries like Core does.
+    '''
+    def __init__(self, path):
+        self._path = path
+        try:
+            fp = open(path, 'rb')
+        except IOError, e:
+            raise SnapshotError(path, e.strerror)
+        try:
+            st = os.fstat(fp.fileno())
+            self._file_key = (st.st_mtime, st.st_size, st.st_ino)
+            if st.st_size < len(SNAPSHOT_MAGIC) + _TRAILER.size:
+                raise SnapshotError(path, 'not a snapshot file')
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            # the map keeps the file open for as long as it is needed
+            fp.close()
+        self._fingerprint = None
+        try:
+            self._header = self._read_header()
+        except:
+            self._map.close()
+            raise
+
+    path = property(lambda self: self._path)
+    settings = property(lambda self: self._header['settings'])
+
+    def _get_fingerprint(self):
+        # only loaded when asked for, which SnapshotStore does once
+        if self._fingerprint is None:
+            try:
+                self._fingerprint = self._load(*self._header['fingerprint'])
+            except Exception:
+                raise SnapshotError(self._path, 'file is truncated')
+        return self._fingerprint
+    fingerprint = property(_get_fingerprint)
+
+    # the state of the file that was opened, to compare with stat_key()
+    file_key = property(lambda self: self._file_key)
+
+    def _read_header(self):
+        m = self._map
+        if m[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise SnapshotError(self._path, 'not a snapshot file')
+        end = len(m) - _TRAILER.size
+        offset, = _TRAILER.unpack_from(m, end)
+        try:
+            header = pickle.loads(m[offset:end])
+        except Exception:
+            raise SnapshotError(self._path, 'file is truncated')
+        if not isinstance(header, dict) \
+                or header.get('format') != SNAPSHOT_FORMAT:
+            raise SnapshotError(self._path, 'unsupported format')
+        index, count = header['index']
+        if index + count * _ENTRY.size > offset:
+            raise SnapshotError(self._path, 'file is truncated')
+        return header
+
+    def close(self):
+        self._map.close()
+
+    def _load(self, offset, length):
+        return pickle.loads(self._map[offset:offset + length])
+
+    def _entries(self):
+        index, count = self._header['index']
+        for i in xrange(count):
+            yield _ENTRY.unpack_from(self._map, index + i * _ENTRY.size)
+
+    def _find(self, nodename):
+        # binary search of the entry of the node in the index
+        m = self._map
+        name = _encode(nodename)
+        index, count = self._header['index']
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = _ENTRY.unpack_from(m, index + mid * _ENTRY.size)
+            key = m[entry[0]:entry[0] + entry[1]]
+            if key < name:
+                lo = mid + 1
+            elif key > name:
+                hi = mid
+            else:
+                return entry
+        return None
+
+    def nodeinfo(self, nodename):
+        entry = self._find(nodename)
+        if entry is None:
+            settings = self._header['settings']
+            raise NodeNotFound(settings['storage_type'], nodename,
+                               settings['nodes_uri'])
+        return self._load(*entry[4:])
+
+    def inventory(self):
+        m = self._map
+        nodes = {}
+        for entry in self._entries():
+            nodes[m[entry[0]:entry[0] + entry[1]]] = self._load(*entry[2:4])
+        classes, applications = self._load(*self._header['reverse_maps'])
+        return {'__reclass__': dict(self._header['__reclass__']),
+                'nodes': nodes,
+                'classes': classes,
+                'applications': applications
+               }
+
+
+class SnapshotStore(object):
+    '''
+    The snapshot published at a path, for Core to answer queries from while
+    it is up to date. A snapshot replacing the previous one is opened with
+    the next query.
+
+    Why a snapshot cannot be used is told once on stderr, unless quiet,
+    after which the queries are left to Core until another snapshot is
+    published.
+    '''
+    def __init__(self, path, settings, quiet=False):
+        self._path = path
+        self._settings = settings
+        self._quiet = quiet
+        self._snapshot = None
+        self._watch = None
+        # the file_key of the snapshot found unusable, where None stands
+        # for a missing file, so it cannot be the initial value
+        self._unusable = False
+
+    path = property(lambda self: self._path)
+
+    def _tell(self, message):
+        if not self._quiet:
+            print >>sys.stderr, message
+
+    def _open(self, key):
+        if self._snapshot is not None:
+            if self._snapshot.file_key == key:
+                return self._snapshot
+            self._snapshot.close()
+            self._snapshot = None
+        if key == self._unusable:
+            return None
+        try:
+            snapshot = Snapshot(self._path)
+        except SnapshotError, e:
+            self._unusable = key
+            self._tell(e.message)
+            return None
+        if snapshot.settings != self._settings:
+            self._unusable = key
+            snapshot.close()
+            self._tell('Snapshot {0} was compiled with different settings, '
+                       'ignoring it'.format(self._path))
+            return None
+        try:
+            self._watch = FingerprintWatch(snapshot.fingerprint)
+        except SnapshotError, e:
+            self._unusable = key
+            snapshot.close()
+            self._tell(e.message)
+            return None
+        self._snapshot = snapshot
+        return snapshot
+
+    def get(self):
+        '''
+        Returns the snapshot if it is up to date, or else None.
+        '''
+        snapshot = self._open(stat_key(self._path))
+        if snapshot is None:
+            return None
+        if self._watch.changed_paths():
+            self._unusable = snapshot.file_key
+            self._snapshot = None
+            snapshot.close()
+            self._tell('Snapshot {0} is stale, ignoring it'.format(self._path))
+            return None
+        return snapshot
+
+    def close(self):
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
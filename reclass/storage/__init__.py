@@ -23,5 +23,19 @@ class NodeStorageBase(object):
         raise NotImplementedError(msg.format(self.name))
 
     def enumerate_nodes(self):
+        # may return any iterable of node names, including an iterator
         msg = "Storage class '{0}' does not implement node enumeration."
         raise NotImplementedError(msg.format(self.name))
+
+    def fingerprint(self):
+        # the state of the files the inventory is read from, as returned by
+        # reclass.utils.fingerprint.fingerprint()
+        msg = "Storage class '{0}' does not implement fingerprinting."
+        raise NotImplementedError(msg.format(self.name))
+
+    def invalidate_node(self, name):
+        # storage backends that do not cache have nothing to forget
+        pass
+
+    def invalidate_class(self, name):
+        pass
@@ -29,6 +29,7 @@ class MemcacheProxy(NodeStorageBase):
             self._nodelist_cache = None
 
     name = property(lambda self: self._real_storage.name)
+    real_storage = property(lambda self: self._real_storage)
 
     @staticmethod
     def _cache_proxy(name, cache, getter):
@@ -60,6 +61,21 @@ class MemcacheProxy(NodeStorageBase):
             return self._real_storage.enumerate_nodes()
 
         elif self._nodelist_cache is None:
-            self._nodelist_cache = self._real_storage.enumerate_nodes()
+            # the storage may return an iterator, which can only be consumed
+            # once
+            self._nodelist_cache = list(self._real_storage.enumerate_nodes())
 
         return self._nodelist_cache
+
+    def fingerprint(self):
+        return self._real_storage.fingerprint()
+
+    def invalidate_node(self, name):
+        if self._cache_nodes:
+            self._nodes_cache.pop(name, None)
+        self._real_storage.invalidate_node(name)
+
+    def invalidate_class(self, name):
+        if self._cache_classes:
+            self._classes_cache.pop(name, None)
+        self._real_storage.invalidate_class(name)
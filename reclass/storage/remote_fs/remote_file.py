@@ -37,7 +37,8 @@ class RemoteFile(object):
         parameters = self._data.get('parameters')
         if parameters is None:
             parameters = {}
-        parameters = datatypes.Parameters(parameters)
+        # the parameters are walked when the entity is first merged
+        parameters = datatypes.Parameters(parameters, lazy=True)
 
         env = self._data.get('environment', default_environment)
 
@@ -80,6 +80,34 @@ class TestMemcacheProxy(unittest.TestCase):
         expected = [mock.call()] # once only
         self.assertListEqual(self._storage.enumerate_nodes.call_args_list, expected)
 
+    def test_nodelist_caching_iterator(self):
+        p = MemcacheProxy(self._storage, cache_nodelist=True)
+        self._storage.enumerate_nodes.return_value = iter(['foo', 'bar'])
+        self.assertListEqual(list(p.enumerate_nodes()), ['foo', 'bar'])
+        self.assertListEqual(list(p.enumerate_nodes()), ['foo', 'bar'])
+
+    def test_invalidate_class(self):
+        p = MemcacheProxy(self._storage, cache_classes=True)
+        NAME = 'foo'; RET = 'baz'
+        self._storage.get_class.return_value = RET
+        p.get_class(NAME)
+        p.invalidate_class(NAME)
+        p.get_class(NAME)
+        expected = [mock.call(NAME), mock.call(NAME)] # called again
+        self.assertListEqual(self._storage.get_class.call_args_list, expected)
+        self._storage.invalidate_class.assert_called_once_with(NAME)
+
+    def test_invalidate_node(self):
+        p = MemcacheProxy(self._storage, cache_nodes=True)
+        NAME = 'foo'; RET = 'baz'
+        self._storage.get_node.return_value = RET
+        p.get_node(NAME)
+        p.invalidate_node(NAME)
+        p.get_node(NAME)
+        expected = [mock.call(NAME), mock.call(NAME)] # called again
+        self.assertListEqual(self._storage.get_node.call_args_list, expected)
+        self._storage.invalidate_node.assert_called_once_with(NAME)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -12,6 +12,8 @@ from reclass.storage import NodeStorageBase
 from yamlfile import YamlFile
 from directory import Directory
 from reclass.datatypes import Entity
+from reclass.utils.parsecache import ParseCache
+from reclass.utils.fingerprint import stat_key
 import reclass.errors
 
 FILE_EXTENSION = '.yml'
@@ -23,15 +25,17 @@ def vvv(msg):
 
 class ExternalNodeStorage(NodeStorageBase):
 
-    def __init__(self, nodes_uri, classes_uri, default_environment=None):
+    def __init__(self, nodes_uri, classes_uri, default_environment=None,
+                 cache_dir=None):
         super(ExternalNodeStorage, self).__init__(STORAGE_NAME)
+        self._fingerprint = {}
 
         def name_mangler(relpath, name):
             # nodes are identified just by their basename, so
             # no mangling required
             return relpath, name
         self._nodes_uri = nodes_uri
-        self._nodes = self._enumerate_inventory(nodes_uri, name_mangler)
+        self._node_name_mangler = name_mangler
 
         def name_mangler(relpath, name):
             if relpath == '.':
@@ -46,24 +50,44 @@ class ExternalNodeStorage(NodeStorageBase):
                 parts.append(name)
             return relpath, '.'.join(parts)
         self._classes_uri = classes_uri
-        self._classes = self._enumerate_inventory(classes_uri, name_mangler)
+        self._class_name_mangler = name_mangler
+
+        # the directories are only walked once the inventory is needed, so
+        # that creating a storage whose queries are answered from a snapshot
+        # costs next to nothing
+        self._nodes = None
+        self._classes = None
 
         self._default_environment = default_environment
 
+        self._cache = None
+        if cache_dir is not None:
+            self._cache = ParseCache(cache_dir)
+
     nodes_uri = property(lambda self: self._nodes_uri)
     classes_uri = property(lambda self: self._classes_uri)
 
+    def _enumerate(self):
+        if self._nodes is None:
+            nodes = self._enumerate_inventory(self._nodes_uri,
+                                              self._node_name_mangler)
+            self._classes = self._enumerate_inventory(self._classes_uri,
+                                                      self._class_name_mangler)
+            self._nodes = nodes
+
     def _enumerate_inventory(self, basedir, name_mangler):
         ret = {}
         def register_fn(dirpath, filenames):
             filenames = fnmatch.filter(filenames, '*{0}'.format(FILE_EXTENSION))
             vvv('REGISTER {0} in path {1}'.format(filenames, dirpath))
+            self._fingerprint[dirpath] = stat_key(dirpath)
             for f in filenames:
                 name = os.path.splitext(f)[0]
                 relpath = os.path.relpath(dirpath, basedir)
                 if callable(name_mangler):
                     relpath, name = name_mangler(relpath, name)
                 uri = os.path.join(dirpath, f)
+                self._fingerprint[uri] = stat_key(uri)
                 if name in ret:
                     E = reclass.errors.DuplicateNodeNameError
                     raise E(self.name, name,
@@ -78,23 +102,33 @@ class ExternalNodeStorage(NodeStorageBase):
 
     def get_node(self, name):
         vvv('GET NODE {0}'.format(name))
+        self._enumerate()
         try:
             relpath = self._nodes[name]
             path = os.path.join(self.nodes_uri, relpath)
             name = os.path.splitext(relpath)[0]
         except KeyError, e:
             raise reclass.errors.NodeNotFound(self.name, name, self.nodes_uri)
-        entity = YamlFile(path).get_entity(name, self._default_environment)
+        entity = YamlFile(path, self._cache).get_entity(
+            name, self._default_environment)
         return entity
 
     def get_class(self, name, nodename=None):
         vvv('GET CLASS {0}'.format(name))
+        self._enumerate()
         try:
             path = os.path.join(self.classes_uri, self._classes[name])
         except KeyError, e:
             raise reclass.errors.ClassNotFound(self.name, name, self.classes_uri)
-        entity = YamlFile(path).get_entity(name)
+        entity = YamlFile(path, self._cache).get_entity(name)
         return entity
 
+    def fingerprint(self):
+        # the directories and files as they were when the inventory was
+        # enumerated, i.e. before any of the files was read
+        self._enumerate()
+        return dict(self._fingerprint)
+
     def enumerate_nodes(self):
+        self._enumerate()
         return self._nodes.keys()
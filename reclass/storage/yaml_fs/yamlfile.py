@@ -7,29 +7,41 @@
 # Released under the terms of the Artistic Licence 2.0
 #
 from reclass import datatypes
-import yaml
+from reclass.utils import libyaml
 import os
 from reclass.errors import NotFoundError
 
 class YamlFile(object):
 
-    def __init__(self, path):
-        ''' Initialise a yamlfile object '''
+    def __init__(self, path, cache=None):
+        '''
+        Initialise a yamlfile object, reading the file through the parse
+        cache if one is given
+        '''
         if not os.path.isfile(path):
             raise NotFoundError('No such file: %s' % path)
         if not os.access(path, os.R_OK):
             raise NotFoundError('Cannot open: %s' % path)
         self._path = path
         self._data = dict()
+        self._cache = cache
         self._read()
     path = property(lambda self: self._path)
 
     def _read(self):
-        fp = file(self._path)
-        data = yaml.safe_load(fp)
+        if self._cache is None:
+            data = self._parse(self._path)
+        else:
+            data = self._cache.get(self._path, self._parse)
         if data is not None:
             self._data = data
+
+    @staticmethod
+    def _parse(path):
+        fp = file(path)
+        data = libyaml.safe_load(fp)
         fp.close()
+        return data
 
     def get_entity(self, name=None, default_environment=None):
         classes = self._data.get('classes')
@@ -45,7 +57,8 @@ class YamlFile(object):
         parameters = self._data.get('parameters')
         if parameters is None:
             parameters = {}
-        parameters = datatypes.Parameters(parameters)
+        # the parameters are walked when the entity is first merged
+        parameters = datatypes.Parameters(parameters, lazy=True)
 
         mutators = self._data.get('mutators')
         if mutators is None:
@@ -0,0 +1,47 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass import get_storage
+from reclass.snapshot import make_settings
+import os, shutil, tempfile, time
+import unittest
+
+class InventoryTestCase(unittest.TestCase):
+    '''
+    A test case with a yaml_fs inventory of the FILES in a temporary
+    directory, with the nodes in nodes/ and the classes in classes/.
+    '''
+    FILES = {'nodes/node1.yml': 'classes: [base]\n',
+             'classes/base.yml': 'applications: [app]\n'
+                                 'parameters:\n  value: 1\n',
+            }
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self._nodes_dir = os.path.join(self._tmpdir, 'nodes')
+        self._classes_dir = os.path.join(self._tmpdir, 'classes')
+        os.mkdir(self._nodes_dir)
+        os.mkdir(self._classes_dir)
+        for relpath, contents in self.FILES.iteritems():
+            self._write(relpath, contents)
+        # make sure that the modification times of the directories change
+        mtime = time.time() - 60
+        for path in (self._nodes_dir, self._classes_dir):
+            os.utime(path, (mtime, mtime))
+        self._settings = make_settings('yaml_fs', self._nodes_dir,
+                                       self._classes_dir, None)
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def _write(self, relpath, contents):
+        with open(os.path.join(self._tmpdir, relpath), 'w') as fp:
+            fp.write(contents)
+
+    def _storage(self):
+        return get_storage('yaml_fs', self._nodes_dir, self._classes_dir)
@@ -0,0 +1,80 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass.ancestry import AncestryIndex
+from reclass.storage import NodeStorageBase
+from reclass.datatypes import Entity, Classes
+from reclass.errors import ClassNotFound, ClassCycleError
+import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+HIERARCHY = {'a': ['b', 'c'],
+             'b': ['d'],
+             'c': ['d', 'e'],
+             'd': [],
+             'e': ['d']}
+
+class TestAncestryIndex(unittest.TestCase):
+
+    def _make_index(self, hierarchy):
+        def get_class(name):
+            try:
+                return Entity(Classes(hierarchy[name]), name=name,
+                              uri='test://{0}'.format(name))
+            except KeyError:
+                raise ClassNotFound('test', name, 'test')
+        storage = mock.MagicMock(spec_set=NodeStorageBase)
+        storage.get_class.side_effect = get_class
+        return AncestryIndex(storage), storage
+
+    def test_leaf(self):
+        index, storage = self._make_index(HIERARCHY)
+        self.assertTupleEqual(index.get_ancestry('d'), ('d',))
+
+    def test_diamond(self):
+        index, storage = self._make_index(HIERARCHY)
+        self.assertTupleEqual(index.get_ancestry('a'),
+                              ('d', 'b', 'e', 'c', 'a'))
+
+    def test_classes_loaded_once(self):
+        index, storage = self._make_index(HIERARCHY)
+        index.get_ancestry('a')
+        index.get_ancestry('c')
+        self.assertEqual(storage.get_class.call_count, len(HIERARCHY))
+
+    def test_uri(self):
+        index, storage = self._make_index(HIERARCHY)
+        self.assertEqual(index.get_uri('b'), 'test://b')
+
+    def test_cycle(self):
+        index, storage = self._make_index({'a': ['b'], 'b': ['c'],
+                                           'c': ['a']})
+        with self.assertRaises(ClassCycleError):
+            index.get_ancestry('a')
+
+    def test_class_not_found(self):
+        index, storage = self._make_index({'a': ['missing']})
+        with self.assertRaises(ClassNotFound):
+            index.get_ancestry('a', 'node')
+
+    def test_deep_hierarchy(self):
+        depth = 2000
+        hierarchy = dict(('c{0}'.format(i), ['c{0}'.format(i + 1)])
+                         for i in xrange(depth))
+        hierarchy['c{0}'.format(depth)] = []
+        index, storage = self._make_index(hierarchy)
+        ancestry = index.get_ancestry('c0')
+        self.assertEqual(len(ancestry), depth + 1)
+        self.assertEqual(ancestry[0], 'c{0}'.format(depth))
+        self.assertEqual(ancestry[-1], 'c0')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass.classmappings import ClassMappings
+from reclass.errors import MappingFormatError
+import unittest
+
+MAPPINGS = ['* default',
+            '/^www(\d+)/ webserver web-\\\\1',
+            '*.ch hosted@switzerland another',
+            'db1.example.org database',
+            'db?.example.org "quoted" default',
+            '/\.([^.]+)$/ tld-\\\\1']
+
+NODENAMES = ['www1.example.org', 'www22.example.ch', 'db1.example.org',
+             'db2.example.org', 'mail.example.com']
+
+class TestClassMappings(unittest.TestCase):
+
+    def test_empty(self):
+        m = ClassMappings()
+        self.assertEqual(len(m), 0)
+        self.assertListEqual(m.match('foo').as_list(), [])
+
+    def test_match_glob(self):
+        m = ClassMappings(MAPPINGS)
+        self.assertListEqual(m.match('mail.example.com').as_list(),
+                             ['default', 'tld-com'])
+
+    def test_match_regexp_backreference(self):
+        m = ClassMappings(MAPPINGS)
+        self.assertListEqual(m.match('www22.example.ch').as_list(),
+                             ['default', 'webserver', 'web-22',
+                              'hosted@switzerland', 'another', 'tld-ch'])
+
+    def test_match_literal_and_quoted(self):
+        m = ClassMappings(MAPPINGS)
+        self.assertListEqual(m.match('db1.example.org').as_list(),
+                             ['default', 'database', 'quoted',
+                              'tld-org'])
+
+    def test_match_all(self):
+        m = ClassMappings(MAPPINGS)
+        ret = m.match_all(NODENAMES)
+        self.assertSetEqual(set(ret.keys()), set(NODENAMES))
+        for n in NODENAMES:
+            self.assertListEqual(ret[n].as_list(), m.match(n).as_list())
+
+    def test_missing_slash(self):
+        with self.assertRaises(MappingFormatError):
+            ClassMappings(['/^www foo'])
+
+    def test_invalid_regexp(self):
+        with self.assertRaises(MappingFormatError):
+            ClassMappings(['/(www/ foo'])
+
+if __name__ == '__main__':
+    unittest.main()
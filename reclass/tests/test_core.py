@@ -0,0 +1,506 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass.core import Core
+from reclass.storage.memcache_proxy import MemcacheProxy
+from reclass.storage import NodeStorageBase
+from reclass.datatypes import Entity, Classes, Applications, Parameters, \
+        Mutators
+from reclass.errors import ClassNotFound, NodeNotFound, \
+        UndefinedVariableError
+import copy
+import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+NODES = {'node1': {'classes': ['one', 'two'],
+                   'applications': ['~alpha'],
+                   'parameters': {'node': '${common:name}'}},
+         'node2': {'classes': ['two'],
+                   'parameters': {'node': 2}},
+        }
+CLASSES = {'one': {'classes': ['base'],
+                   'applications': ['alpha'],
+                   'parameters': {'common': {'name': 'one'}}},
+           'two': {'classes': ['base'],
+                   'applications': ['beta'],
+                   'parameters': {'list': [2]}},
+           'base': {'applications': ['gamma'],
+                    'parameters': {'common': {'name': 'base'},
+                                   'list': [1]}},
+          }
+
+# mutators passed to worker processes need to be picklable
+_inventory_mutator_calls = []
+
+def _inventory_mutator(inventory, nodename):
+    _inventory_mutator_calls.append(nodename)
+    inventory['nodes'][nodename]['parameters']['mutated'] = nodename
+
+
+class MemoryStorage(NodeStorageBase):
+
+    def __init__(self, nodes, classes):
+        super(MemoryStorage, self).__init__('memory')
+        self._nodes = nodes
+        self._classes = classes
+
+    @staticmethod
+    def _make_entity(name, data, mutators=None):
+        return Entity(Classes(data.get('classes', [])),
+                      Applications(data.get('applications', [])),
+                      Parameters(data.get('parameters', {})),
+                      name=name, uri='memory://{0}'.format(name),
+                      environment='base', mutators=mutators)
+
+    def get_node(self, name):
+        try:
+            return self._make_entity(name, self._nodes[name])
+        except KeyError:
+            raise NodeNotFound(self.name, name, 'memory')
+
+    def get_class(self, name):
+        try:
+            return self._make_entity(name, self._classes[name])
+        except KeyError:
+            raise ClassNotFound(self.name, name, 'memory')
+
+    def enumerate_nodes(self):
+        return sorted(self._nodes.keys())
+
+
+def _without_timestamp(nodeinfo):
+    ret = nodeinfo.copy()
+    ret['__reclass__'] = nodeinfo['__reclass__'].copy()
+    del ret['__reclass__']['timestamp']
+    return ret
+
+
+class TestCore(unittest.TestCase):
+
+    def _make_core(self, class_mappings=None, nodes=NODES, classes=CLASSES,
+                   jobs=1):
+        storage = MemoryStorage(copy.deepcopy(nodes), copy.deepcopy(classes))
+        return Core(storage, class_mappings, jobs=jobs), storage
+
+    def _assertInventoryEqual(self, inv1, inv2):
+        for key in ('classes', 'applications'):
+            self.assertDictEqual(inv1[key], inv2[key])
+        self.assertSetEqual(set(inv1['nodes']), set(inv2['nodes']))
+        for nodename, nodeinfo in inv1['nodes'].iteritems():
+            self.assertDictEqual(_without_timestamp(nodeinfo),
+                                 _without_timestamp(inv2['nodes'][nodename]))
+
+    def test_nodeinfo(self):
+        core, storage = self._make_core()
+        ret = core.nodeinfo('node1')
+        self.assertListEqual(ret['classes'], ['base', 'one', 'two'])
+        self.assertListEqual(ret['applications'], ['gamma', 'beta'])
+        self.assertDictEqual(ret['parameters'], {'common': {'name': 'one'},
+                                                 'list': [1, 2],
+                                                 'node': 'one'})
+
+    def test_nodeinfo_does_not_enumerate_nodes(self):
+        core, storage = self._make_core()
+        with mock.patch.object(storage, 'enumerate_nodes') as m:
+            core.nodeinfo('node2')
+            self.assertFalse(m.called)
+
+    def test_nodeinfo_equals_inventory(self):
+        inventory = self._make_core()[0].inventory()
+        for nodename in NODES:
+            ret = self._make_core()[0].nodeinfo(nodename)
+            self.assertDictEqual(_without_timestamp(ret),
+                                 _without_timestamp(inventory['nodes'][nodename]))
+
+    def test_nodeinfo_mutator_single_node(self):
+        core, storage = self._make_core()
+        calls = []
+        def mutator(nodeinfo, nodename):
+            calls.append(nodename)
+            nodeinfo['parameters']['mutated'] = True
+        core._mutators.push([mutator])
+        with mock.patch.object(storage, 'enumerate_nodes') as m:
+            ret = core.nodeinfo('node2')
+            self.assertFalse(m.called)
+        self.assertListEqual(calls, ['node2'])
+        self.assertTrue(ret['parameters']['mutated'])
+
+    def test_nodeinfo_mutator_needs_inventory(self):
+        core, storage = self._make_core()
+        calls = []
+        def mutator(inventory, nodename):
+            calls.append(sorted(inventory['nodes'].keys()))
+        core._mutators.push([mutator])
+        core.nodeinfo('node2')
+        self.assertListEqual(calls, [sorted(NODES.keys())])
+
+    def test_nodeinfo_many(self):
+        ret = self._make_core()[0].nodeinfo_many(['node2', 'node1', 'node2'])
+        self.assertSetEqual(set(ret), set(['node1', 'node2']))
+        for nodename in NODES:
+            expected = self._make_core()[0].nodeinfo(nodename)
+            self.assertDictEqual(_without_timestamp(ret[nodename]),
+                                 _without_timestamp(expected))
+
+    def test_nodeinfo_many_jobs(self):
+        serial = self._make_core()[0].nodeinfo_many(NODES)
+        parallel = self._make_core(jobs=2)[0].nodeinfo_many(NODES)
+        for nodename in NODES:
+            self.assertDictEqual(_without_timestamp(serial[nodename]),
+                                 _without_timestamp(parallel[nodename]))
+
+    def test_nodeinfo_many_classes_cached(self):
+        core, storage = self._make_core()
+        core.nodeinfo_many(NODES)
+        self.assertEqual(core.cache_stats()['misses'], len(CLASSES))
+
+    def test_nodeinfo_many_mutators(self):
+        core, storage = self._make_core()
+        calls = []
+        def mutator(nodeinfo, nodename):
+            calls.append(nodename)
+        core._mutators.push([mutator])
+        core.nodeinfo_many(['node1', 'node2'])
+        self.assertListEqual(calls, ['node1', 'node2'])
+
+    def test_nodeinfo_many_node_mutators(self):
+        core, storage = self._make_core()
+        def mutator(nodeinfo, nodename):
+            nodeinfo['parameters']['mutated'] = nodename
+        get_node = storage.get_node
+        def get_node_with_mutator(name):
+            ret = get_node(name)
+            if name == 'node1':
+                ret.mutators.push([mutator])
+            return ret
+        with mock.patch.object(storage, 'get_node',
+                               side_effect=get_node_with_mutator) as get:
+            ret = core.nodeinfo_many(['node1', 'node2'])
+        self.assertEqual(ret['node1']['parameters']['mutated'], 'node1')
+        self.assertNotIn('mutated', ret['node2']['parameters'])
+        # the nodes are not resolved again
+        self.assertEqual(get.call_count, 2)
+
+    def test_nodeinfo_many_inventory_mutators(self):
+        core, storage = self._make_core(jobs=2)
+        get_node = storage.get_node
+        def get_node_with_mutator(name):
+            ret = get_node(name)
+            if name == 'node1':
+                ret.mutators.push([_inventory_mutator])
+            return ret
+        del _inventory_mutator_calls[:]
+        with mock.patch.object(storage, 'get_node',
+                               side_effect=get_node_with_mutator), \
+                mock.patch.object(Core, 'inventory', autospec=True,
+                                  side_effect=Core.inventory) as inventory:
+            ret = core.nodeinfo_many(['node1', 'node2'])
+        # only node1 is resolved on its own, with as many jobs
+        self.assertEqual(inventory.call_count, 1)
+        self.assertEqual(inventory.call_args[0][0]._jobs, 2)
+        self.assertListEqual(_inventory_mutator_calls, ['node1'])
+        expected = self._make_core()[0].nodeinfo('node2')
+        self.assertDictEqual(_without_timestamp(ret['node2']),
+                             _without_timestamp(expected))
+
+    def test_nodeinfo_many_inventory_once(self):
+        core, storage = self._make_core()
+        core._mutators.push([_inventory_mutator])
+        del _inventory_mutator_calls[:]
+        with mock.patch.object(Core, 'inventory', autospec=True,
+                               side_effect=Core.inventory) as inventory:
+            ret = core.nodeinfo_many(['node1', 'node2'])
+        self.assertEqual(inventory.call_count, 1)
+        self.assertListEqual(_inventory_mutator_calls, ['node1', 'node2'])
+        for nodename in ('node1', 'node2'):
+            self.assertEqual(ret[nodename]['parameters']['mutated'], nodename)
+            single, storage = self._make_core()
+            single._mutators.push([_inventory_mutator])
+            self.assertDictEqual(
+                    _without_timestamp(ret[nodename]),
+                    _without_timestamp(single.nodeinfo(nodename)))
+
+    def test_nodeinfo_many_inventory_not_found(self):
+        core, storage = self._make_core()
+        core._mutators.push([_inventory_mutator])
+        with self.assertRaises(NodeNotFound):
+            core.nodeinfo_many(['node1', 'node3'])
+
+    def test_nodeinfo_many_inventory_mutators_first(self):
+        core, storage = self._make_core()
+        def mutator(inventory, nodename):
+            pass
+        core._mutators.push([mutator])
+        with mock.patch.object(Core, '_compile_nodes', autospec=True,
+                               side_effect=Core._compile_nodes) as compile:
+            ret = core.nodeinfo_many(['node1', 'node2'])
+        # the nodes are only compiled for the inventory of each node
+        for args, kwargs in compile.call_args_list:
+            self.assertIsNot(args[0], core)
+        self.assertSetEqual(set(ret), set(['node1', 'node2']))
+
+    def test_nodeinfo_many_not_found(self):
+        core, storage = self._make_core()
+        with self.assertRaises(NodeNotFound):
+            core.nodeinfo_many(['node1', 'node3'])
+
+    def test_descended_classes_cached(self):
+        core, storage = self._make_core()
+        core.inventory()
+        stats = core.cache_stats()
+        self.assertEqual(stats['entries'], len(CLASSES))
+        self.assertEqual(stats['misses'], len(CLASSES))
+        # node2 reuses class two, descended for node1
+        self.assertGreater(stats['hits'], 0)
+
+    def test_descended_classes_seen(self):
+        # class one is merged as part of three, and must not be merged again
+        # as part of four
+        classes = copy.deepcopy(CLASSES)
+        classes['three'] = {'classes': ['one'],
+                            'parameters': {'list': [3]}}
+        classes['four'] = {'classes': ['one', 'two'],
+                           'parameters': {'list': [4]}}
+        nodes = {'node': {'classes': ['three', 'four']},
+                 'other': {'classes': ['four']}}
+        core = self._make_core(nodes=nodes, classes=classes)[0]
+        core.nodeinfo('other')
+        ret = core.nodeinfo('node')
+        self.assertListEqual(ret['parameters']['list'], [1, 3, 2, 4])
+        self.assertListEqual(ret['classes'],
+                             ['base', 'one', 'two', 'three', 'four'])
+
+    def test_descended_classes_scalar_override(self):
+        # merging the descended class would extend the list of base, rather
+        # than the scalar that replaced it
+        classes = copy.deepcopy(CLASSES)
+        classes['three'] = {'parameters': {'list': 'scalar'}}
+        classes['four'] = {'classes': ['three', 'two']}
+        nodes = {'node': {'classes': ['base', 'four']}}
+        core = self._make_core(nodes=nodes, classes=classes)[0]
+        ret = core.nodeinfo('node')
+        self.assertListEqual(ret['parameters']['list'], ['scalar', 2])
+
+    def test_descended_classes_negation(self):
+        classes = copy.deepcopy(CLASSES)
+        classes['three'] = {'classes': ['two'], 'applications': ['~gamma']}
+        nodes = {'node': {'classes': ['one', 'three']}}
+        core = self._make_core(nodes=nodes, classes=classes)[0]
+        core.nodeinfo('node')
+        ret = core.nodeinfo('node')
+        self.assertListEqual(ret['applications'], ['alpha', 'beta'])
+
+    def _make_grouped_core(self, jobs=1):
+        nodes = copy.deepcopy(NODES)
+        nodes['node3'] = {'classes': ['one', 'two'],
+                          'parameters': {'node': 3, 'list': [3]}}
+        return self._make_core(nodes=nodes, jobs=jobs)[0]
+
+    def test_inventory_groups_nodes(self):
+        core = self._make_grouped_core()
+        with mock.patch.object(core, '_merge_node_classes',
+                               wraps=core._merge_node_classes) as m:
+            inventory = core.inventory()
+            # node1 and node3 share their classes
+            self.assertEqual(m.call_count, 2)
+        self.assertListEqual(inventory['nodes']['node1']['parameters']['list'],
+                             [1, 2])
+        self.assertListEqual(inventory['nodes']['node3']['parameters']['list'],
+                             [1, 2, 3])
+        for nodename in inventory['nodes']:
+            ret = self._make_grouped_core().nodeinfo(nodename)
+            self.assertDictEqual(_without_timestamp(ret),
+                                 _without_timestamp(inventory['nodes'][nodename]))
+
+    def test_inventory_groups_class_mappings(self):
+        core = self._make_core(class_mappings=['node1 one'],
+                               nodes={'node1': {'classes': ['two']},
+                                      'node2': {'classes': ['two']}})[0]
+        inventory = core.inventory()
+        self.assertListEqual(inventory['nodes']['node1']['classes'],
+                             ['base', 'one', 'two'])
+        self.assertListEqual(inventory['nodes']['node2']['classes'],
+                             ['base', 'two'])
+
+    def test_copy_entity(self):
+        def first(nodeinfo): pass
+        def second(nodeinfo): pass
+        entity = Entity(Classes(['one']), Applications(['alpha', '~beta']),
+                        Parameters({'a': {'b': '${c}'}, 'c': 1}),
+                        name='name', uri='uri', environment='env',
+                        mutators=Mutators([first, second]))
+        ret = Core._copy_entity(entity)
+        self.assertEqual(ret, entity)
+        self.assertEqual(ret.mutators, entity.mutators)
+        self.assertEqual(ret.environment, 'env')
+        ret.merge(Entity(applications=Applications(['beta'])))
+        ret.interpolate()
+        self.assertListEqual(entity.applications.as_list(), ['alpha'])
+        self.assertDictEqual(ret.parameters.as_dict(), {'a': {'b': 1}, 'c': 1})
+        # the original is left uninterpolated
+        self.assertNotEqual(entity.parameters.as_dict()['a']['b'], 1)
+
+    def test_inventory_jobs_groups(self):
+        serial = self._make_grouped_core().inventory()
+        parallel = self._make_grouped_core(jobs=2).inventory()
+        self._assertInventoryEqual(serial, parallel)
+        self.assertListEqual(list(serial['nodes']), list(parallel['nodes']))
+
+    def test_iternodes(self):
+        inventory = self._make_core()[0].inventory()
+        classes = {}
+        applications = {}
+        core = self._make_core()[0]
+        ret = core.iternodes(classes, applications)
+        self.assertListEqual(classes.keys(), [])
+        nodes = dict(ret)
+        self.assertListEqual(sorted(nodes), sorted(NODES))
+        for nodename, nodeinfo in nodes.iteritems():
+            self.assertDictEqual(_without_timestamp(nodeinfo),
+                                 _without_timestamp(inventory['nodes'][nodename]))
+        self.assertDictEqual(classes, inventory['classes'])
+        self.assertDictEqual(applications, inventory['applications'])
+
+    def test_iternodes_one_at_a_time(self):
+        core, storage = self._make_core()
+        with mock.patch.object(core, '_nodeinfo', wraps=core._nodeinfo) as m:
+            ret = core.iternodes()
+            self.assertEqual(next(ret)[0], 'node1')
+            self.assertEqual(m.call_count, 1)
+
+    def test_iternodes_windows(self):
+        nodes = dict(('node{0}'.format(i), {'classes': ['two']})
+                     for i in range(5))
+        inventory = self._make_core(nodes=nodes)[0].inventory()
+        for jobs in (1, 2):
+            core, storage = self._make_core(nodes=nodes, jobs=jobs)
+            with mock.patch('reclass.core.ITERNODES_WINDOW', 1), \
+                    mock.patch.object(storage, 'get_node',
+                                      wraps=storage.get_node) as get_node:
+                ret = core.iternodes()
+                self.assertEqual(next(ret)[0], 'node0')
+                # only the first window of nodes has been loaded
+                self.assertEqual(get_node.call_count, jobs)
+                ret = dict(ret)
+            self.assertEqual(len(ret), 4)
+            for nodename, nodeinfo in ret.iteritems():
+                self.assertDictEqual(_without_timestamp(nodeinfo),
+                        _without_timestamp(inventory['nodes'][nodename]))
+
+    def test_iternodes_keeps_nothing(self):
+        storage = MemcacheProxy(MemoryStorage(NODES, CLASSES))
+        core = Core(storage, None)
+        for nodename, nodeinfo in core.iternodes():
+            pass
+        self.assertDictEqual(storage._nodes_cache, {})
+        self.assertDictEqual(core._dependencies, {})
+
+    def test_reverse_maps_in_node_order(self):
+        nodes = dict(('node{0}'.format(i), {'classes': ['two']})
+                     for i in range(20))
+        inventory = self._make_core(nodes=nodes)[0].inventory()
+        self.assertListEqual(inventory['classes']['two'], sorted(nodes))
+
+    def test_enumerate_nodes_iterator(self):
+        core, storage = self._make_core()
+        with mock.patch.object(storage, 'enumerate_nodes',
+                               side_effect=lambda: iter(sorted(NODES))):
+            inventory = core.inventory()
+        self.assertListEqual(sorted(inventory['nodes']), sorted(NODES))
+
+    def test_recompile_unchanged(self):
+        core, storage = self._make_core()
+        inventory = core.inventory()
+        self.assertListEqual(core.recompile(inventory, ['memory://other']), [])
+
+    def test_recompile_class(self):
+        core, storage = self._make_core()
+        inventory = core.inventory()
+        storage._classes['one']['applications'] = ['delta']
+        storage._classes['one']['parameters']['common']['name'] = 'new'
+        self.assertListEqual(core.recompile(inventory, ['memory://one']),
+                             ['node1'])
+        classes = copy.deepcopy(CLASSES)
+        classes['one'] = storage._classes['one']
+        self._assertInventoryEqual(inventory,
+                                   self._make_core(classes=classes)[0].inventory())
+        self.assertListEqual(inventory['applications']['delta'], ['node1'])
+
+    def test_recompile_ancestry(self):
+        core, storage = self._make_core()
+        inventory = core.inventory()
+        storage._classes['extra'] = {'applications': ['epsilon']}
+        storage._classes['base']['classes'] = ['extra']
+        recompiled = core.recompile(inventory, ['memory://base'])
+        self.assertSetEqual(set(recompiled), set(NODES.keys()))
+        self.assertListEqual(sorted(inventory['classes']['extra']),
+                             sorted(NODES.keys()))
+
+    def test_recompile_node(self):
+        core, storage = self._make_core()
+        inventory = core.inventory()
+        storage._nodes['node2']['classes'] = ['one']
+        self.assertListEqual(core.recompile(inventory, ['memory://node2']),
+                             ['node2'])
+        self.assertNotIn('two', inventory['nodes']['node2']['classes'])
+        self.assertListEqual(inventory['classes']['two'], ['node1'])
+        self.assertListEqual(inventory['applications']['beta'], ['node1'])
+
+    def test_recompile_mutators_need_inventory(self):
+        core, storage = self._make_core()
+        def mutator(nodes, classes, applications):
+            pass
+        core._mutators.push([mutator])
+        inventory = core.inventory()
+        storage._classes['one']['parameters']['common']['name'] = 'new'
+        with mock.patch.object(core, '_nodeinfo',
+                               side_effect=core._nodeinfo) as _nodeinfo:
+            recompiled = core.recompile(inventory, ['memory://one'])
+        # every node is compiled once, by the inventory run
+        self.assertEqual(_nodeinfo.call_count, len(NODES))
+        self.assertSetEqual(set(recompiled), set(NODES))
+        self.assertEqual(inventory['nodes']['node1']['parameters']['node'],
+                         'new')
+
+    def test_inventory_jobs(self):
+        serial = self._make_core()[0].inventory()
+        parallel = self._make_core(jobs=2)[0].inventory()
+        self._assertInventoryEqual(serial, parallel)
+        self.assertListEqual(list(serial['nodes']), list(parallel['nodes']))
+
+    def test_inventory_jobs_cache_stats(self):
+        core = self._make_core(jobs=2)[0]
+        core.inventory()
+        # the classes are descended in the worker processes
+        self.assertGreater(core.cache_stats()['misses'], 0)
+
+    def test_inventory_jobs_error(self):
+        nodes = copy.deepcopy(NODES)
+        nodes['node2']['classes'] = ['missing']
+        core, storage = self._make_core(nodes=nodes, jobs=2)
+        with self.assertRaises(ClassNotFound):
+            core.inventory()
+
+    def test_inventory_jobs_first_error(self):
+        # node3 shares its group with node1, which the workers may finish
+        # before the group of node2, but node2 fails first
+        nodes = copy.deepcopy(NODES)
+        nodes['node2'] = {'classes': ['two'],
+                          'parameters': {'ref': '${missing}'}}
+        nodes['node3'] = {'classes': ['one', 'two'],
+                          'parameters': {'list': {'not': 'a list'}}}
+        for jobs in (1, 2):
+            core, storage = self._make_core(nodes=nodes, jobs=jobs)
+            with self.assertRaises(UndefinedVariableError):
+                core.inventory()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass.core import Core
+from reclass.daemon import DaemonServer, DaemonClient
+from reclass.errors import NodeNotFound, ClassNotFound, DaemonError
+from reclass.tests.inventory import InventoryTestCase
+from reclass.tests.test_core import _without_timestamp
+import os, threading
+from StringIO import StringIO
+import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+class TestDaemon(InventoryTestCase):
+
+    def setUp(self):
+        super(TestDaemon, self).setUp()
+        self._socket = os.path.join(self._tmpdir, 'reclass.sock')
+        self._server = DaemonServer(self._socket)
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={'poll_interval': 0.05})
+        self._thread.start()
+
+    def tearDown(self):
+        self._server.shutdown()
+        self._thread.join()
+        self._server.server_close()
+        super(TestDaemon, self).tearDown()
+
+    def _client(self, settings=None):
+        return DaemonClient(self._socket, settings or self._settings)
+
+    def _core(self, daemon=None):
+        return Core(self._storage(), None, daemon=daemon)
+
+    def test_nodeinfo(self):
+        self.assertDictEqual(
+            _without_timestamp(self._client().nodeinfo('node1')),
+            _without_timestamp(self._core().nodeinfo('node1')))
+
+    def test_inventory(self):
+        ret = self._client().inventory()
+        expected = self._core().inventory()
+        self.assertDictEqual(_without_timestamp(ret['nodes']['node1']),
+                             _without_timestamp(expected['nodes']['node1']))
+        self.assertDictEqual(ret['classes'], expected['classes'])
+
+    def test_nodeinfo_not_found(self):
+        with self.assertRaises(NodeNotFound):
+            self._client().nodeinfo('node2')
+
+    def test_changed_file(self):
+        client = self._client()
+        client.inventory()
+        self._write('classes/base.yml', 'parameters:\n  value: 22\n')
+        self.assertEqual(client.nodeinfo('node1')['parameters']['value'], 22)
+
+    def test_new_file(self):
+        client = self._client()
+        client.inventory()
+        self._write('nodes/node2.yml', 'classes: [base]\n')
+        self.assertSetEqual(set(client.inventory()['nodes']),
+                            set(['node1', 'node2']))
+
+    def test_other_version(self):
+        settings = dict(self._settings, version='0.0')
+        self.assertIsNone(self._client(settings).nodeinfo('node1'))
+
+    def test_unresolvable(self):
+        self._write('nodes/node2.yml', 'classes: [missing]\n')
+        client = self._client()
+        with mock.patch('sys.stderr', new_callable=StringIO) as stderr:
+            with self.assertRaises(ClassNotFound):
+                client.inventory()
+            self.assertEqual(client.nodeinfo('node1')['parameters']['value'],
+                             1)
+            with self.assertRaises(ClassNotFound):
+                client.nodeinfo('node2')
+        self.assertEqual(len(stderr.getvalue().splitlines()), 1)
+
+    def test_unresolvable_not_recompiled(self):
+        self._write('nodes/node2.yml', 'classes: [missing]\n')
+        client = self._client()
+        with mock.patch('sys.stderr', new_callable=StringIO), \
+                mock.patch.object(Core, 'inventory', autospec=True,
+                                  side_effect=Core.inventory) as inventory, \
+                mock.patch.object(Core, '_nodeinfo', autospec=True,
+                                  side_effect=Core._nodeinfo) as _nodeinfo:
+            for i in range(3):
+                with self.assertRaises(ClassNotFound):
+                    client.inventory()
+                client.nodeinfo('node1')
+                with self.assertRaises(ClassNotFound):
+                    client.nodeinfo('node2')
+                if i == 0:
+                    calls = _nodeinfo.call_count
+            # neither the inventory nor the nodes were compiled again
+            self.assertEqual(inventory.call_count, 1)
+            self.assertEqual(_nodeinfo.call_count, calls)
+            self._write('classes/missing.yml', 'parameters:\n  value: 3\n')
+            self.assertEqual(client.nodeinfo('node2')['parameters']['value'],
+                             3)
+            self.assertEqual(inventory.call_count, 2)
+
+    def test_other_error_not_recompiled(self):
+        error = ImportError('No module named mutators')
+        with mock.patch('sys.stderr', new_callable=StringIO) as stderr, \
+                mock.patch.object(Core, 'inventory', autospec=True,
+                                  side_effect=error) as inventory:
+            for i in range(3):
+                self.assertIsNone(self._client().inventory())
+                self.assertEqual(
+                    self._client().nodeinfo('node1')['parameters']['value'],
+                    1)
+            self.assertEqual(inventory.call_count, 1)
+            self.assertIn('No module named mutators', stderr.getvalue())
+            self._write('classes/base.yml', 'parameters:\n  value: 5\n')
+            self.assertIsNone(self._client().inventory())
+            self.assertEqual(inventory.call_count, 2)
+
+    def test_unresolvable_after_change(self):
+        client = self._client()
+        client.inventory()
+        self._write('classes/base.yml', 'classes: [missing]\n')
+        with mock.patch('sys.stderr', new_callable=StringIO):
+            with self.assertRaises(ClassNotFound):
+                client.nodeinfo('node1')
+            with self.assertRaises(ClassNotFound):
+                client.inventory()
+        self._write('classes/base.yml', 'parameters:\n  value: 4\n')
+        self.assertEqual(client.nodeinfo('node1')['parameters']['value'], 4)
+
+    def test_no_daemon(self):
+        client = DaemonClient(os.path.join(self._tmpdir, 'missing'),
+                              self._settings)
+        self.assertIsNone(client.nodeinfo('node1'))
+        self.assertIsNone(DaemonClient('', self._settings).inventory())
+
+    def test_core(self):
+        core = self._core(daemon=self._client())
+        with mock.patch.object(core, '_nodeinfo') as _nodeinfo:
+            self.assertEqual(core.nodeinfo('node1')['parameters']['value'], 1)
+        self.assertFalse(_nodeinfo.called)
+
+    def test_core_no_daemon(self):
+        client = DaemonClient('', self._settings)
+        core = self._core(daemon=client)
+        self.assertEqual(core.nodeinfo('node1')['parameters']['value'], 1)
+
+    def test_already_listening(self):
+        with self.assertRaises(DaemonError):
+            DaemonServer(self._socket)
+
+    def test_not_a_socket(self):
+        with self.assertRaises(DaemonError):
+            DaemonServer(os.path.join(self._nodes_dir, 'node1.yml'))
+
+    def test_stale_socket(self):
+        path = os.path.join(self._tmpdir, 'stale.sock')
+        server = DaemonServer(path)
+        # close the socket without removing the file, like a killed daemon
+        server.socket.close()
+        self.assertTrue(os.path.exists(path))
+        server = DaemonServer(path)
+        server.server_close()
+        self.assertFalse(os.path.exists(path))
+
+if __name__ == '__main__':
+    unittest.main()
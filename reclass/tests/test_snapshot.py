@@ -0,0 +1,291 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass.core import Core
+from reclass.errors import NodeNotFound, SnapshotError
+from reclass.snapshot import Snapshot, SnapshotStore, make_settings, \
+        write_snapshot
+from reclass.utils.fingerprint import fingerprint, changed_paths, \
+        CHECK_INTERVAL
+from reclass.tests.test_core import MemoryStorage, NODES, CLASSES, \
+        _without_timestamp
+import copy, os, shutil, tempfile, time
+from StringIO import StringIO
+import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+def _mutator(nodeinfo, nodename):
+    nodeinfo['parameters']['mutated'] = nodename
+
+
+class FingerprintedStorage(MemoryStorage):
+
+    def __init__(self, nodes, classes, paths, mutators=None):
+        super(FingerprintedStorage, self).__init__(nodes, classes)
+        self._paths = paths
+        self._mutators = mutators
+
+    def get_node(self, name):
+        ret = super(FingerprintedStorage, self).get_node(name)
+        if self._mutators:
+            ret.mutators.push(self._mutators)
+        return ret
+
+    def fingerprint(self):
+        return fingerprint(self._paths)
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self._path = os.path.join(self._tmpdir, 'inventory.snapshot')
+        self._nodes_dir = os.path.join(self._tmpdir, 'nodes')
+        os.mkdir(self._nodes_dir)
+        self._file = os.path.join(self._nodes_dir, 'node1.yml')
+        with open(self._file, 'w') as fp:
+            fp.write('node1\n')
+        self._settings = make_settings('memory', 'nodes', 'classes', None)
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def _make_storage(self, mutators=None):
+        return FingerprintedStorage(copy.deepcopy(NODES),
+                                    copy.deepcopy(CLASSES),
+                                    [self._nodes_dir, self._file], mutators)
+
+    def _write(self, mutators=None):
+        write_snapshot(self._path, self._make_storage(mutators), None,
+                       self._settings)
+        return Snapshot(self._path)
+
+
+class TestSnapshot(SnapshotTestCase):
+
+    def test_inventory(self):
+        snapshot = self._write()
+        inventory = Core(self._make_storage(), None).inventory()
+        ret = snapshot.inventory()
+        for key in ('classes', 'applications'):
+            self.assertDictEqual(ret[key], inventory[key])
+        self.assertSetEqual(set(ret['nodes']), set(inventory['nodes']))
+        for nodename, nodeinfo in ret['nodes'].iteritems():
+            self.assertDictEqual(_without_timestamp(nodeinfo),
+                    _without_timestamp(inventory['nodes'][nodename]))
+
+    def test_nodeinfo(self):
+        snapshot = self._write()
+        for nodename in NODES:
+            nodeinfo = Core(self._make_storage(), None).nodeinfo(nodename)
+            self.assertDictEqual(_without_timestamp(snapshot.nodeinfo(nodename)),
+                                 _without_timestamp(nodeinfo))
+
+    def test_nodeinfo_mutators(self):
+        snapshot = self._write([_mutator])
+        self.assertEqual(snapshot.nodeinfo('node1')['parameters']['mutated'],
+                         'node1')
+        self.assertNotIn('mutated',
+                         snapshot.inventory()['nodes']['node1']['parameters'])
+
+    def test_nodeinfo_mutators_jobs(self):
+        with mock.patch.object(Core, 'nodeinfo') as nodeinfo, \
+                mock.patch.object(Core, 'nodeinfo_many', autospec=True,
+                                  side_effect=Core.nodeinfo_many) as many:
+            write_snapshot(self._path, self._make_storage([_mutator]), None,
+                           self._settings, jobs=2)
+        self.assertFalse(nodeinfo.called)
+        self.assertEqual(many.call_count, 1)
+        self.assertEqual(many.call_args[0][0]._jobs, 2)
+        snapshot = Snapshot(self._path)
+        self.assertEqual(snapshot.nodeinfo('node2')['parameters']['mutated'],
+                         'node2')
+        snapshot.close()
+
+    def test_nodeinfo_not_found(self):
+        snapshot = self._write()
+        with self.assertRaises(NodeNotFound):
+            snapshot.nodeinfo('node3')
+
+    def test_returns_copies(self):
+        snapshot = self._write()
+        snapshot.inventory()['classes']['base'].append('node3')
+        snapshot.nodeinfo('node1')['parameters']['node'] = 'changed'
+        self.assertListEqual(snapshot.inventory()['classes']['base'],
+                             ['node1', 'node2'])
+        self.assertEqual(snapshot.nodeinfo('node1')['parameters']['node'],
+                         'one')
+
+    def test_fingerprint_current(self):
+        snapshot = self._write()
+        self.assertListEqual(changed_paths(snapshot.fingerprint), [])
+        self.assertDictEqual(snapshot.settings, self._settings)
+
+    def test_fingerprint_changed_file(self):
+        snapshot = self._write()
+        with open(self._file, 'a') as fp:
+            fp.write('changed\n')
+        self.assertListEqual(changed_paths(snapshot.fingerprint),
+                             [self._file])
+
+    def test_fingerprint_new_file(self):
+        # make sure that the modification time of the directory changes
+        mtime = time.time() - 60
+        os.utime(self._nodes_dir, (mtime, mtime))
+        snapshot = self._write()
+        open(os.path.join(self._nodes_dir, 'node3.yml'), 'w').close()
+        self.assertListEqual(changed_paths(snapshot.fingerprint),
+                             [self._nodes_dir])
+
+    def test_index(self):
+        nodes = dict(('node%d' % i, {'parameters': {'i': i}})
+                     for i in range(100))
+        storage = FingerprintedStorage(nodes, {}, [self._file])
+        write_snapshot(self._path, storage, None, self._settings)
+        snapshot = Snapshot(self._path)
+        for nodename, node in nodes.iteritems():
+            self.assertEqual(snapshot.nodeinfo(nodename)['parameters']['i'],
+                             node['parameters']['i'])
+        self.assertEqual(snapshot.nodeinfo(u'node1')['parameters']['i'], 1)
+        for nodename in ('node', 'node100', 'a', 'z', ''):
+            with self.assertRaises(NodeNotFound):
+                snapshot.nodeinfo(nodename)
+        self.assertEqual(len(snapshot.inventory()['nodes']), len(nodes))
+        snapshot.close()
+
+    def test_replace(self):
+        snapshot = self._write()
+        self._write()
+        self.assertListEqual(sorted(os.listdir(self._tmpdir)),
+                             ['inventory.snapshot', 'nodes'])
+        # the replaced file can still be read
+        self.assertEqual(snapshot.nodeinfo('node1')['parameters']['node'],
+                         'one')
+
+    def test_not_a_snapshot(self):
+        with self.assertRaises(SnapshotError):
+            Snapshot(self._file)
+
+    def test_truncated(self):
+        self._write()
+        with open(self._path, 'r+b') as fp:
+            fp.truncate(os.path.getsize(self._path) // 2)
+        with self.assertRaises(SnapshotError):
+            Snapshot(self._path)
+
+    def test_missing(self):
+        with self.assertRaises(SnapshotError):
+            Snapshot(os.path.join(self._tmpdir, 'missing'))
+
+    def test_write_returns_inventory(self):
+        inventory = write_snapshot(self._path, self._make_storage(), None,
+                                   self._settings)
+        self.assertSetEqual(set(inventory['nodes']), set(NODES))
+
+    def test_no_fingerprint(self):
+        storage = MemoryStorage(NODES, CLASSES)
+        with self.assertRaises(SnapshotError):
+            write_snapshot(self._path, storage, None, self._settings)
+        self.assertFalse(os.path.exists(self._path))
+
+
+class TestSnapshotStore(SnapshotTestCase):
+
+    def test_get(self):
+        self._write()
+        store = SnapshotStore(self._path, self._settings)
+        snapshot = store.get()
+        self.assertIsNotNone(snapshot)
+        self.assertIs(store.get(), snapshot)
+
+    def test_get_replaced(self):
+        self._write()
+        store = SnapshotStore(self._path, self._settings)
+        snapshot = store.get()
+        self._write()
+        self.assertIsNot(store.get(), snapshot)
+        self.assertIsNotNone(store.get())
+
+    def test_get_stale(self):
+        self._write()
+        store = SnapshotStore(self._path, self._settings)
+        with open(self._file, 'a') as fp:
+            fp.write('changed\n')
+        with mock.patch('sys.stderr', new_callable=StringIO) as stderr:
+            self.assertIsNone(store.get())
+            self.assertIsNone(store.get())
+        self.assertEqual(stderr.getvalue().count('is stale'), 1)
+        self._write()
+        self.assertIsNotNone(store.get())
+
+    def test_get_checked_once_per_interval(self):
+        self._write()
+        store = SnapshotStore(self._path, self._settings)
+        self.assertIsNotNone(store.get())
+        with open(self._file, 'a') as fp:
+            fp.write('changed\n')
+        with mock.patch('reclass.utils.fingerprint.stat_key') as stat_key:
+            self.assertIsNotNone(store.get())
+        self.assertFalse(stat_key.called)
+        later = time.time() + CHECK_INTERVAL + 1
+        with mock.patch('time.time', return_value=later), \
+                mock.patch('sys.stderr', new_callable=StringIO):
+            self.assertIsNone(store.get())
+
+    def test_get_other_settings(self):
+        self._write()
+        settings = make_settings('memory', 'nodes', 'classes', ['* one'])
+        store = SnapshotStore(self._path, settings)
+        with mock.patch('sys.stderr', new_callable=StringIO) as stderr:
+            self.assertIsNone(store.get())
+        self.assertIn('different settings', stderr.getvalue())
+
+    def test_get_missing(self):
+        store = SnapshotStore(self._path, self._settings)
+        with mock.patch('sys.stderr', new_callable=StringIO) as stderr:
+            self.assertIsNone(store.get())
+            self.assertIsNone(store.get())
+        self.assertEqual(len(stderr.getvalue().splitlines()), 1)
+        self._write()
+        self.assertIsNotNone(store.get())
+
+    def test_get_quiet(self):
+        store = SnapshotStore(self._path, self._settings, quiet=True)
+        with mock.patch('sys.stderr', new_callable=StringIO) as stderr:
+            self.assertIsNone(store.get())
+        self.assertEqual(stderr.getvalue(), '')
+
+    def test_core(self):
+        self._write()
+        storage = self._make_storage()
+        core = Core(storage, None,
+                    snapshot=SnapshotStore(self._path, self._settings))
+        expected = Core(self._make_storage(), None)
+        with mock.patch.object(storage, 'get_node') as get_node:
+            self.assertDictEqual(_without_timestamp(core.nodeinfo('node1')),
+                    _without_timestamp(expected.nodeinfo('node1')))
+            self.assertSetEqual(set(core.inventory()['nodes']),
+                                set(NODES))
+        self.assertFalse(get_node.called)
+
+    def test_core_stale(self):
+        self._write()
+        storage = self._make_storage()
+        core = Core(storage, None,
+                    snapshot=SnapshotStore(self._path, self._settings))
+        with open(self._file, 'a') as fp:
+            fp.write('changed\n')
+        with mock.patch('sys.stderr', new_callable=StringIO):
+            self.assertEqual(core.nodeinfo('node1')['parameters']['node'],
+                             'one')
+
+if __name__ == '__main__':
+    unittest.main()
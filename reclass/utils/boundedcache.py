@@ -0,0 +1,55 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+
+class BoundedCache(object):
+    '''
+    A cache holding at most maxsize entries, which evicts the entries that
+    have not been used for the longest time.
+
+    Rather than tracking the order in which entries are used, the entries are
+    kept in two generations of at most maxsize/2 entries each: new entries go
+    into the current generation, and entries found in the previous generation
+    are moved back into the current one. Once the current generation is full,
+    it becomes the previous generation and whatever was left in the previous
+    generation is dropped. Looking up an entry that is in use is thus a single
+    dictionary lookup.
+    '''
+
+    def __init__(self, maxsize):
+        self._generation_size = max(maxsize // 2, 1)
+        self._current = {}
+        self._previous = {}
+
+    def __len__(self):
+        return len(self._current) + len(self._previous)
+
+    def __contains__(self, key):
+        return key in self._current or key in self._previous
+
+    def get(self, key, default=None):
+        try:
+            return self._current[key]
+        except KeyError:
+            pass
+        try:
+            value = self._previous.pop(key)
+        except KeyError:
+            return default
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        if len(self._current) >= self._generation_size:
+            self._previous = self._current
+            self._current = {}
+        self._current[key] = value
+
+    def clear(self):
+        self._current = {}
+        self._previous = {}
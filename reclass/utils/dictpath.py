@@ -9,6 +9,8 @@
 
 import types, re
 
+from reclass.utils.boundedcache import BoundedCache
+
 class DictPath(object):
     '''
     Represents a path into a nested dictionary.
@@ -52,22 +54,51 @@ class DictPath(object):
     names) will always be strings. Therefore it is okay to interpret each
     component of the path as a string, unless one finds a list at the current
     level down the nested dictionary.
+
+    DictPath instances are immutable: the components are held in a tuple, the
+    hash is computed only once, and new_subpath() returns a new instance.
+    Paths given as strings are interned per delimiter, so that a path
+    occurring many times is only split once, and all its occurrences share
+    one instance. Only the INTERN_CACHE_SIZE paths used most recently are
+    kept, so that the cache does not grow without bounds in a long-running
+    process.
     '''
 
-    def __init__(self, delim, contents=None):
-        self._delim = delim
+    INTERN_CACHE_SIZE = 65536
+
+    # delimiter → compiled regular expression splitting on the delimiter
+    _splitters = {}
+
+    # (delimiter, string) → DictPath instance
+    _interned = BoundedCache(INTERN_CACHE_SIZE)
+
+    def __new__(cls, delim, contents=None):
+        if isinstance(contents, types.StringTypes):
+            self = DictPath._interned.get((delim, contents))
+            if self is None:
+                self = cls._new(delim, DictPath._split_string(delim, contents))
+                DictPath._interned.put((delim, contents), self)
+            return self
         if contents is None:
-            self._parts = []
+            return cls._new(delim, ())
+        elif isinstance(contents, tuple):
+            return cls._new(delim, contents)
+        elif isinstance(contents, list):
+            return cls._new(delim, tuple(contents))
         else:
-            if isinstance(contents, types.StringTypes):
-                self._parts = self._split_string(contents)
-            elif isinstance(contents, tuple):
-                self._parts = list(contents)
-            elif isinstance(contents, list):
-                self._parts = contents
-            else:
-                raise TypeError('DictPath() takes string or list, '\
-                                'not %s' % type(contents))
+            raise TypeError('DictPath() takes string or list, '\
+                            'not %s' % type(contents))
+
+    @classmethod
+    def _new(cls, delim, parts):
+        self = object.__new__(cls)
+        self._delim = delim
+        self._parts = parts
+        self._hash = None
+        return self
+
+    def __getnewargs__(self):
+        return self._delim, self._parts
 
     def __repr__(self):
         return "DictPath(%r, %r)" % (self._delim, str(self))
@@ -86,7 +117,9 @@ class DictPath(object):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash(str(self))
+        if self._hash is None:
+            self._hash = hash(str(self))
+        return self._hash
 
     def _get_path(self):
         return self._parts
@@ -99,24 +132,30 @@ class DictPath(object):
 
     def _get_innermost_container(self, base):
         container = base
-        for i in self.path[:-1]:
+        parts = self._parts
+        for i in xrange(len(parts) - 1):
             if isinstance(container, (list, tuple)):
-                container = container[int(i)]
+                container = container[int(parts[i])]
             else:
-                container = container[i]
+                container = container[parts[i]]
         return container
 
-    def _split_string(self, string):
-        return re.split(r'(?<!\\)' + re.escape(self._delim), string)
+    @staticmethod
+    def _split_string(delim, string):
+        try:
+            splitter = DictPath._splitters[delim]
+        except KeyError:
+            splitter = re.compile(r'(?<!\\)' + re.escape(delim))
+            DictPath._splitters[delim] = splitter
+        return tuple(splitter.split(string))
 
     def _escape_string(self, string):
         return string.replace(self._delim, '\\' + self._delim)
 
     def new_subpath(self, key):
-        try:
-            return DictPath(self._delim, self._parts + [self._escape_string(key)])
-        except AttributeError as e:
-            return DictPath(self._delim, self._parts + [key])
+        if isinstance(key, types.StringTypes):
+            key = self._escape_string(key)
+        return DictPath(self._delim, self._parts + (key,))
 
     def get_value(self, base):
         return self._get_innermost_container(base)[self._get_key()]
@@ -0,0 +1,75 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+'''
+Fingerprints of the files and directories an inventory is read from: a
+dictionary mapping each path to its modification time, size and inode
+number, or None if the path did not exist.
+
+Creating, removing or renaming a file changes the modification time of its
+directory, so a fingerprint that includes the directories also tells when
+files have been added or removed, without having to list the directories
+again.
+
+Checking a fingerprint stats every path in it, which adds up when it is
+checked for every query. FingerprintWatch therefore checks at most once
+every CHECK_INTERVAL seconds, at the price of not noticing changes made
+within that interval right away.
+'''
+
+import os, time
+
+# the number of seconds after a check found nothing changed, during which
+# FingerprintWatch does not check again
+CHECK_INTERVAL = 1.0
+
+def stat_key(path):
+    '''
+    Returns what a fingerprint records for the path.
+    '''
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size, st.st_ino)
+
+
+def fingerprint(paths):
+    return dict((path, stat_key(path)) for path in paths)
+
+
+def changed_paths(fingerprint):
+    '''
+    Returns the paths whose state is not the one recorded in the fingerprint
+    anymore.
+    '''
+    return [path for path, key in fingerprint.iteritems()
+            if stat_key(path) != key]
+
+
+class FingerprintWatch(object):
+    '''
+    Tells the paths of a fingerprint that have changed, like changed_paths()
+    does, but only checks again once CHECK_INTERVAL seconds have passed since
+    a check found nothing changed. Until then, nothing is reported changed.
+    '''
+    def __init__(self, fingerprint, interval=None):
+        self._fingerprint = fingerprint
+        self._interval = CHECK_INTERVAL if interval is None else interval
+        self._checked = None
+
+    fingerprint = property(lambda self: self._fingerprint)
+
+    def changed_paths(self):
+        now = time.time()
+        if self._checked is not None \
+                and 0 <= now - self._checked < self._interval:
+            return []
+        ret = changed_paths(self._fingerprint)
+        self._checked = None if ret else now
+        return ret
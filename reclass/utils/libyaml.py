@@ -0,0 +1,57 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+'''
+The YAML loader and dumpers to use: the ones backed by libyaml if PyYAML
+was built with it, which are several times faster, or else the pure-Python
+implementations. Both yield identical results.
+'''
+
+import yaml
+from yaml.serializer import Serializer
+from yaml.representer import Representer
+from yaml.resolver import Resolver
+
+try:
+    from yaml.cyaml import CSafeLoader as SafeLoader, CDumper as Dumper, \
+            CEmitter
+    HAVE_LIBYAML = True
+
+except ImportError:
+    from yaml import SafeLoader, Dumper
+    HAVE_LIBYAML = False
+
+IMPLEMENTATION = 'libyaml' if HAVE_LIBYAML else 'pure Python'
+
+if HAVE_LIBYAML:
+
+    class StreamingDumper(CEmitter, Serializer, Representer, Resolver):
+        '''
+        Like yaml.CDumper, but with the serialiser of yaml.Dumper, which can
+        serialise a document piece by piece (see the YAML outputter).
+        '''
+        def __init__(self, stream, default_flow_style=False, encoding=None):
+            CEmitter.__init__(self, stream, encoding=encoding)
+            Representer.__init__(self, default_flow_style=default_flow_style)
+            Resolver.__init__(self)
+            # what Serializer.__init__() sets, except for the state of the
+            # stream, which is kept by the emitter
+            self.use_explicit_start = None
+            self.use_explicit_end = None
+            self.use_version = None
+            self.use_tags = None
+            self.serialized_nodes = {}
+            self.anchors = {}
+            self.last_anchor_id = 0
+
+else:
+    StreamingDumper = Dumper
+
+
+def safe_load(stream):
+    return yaml.load(stream, Loader=SafeLoader)
@@ -0,0 +1,84 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+
+class OrderedSet(object):
+    '''
+    A set of hashable items that remembers the order in which the items were
+    added, with O(1) membership tests, additions and removals.
+
+    The items are kept in a list, alongside a dictionary mapping each item to
+    its position in the list. Removing an item only removes it from the
+    dictionary and leaves a placeholder in the list, which is dropped the next
+    time the items are listed. Adding an item that was removed earlier appends
+    it to the end again.
+    '''
+    _REMOVED = object()
+
+    def __init__(self, iterable=None):
+        self._items = []
+        self._positions = {}
+        if iterable is not None:
+            self.update(iterable)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, item):
+        return item in self._positions
+
+    def __iter__(self):
+        return iter(self.as_list())
+
+    def __eq__(self, rhs):
+        if isinstance(rhs, OrderedSet):
+            return self.as_list() == rhs.as_list()
+        return False
+
+    def __ne__(self, rhs):
+        return not self.__eq__(rhs)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.as_list())
+
+    def add(self, item):
+        '''
+        Appends the item unless it is already contained in the set. Returns
+        whether the item was added.
+        '''
+        if item in self._positions:
+            return False
+        self._positions[item] = len(self._items)
+        self._items.append(item)
+        return True
+
+    def update(self, iterable):
+        for item in iterable:
+            self.add(item)
+
+    def discard(self, item):
+        '''
+        Removes the item if it is contained in the set. Returns whether the
+        item was removed.
+        '''
+        try:
+            position = self._positions.pop(item)
+        except KeyError:
+            return False
+        self._items[position] = OrderedSet._REMOVED
+        return True
+
+    def _compact(self):
+        self._items = [i for i in self._items if i is not OrderedSet._REMOVED]
+        self._positions = dict((item, position) for position, item
+                               in enumerate(self._items))
+
+    def as_list(self):
+        if len(self._items) > len(self._positions):
+            self._compact()
+        return self._items[:]
@@ -0,0 +1,116 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+'''
+A persistent cache of parsed files, so that unchanged files need not be
+parsed again by the next run of reclass.
+
+The cache directory holds one entry per file, named after a hash of the
+absolute path of the file. Each entry records the modification time, size
+and inode number the file had when it was parsed, and is only used while
+the file still has the same ones.
+
+Several processes may share a cache directory: entries are written to a
+temporary file first, which is then renamed into place, so readers either
+see a complete entry or none at all. Entries that cannot be read are
+treated like missing ones.
+
+The entries are written with marshal, which only stores plain data, so
+files whose parsed contents are anything else are not cached. Nonetheless,
+the cache is only used in a directory that is owned by the user running
+reclass and not writable by anyone else (see reclass.utils.privatedir).
+'''
+
+import os, sys, tempfile, time
+import marshal
+from hashlib import sha1
+from reclass.utils.fingerprint import stat_key
+from reclass.utils.privatedir import make_private_dir
+
+# bump whenever the contents of the entries change
+CACHE_FORMAT = 2
+
+# files modified less than this many seconds ago are not cached, as another
+# change within the resolution of the modification time could go unnoticed
+RACY_INTERVAL = 2
+
+
+class ParseCache(object):
+
+    def __init__(self, directory):
+        self._directory = os.path.abspath(os.path.expanduser(directory))
+        reason = make_private_dir(self._directory)
+        # files are parsed every time if the directory cannot be trusted
+        self._enabled = reason is None
+        if not self._enabled:
+            print >>sys.stderr, 'Not caching parsed files: {0}'.format(reason)
+
+    directory = property(lambda self: self._directory)
+    enabled = property(lambda self: self._enabled)
+
+    def _entry_path(self, path):
+        return os.path.join(self._directory, sha1(path).hexdigest())
+
+    def _read_entry(self, entry_path, path, key):
+        try:
+            fp = open(entry_path, 'rb')
+        except IOError:
+            return None
+        try:
+            try:
+                entry = marshal.load(fp)
+            except Exception:
+                # truncated or otherwise unreadable, just parse again
+                return None
+        finally:
+            fp.close()
+        if not isinstance(entry, tuple) or len(entry) != 4:
+            return None
+        if entry[:3] != (CACHE_FORMAT, path, key):
+            return None
+        return entry
+
+    def _write_entry(self, entry_path, entry):
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self._directory,
+                                            prefix='.tmp')
+        except OSError:
+            return
+        try:
+            fp = os.fdopen(fd, 'wb')
+            try:
+                # raises ValueError for anything but plain data
+                marshal.dump(entry, fp)
+            finally:
+                fp.close()
+            os.rename(tmp_path, entry_path)
+        except (IOError, OSError, ValueError):
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def get(self, path, parse):
+        '''
+        Returns what parse(path) returns, from the cache if the file has not
+        changed since it was cached.
+        '''
+        path = os.path.abspath(path)
+        key = stat_key(path)
+        if key is None or not self._enabled:
+            return parse(path)
+
+        entry_path = self._entry_path(path)
+        entry = self._read_entry(entry_path, path, key)
+        if entry is not None:
+            return entry[3]
+
+        data = parse(path)
+        if time.time() - key[0] >= RACY_INTERVAL:
+            self._write_entry(entry_path, (CACHE_FORMAT, path, key, data))
+        return data
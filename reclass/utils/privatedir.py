@@ -0,0 +1,36 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+'''
+Directories holding data that reclass loads again later. Whoever can write
+to such a directory can make reclass load what they like, so the directory
+has to be private to the user running reclass.
+'''
+
+import os, errno, stat
+
+def make_private_dir(path):
+    '''
+    Creates the directory at path, readable and writable only by the current
+    user, unless it exists. Returns why the directory must not be used, or
+    None if it is owned by the current user and nobody else can write to
+    it. Errors other than an existing directory are raised as OSError.
+    '''
+    try:
+        os.makedirs(path, 0700)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+    st = os.stat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        return '{0} is not a directory'.format(path)
+    if st.st_uid != os.getuid():
+        return '{0} is not owned by the current user'.format(path)
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return '{0} is writable by other users'.format(path)
+    return None
@@ -9,6 +9,7 @@
 
 import re
 
+from reclass.utils.boundedcache import BoundedCache
 from reclass.utils.dictpath import DictPath
 from reclass.defaults import PARAMETER_INTERPOLATION_SENTINELS, \
         PARAMETER_INTERPOLATION_DELIMITER
@@ -52,64 +53,91 @@ class RefValue(object):
 
     The markers used to identify references are set in reclass.defaults, as is
     the default delimiter.
+
+    The same strings tend to occur in the parameters of many nodes. A string
+    is therefore only ever parsed once per delimiter: the resulting template
+    (the literal strings, the references, and their DictPath instances) is
+    kept in a cache of immutable tuples, which all RefValue instances of that
+    string share. As the cache is process-wide and lives as long as e.g. the
+    Salt master does, it only holds the TEMPLATE_CACHE_SIZE templates used
+    most recently.
     '''
 
     INTERPOLATION_RE = re.compile(_RE)
 
+    TEMPLATE_CACHE_SIZE = 65536
+
+    # (string, delimiter) → (strings, refs, paths)
+    _templates = BoundedCache(TEMPLATE_CACHE_SIZE)
+
     def __init__(self, string, delim=PARAMETER_INTERPOLATION_DELIMITER):
-        self._strings = []
-        self._refs = []
         self._delim = delim
-        self._parse(string)
-
-    def _parse(self, string):
+        template = RefValue._templates.get((string, delim))
+        if template is None:
+            template = RefValue._parse(string, delim)
+            RefValue._templates.put((string, delim), template)
+        self._strings, self._refs, self._paths = template
+
+    @staticmethod
+    def _parse(string, delim):
         parts = RefValue.INTERPOLATION_RE.split(string)
-        self._refs = parts[1:][::2]
-        self._strings = parts[0:][::2]
-        self._check_strings(string)
-
-    def _check_strings(self, orig):
-        for s in self._strings:
+        refs = tuple(parts[1::2])
+        strings = tuple(parts[0::2])
+        RefValue._check_strings(string, strings)
+        paths = tuple(DictPath(delim, ref) for ref in refs)
+        return strings, refs, paths
+
+    @staticmethod
+    def _check_strings(orig, strings):
+        for s in strings:
             pos = s.find(PARAMETER_INTERPOLATION_SENTINELS[0])
             if pos >= 0:
                 raise IncompleteInterpolationError(orig,
                                                    PARAMETER_INTERPOLATION_SENTINELS[1])
 
-    def _resolve(self, ref, context):
-        path = DictPath(self._delim, ref)
+    @staticmethod
+    def _resolve(ref, path, context):
         try:
             return path.get_value(context)
         except KeyError as e:
             raise UndefinedVariableError(ref)
 
+    delimiter = property(lambda self: self._delim)
+
     def has_references(self):
         return len(self._refs) > 0
 
     def get_references(self):
         return self._refs
 
+    def get_reference_paths(self):
+        return self._paths
+
     def _assemble(self, resolver):
         if not self.has_references():
             return self._strings[0]
 
-        if self._strings == ['', '']:
+        if self._strings == ('', ''):
             # preserve the type of the referenced variable
-            return resolver(self._refs[0])
+            return resolver(0)
 
-        # reassemble the string by taking a string and str(ref) pairwise
-        ret = ''
-        for i in range(0, len(self._refs)):
-            ret += self._strings[i] + str(resolver(self._refs[i]))
+        # reassemble the string by joining the strings and str(ref) pairwise
+        parts = []
+        for i in xrange(len(self._refs)):
+            parts.append(self._strings[i])
+            parts.append(str(resolver(i)))
         if len(self._strings) > len(self._refs):
             # and finally append a trailing string, if any
-            ret += self._strings[-1]
-        return ret
+            parts.append(self._strings[-1])
+        return ''.join(parts)
 
     def render(self, context):
-        resolver = lambda s: self._resolve(s, context)
+        resolver = lambda i: RefValue._resolve(self._refs[i], self._paths[i],
+                                               context)
         return self._assemble(resolver)
 
     def __repr__(self):
-        do_not_resolve = lambda s: s.join(PARAMETER_INTERPOLATION_SENTINELS)
+        do_not_resolve = lambda i: \
+                self._refs[i].join(PARAMETER_INTERPOLATION_SENTINELS)
         return 'RefValue(%r, %r)' % (self._assemble(do_not_resolve),
                                      self._delim)
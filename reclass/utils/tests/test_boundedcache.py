@@ -0,0 +1,48 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass.utils.boundedcache import BoundedCache
+import unittest
+
+class TestBoundedCache(unittest.TestCase):
+
+    def test_get_put(self):
+        c = BoundedCache(4)
+        self.assertIsNone(c.get('a'))
+        c.put('a', 1)
+        self.assertEqual(c.get('a'), 1)
+        self.assertIn('a', c)
+        self.assertEqual(c.get('b', 2), 2)
+
+    def test_bounded(self):
+        c = BoundedCache(4)
+        for i in range(100):
+            c.put(i, i)
+            self.assertLessEqual(len(c), 4)
+        self.assertNotIn(0, c)
+        self.assertEqual(c.get(99), 99)
+
+    def test_keeps_recently_used(self):
+        c = BoundedCache(4)
+        c.put('a', 1)
+        c.put('b', 2)
+        c.put('c', 3)
+        self.assertEqual(c.get('a'), 1)
+        c.put('d', 4)
+        c.put('e', 5)
+        self.assertIn('a', c)
+        self.assertNotIn('b', c)
+
+    def test_clear(self):
+        c = BoundedCache(4)
+        c.put('a', 1)
+        c.clear()
+        self.assertEqual(len(c), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,33 +6,39 @@
 # Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
 # Released under the terms of the Artistic Licence 2.0
 #
+from reclass.utils.boundedcache import BoundedCache
 from reclass.utils.dictpath import DictPath
+import pickle
 import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
 
 class TestDictPath(unittest.TestCase):
 
     def test_constructor0(self):
         p = DictPath(':')
-        self.assertListEqual(p._parts, [])
+        self.assertTupleEqual(p._parts, ())
 
     def test_constructor_list(self):
         l = ['a', 'b', 'c']
         p = DictPath(':', l)
-        self.assertListEqual(p._parts, l)
+        self.assertTupleEqual(p._parts, tuple(l))
 
     def test_constructor_str(self):
         delim = ':'
         s = 'a{0}b{0}c'.format(delim)
         l = ['a', 'b', 'c']
         p = DictPath(delim, s)
-        self.assertListEqual(p._parts, l)
+        self.assertTupleEqual(p._parts, tuple(l))
 
     def test_constructor_str_escaped(self):
         delim = ':'
         s = 'a{0}b\{0}b{0}c'.format(delim)
         l = ['a', 'b\\{0}b'.format(delim), 'c']
         p = DictPath(delim, s)
-        self.assertListEqual(p._parts, l)
+        self.assertTupleEqual(p._parts, tuple(l))
 
     def test_constructor_invalid_type(self):
         with self.assertRaises(TypeError):
@@ -74,13 +80,13 @@ class TestDictPath(unittest.TestCase):
     def test_path_accessor(self):
         l = ['a', 'b', 'c']
         p = DictPath(':', l)
-        self.assertListEqual(p.path, l)
+        self.assertTupleEqual(p.path, tuple(l))
 
     def test_new_subpath(self):
         l = ['a', 'b', 'c']
         p = DictPath(':', l[:-1])
         p = p.new_subpath(l[-1])
-        self.assertListEqual(p.path, l)
+        self.assertTupleEqual(p.path, tuple(l))
 
     def test_get_value(self):
         v = 42
@@ -154,5 +160,45 @@ class TestDictPath(unittest.TestCase):
         with self.assertRaises(KeyError):
             p.set_value(dict(), 42)
 
+    def test_constructor_tuple(self):
+        t = ('a', 'b', 'c')
+        p = DictPath(':', t)
+        self.assertIs(p.path, t)
+
+    def test_new_subpath_escaped(self):
+        p = DictPath(':', ['a']).new_subpath('b:b')
+        self.assertEqual(p, DictPath(':', 'a:b\\:b'))
+
+    def test_new_subpath_unchanged(self):
+        p1 = DictPath(':', ['a'])
+        p2 = p1.new_subpath('b')
+        self.assertTupleEqual(p1.path, ('a',))
+        self.assertNotEqual(p1, p2)
+
+    def test_hash(self):
+        p1 = DictPath(':', 'a:b')
+        p2 = DictPath(':', ['a']).new_subpath('b')
+        self.assertEqual(hash(p1), hash(p2))
+        self.assertEqual(hash(p1), hash(p1))
+        self.assertIn(p2, {p1: True})
+
+    def test_interned(self):
+        p1 = DictPath(':', 'a:b')
+        self.assertIs(DictPath(':', 'a:b'), p1)
+        self.assertIsNot(DictPath('/', 'a:b'), p1)
+        self.assertIsNot(DictPath(':', ['a', 'b']), p1)
+
+    def test_interned_bounded(self):
+        with mock.patch.object(DictPath, '_interned', BoundedCache(4)):
+            for i in range(100):
+                DictPath(':', 'a:%d' % i)
+            self.assertLessEqual(len(DictPath._interned), 4)
+            self.assertIn((':', 'a:99'), DictPath._interned)
+
+    def test_pickle(self):
+        p = DictPath(':', 'a:b')
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertEqual(pickle.loads(pickle.dumps(p, protocol)), p)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,64 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass.utils.fingerprint import fingerprint, changed_paths, \
+        FingerprintWatch
+import os, shutil, tempfile, time
+import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+class TestFingerprint(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self._path = os.path.join(self._tmpdir, 'file')
+        with open(self._path, 'w') as fp:
+            fp.write('file\n')
+        self._missing = os.path.join(self._tmpdir, 'missing')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def _change(self):
+        with open(self._path, 'a') as fp:
+            fp.write('changed\n')
+
+    def test_changed_paths(self):
+        f = fingerprint([self._path, self._missing])
+        self.assertIsNone(f[self._missing])
+        self.assertListEqual(changed_paths(f), [])
+        self._change()
+        self.assertListEqual(changed_paths(f), [self._path])
+
+    def test_watch_interval(self):
+        watch = FingerprintWatch(fingerprint([self._path]), interval=60)
+        self.assertListEqual(watch.changed_paths(), [])
+        self._change()
+        with mock.patch('reclass.utils.fingerprint.stat_key') as stat_key:
+            self.assertListEqual(watch.changed_paths(), [])
+        self.assertFalse(stat_key.called)
+        with mock.patch('time.time', return_value=time.time() + 61):
+            self.assertListEqual(watch.changed_paths(), [self._path])
+
+    def test_watch_changed_checked_again(self):
+        watch = FingerprintWatch(fingerprint([self._path]), interval=60)
+        self._change()
+        self.assertListEqual(watch.changed_paths(), [self._path])
+        self.assertListEqual(watch.changed_paths(), [self._path])
+
+    def test_watch_no_interval(self):
+        watch = FingerprintWatch(fingerprint([self._path]), interval=0)
+        self.assertListEqual(watch.changed_paths(), [])
+        self._change()
+        self.assertListEqual(watch.changed_paths(), [self._path])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass.utils import libyaml
+from reclass.storage.yaml_fs.yamlfile import YamlFile
+from reclass.output.yaml_outputter import Outputter, StreamingOutputter
+from StringIO import StringIO
+import os
+import tempfile
+import yaml
+import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+DOCUMENT = u'''
+classes:
+  - one
+  - two
+applications:
+  - ~alpha
+parameters:
+  string: plain
+  unicode: ünïcode
+  quoted: "line\\nbreak"
+  folded: >
+    a folded
+    string
+  numbers: [1, 1.5, 0x10, 1e3, .inf]
+  booleans: [yes, off, true]
+  nothing: ~
+  date: 2014-01-01
+  anchored: &anchor
+    key: value
+  alias: *anchor
+  merged:
+    <<: *anchor
+    other: value
+'''
+
+PURE_PYTHON = {'SafeLoader': yaml.SafeLoader, 'Dumper': yaml.Dumper,
+               'StreamingDumper': yaml.Dumper}
+
+
+@unittest.skipUnless(libyaml.HAVE_LIBYAML, 'PyYAML was built without libyaml')
+class TestLibyaml(unittest.TestCase):
+
+    def setUp(self):
+        fd, self._path = tempfile.mkstemp(suffix='.yml')
+        os.write(fd, DOCUMENT.encode('utf-8'))
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self._path)
+
+    def test_implementation(self):
+        self.assertEqual(libyaml.IMPLEMENTATION, 'libyaml')
+        self.assertIs(libyaml.SafeLoader, yaml.CSafeLoader)
+
+    def test_identical_entities(self):
+        entity = YamlFile(self._path).get_entity()
+        with mock.patch.multiple(libyaml, **PURE_PYTHON):
+            expected = YamlFile(self._path).get_entity()
+        self.assertEqual(entity, expected)
+        self.assertEqual(entity.parameters.as_dict()['unicode'], u'ünïcode')
+
+    def test_identical_output(self):
+        data = {'nodes': {'node': libyaml.safe_load(DOCUMENT)}}
+        data['nodes']['other'] = libyaml.safe_load(DOCUMENT)
+        for pretty_print in (False, True):
+            stream = StringIO()
+            StreamingOutputter().dump_to(data, stream, pretty_print)
+            ret = Outputter().dump(data, pretty_print)
+            with mock.patch.multiple(libyaml, **PURE_PYTHON):
+                expected = Outputter().dump(data, pretty_print)
+            self.assertEqual(ret, expected)
+            self.assertEqual(stream.getvalue(), expected)
+
+if __name__ == '__main__':
+    unittest.main()
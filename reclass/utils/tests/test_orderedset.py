@@ -0,0 +1,62 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass.utils.orderedset import OrderedSet
+import unittest
+
+class TestOrderedSet(unittest.TestCase):
+
+    def test_empty(self):
+        s = OrderedSet()
+        self.assertEqual(len(s), 0)
+        self.assertListEqual(s.as_list(), [])
+
+    def test_order(self):
+        s = OrderedSet(['c', 'a', 'b'])
+        self.assertListEqual(s.as_list(), ['c', 'a', 'b'])
+
+    def test_add_unique(self):
+        s = OrderedSet(['a', 'b'])
+        self.assertFalse(s.add('a'))
+        self.assertTrue(s.add('c'))
+        self.assertListEqual(s.as_list(), ['a', 'b', 'c'])
+
+    def test_contains(self):
+        s = OrderedSet(['a'])
+        self.assertIn('a', s)
+        self.assertNotIn('b', s)
+
+    def test_discard(self):
+        s = OrderedSet(['a', 'b', 'c'])
+        self.assertTrue(s.discard('b'))
+        self.assertFalse(s.discard('d'))
+        self.assertNotIn('b', s)
+        self.assertEqual(len(s), 2)
+        self.assertListEqual(s.as_list(), ['a', 'c'])
+
+    def test_readd_after_discard(self):
+        s = OrderedSet(['a', 'b', 'c'])
+        s.discard('a')
+        s.add('a')
+        self.assertListEqual(s.as_list(), ['b', 'c', 'a'])
+        s.discard('c')
+        self.assertListEqual(s.as_list(), ['b', 'a'])
+        s.add('d')
+        self.assertListEqual(list(s), ['b', 'a', 'd'])
+
+    def test_as_list_copy(self):
+        s = OrderedSet(['a'])
+        s.as_list().append('b')
+        self.assertListEqual(s.as_list(), ['a'])
+
+    def test_equality(self):
+        self.assertEqual(OrderedSet(['a', 'b']), OrderedSet(['a', 'b']))
+        self.assertNotEqual(OrderedSet(['a', 'b']), OrderedSet(['b', 'a']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass.utils.parsecache import ParseCache, RACY_INTERVAL
+from reclass.storage.yaml_fs.yamlfile import YamlFile
+
+import datetime, os, shutil, tempfile, time
+from StringIO import StringIO
+import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self._cachedir = os.path.join(self._tmpdir, 'cache')
+        self._path = os.path.join(self._tmpdir, 'file.yml')
+        self._write('parameters: {foo: bar}\n')
+        self._parse = mock.Mock(side_effect=lambda path: open(path).read())
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def _write(self, contents, age=60):
+        with open(self._path, 'w') as fp:
+            fp.write(contents)
+        mtime = time.time() - age
+        os.utime(self._path, (mtime, mtime))
+
+    def _entries(self):
+        return [f for f in os.listdir(self._cachedir) if f[0] != '.']
+
+    def test_creates_directory(self):
+        c = ParseCache(self._cachedir)
+        self.assertTrue(os.path.isdir(c.directory))
+
+    def test_hit(self):
+        c = ParseCache(self._cachedir)
+        self.assertEqual(c.get(self._path, self._parse),
+                         'parameters: {foo: bar}\n')
+        self.assertEqual(c.get(self._path, self._parse),
+                         'parameters: {foo: bar}\n')
+        self.assertEqual(self._parse.call_count, 1)
+
+    def test_shared_between_instances(self):
+        ParseCache(self._cachedir).get(self._path, self._parse)
+        c = ParseCache(self._cachedir)
+        c.get(self._path, self._parse)
+        self.assertEqual(self._parse.call_count, 1)
+
+    def test_changed_file(self):
+        c = ParseCache(self._cachedir)
+        c.get(self._path, self._parse)
+        self._write('parameters: {foo: baz, bar: qux}\n')
+        self.assertEqual(c.get(self._path, self._parse),
+                         'parameters: {foo: baz, bar: qux}\n')
+        self.assertEqual(self._parse.call_count, 2)
+        self.assertEqual(len(self._entries()), 1)
+
+    def test_changed_mtime(self):
+        c = ParseCache(self._cachedir)
+        c.get(self._path, self._parse)
+        self._write('parameters: {foo: baz}\n', age=30)
+        self.assertEqual(c.get(self._path, self._parse),
+                         'parameters: {foo: baz}\n')
+
+    def test_replaced_file(self):
+        c = ParseCache(self._cachedir)
+        c.get(self._path, self._parse)
+        mtime = os.stat(self._path).st_mtime
+        other = os.path.join(self._tmpdir, 'other.yml')
+        with open(other, 'w') as fp:
+            fp.write('parameters: {foo: baz}\n')
+        os.utime(other, (mtime, mtime))
+        os.rename(other, self._path)
+        self.assertEqual(c.get(self._path, self._parse),
+                         'parameters: {foo: baz}\n')
+
+    def test_recently_modified_not_cached(self):
+        self._write('parameters: {foo: bar}\n', age=RACY_INTERVAL / 2.0)
+        c = ParseCache(self._cachedir)
+        c.get(self._path, self._parse)
+        c.get(self._path, self._parse)
+        self.assertEqual(self._parse.call_count, 2)
+        self.assertListEqual(self._entries(), [])
+
+    def test_corrupt_entry(self):
+        c = ParseCache(self._cachedir)
+        c.get(self._path, self._parse)
+        entry = os.path.join(self._cachedir, self._entries()[0])
+        with open(entry, 'r+b') as fp:
+            fp.truncate(10)
+        self.assertEqual(c.get(self._path, self._parse),
+                         'parameters: {foo: bar}\n')
+        c.get(self._path, self._parse)
+        self.assertEqual(self._parse.call_count, 2)
+
+    def test_unwritable_directory(self):
+        c = ParseCache(self._cachedir)
+        with mock.patch('tempfile.mkstemp', side_effect=OSError):
+            self.assertEqual(c.get(self._path, self._parse),
+                             'parameters: {foo: bar}\n')
+        self.assertListEqual(self._entries(), [])
+
+    def test_writable_by_others(self):
+        os.mkdir(self._cachedir)
+        os.chmod(self._cachedir, 0777)
+        with mock.patch('sys.stderr', new_callable=StringIO) as stderr:
+            c = ParseCache(self._cachedir)
+        self.assertFalse(c.enabled)
+        self.assertIn('writable by other users', stderr.getvalue())
+        c.get(self._path, self._parse)
+        c.get(self._path, self._parse)
+        self.assertEqual(self._parse.call_count, 2)
+        self.assertListEqual(self._entries(), [])
+
+    def test_owned_by_other_user(self):
+        os.mkdir(self._cachedir)
+        with mock.patch('os.getuid', return_value=os.getuid() + 1), \
+                mock.patch('sys.stderr', new_callable=StringIO) as stderr:
+            c = ParseCache(self._cachedir)
+        self.assertFalse(c.enabled)
+        self.assertIn('not owned by the current user', stderr.getvalue())
+
+    def test_not_plain_data(self):
+        c = ParseCache(self._cachedir)
+        parse = mock.Mock(return_value={'date': datetime.date(2014, 1, 1)})
+        c.get(self._path, parse)
+        self.assertEqual(c.get(self._path, parse),
+                         {'date': datetime.date(2014, 1, 1)})
+        self.assertEqual(parse.call_count, 2)
+        self.assertListEqual(self._entries(), [])
+
+    def test_yamlfile(self):
+        c = ParseCache(self._cachedir)
+        expected = YamlFile(self._path).get_entity('file')
+        self.assertEqual(YamlFile(self._path, c).get_entity('file'), expected)
+        with mock.patch.object(YamlFile, '_parse') as parse:
+            self.assertEqual(YamlFile(self._path, c).get_entity('file'),
+                             expected)
+        self.assertFalse(parse.called)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+#
+# -*- coding: utf-8 -*-
+#
+# This file is part of reclass (http://github.com/madduck/reclass)
+#
+# Copyright © 2007–14 martin f. krafft <madduck@madduck.net>
+# Released under the terms of the Artistic Licence 2.0
+#
+from reclass.utils.privatedir import make_private_dir
+import os, shutil, stat, tempfile
+import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+class TestPrivateDir(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self._path = os.path.join(self._tmpdir, 'a', 'b')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def test_created(self):
+        self.assertIsNone(make_private_dir(self._path))
+        mode = os.stat(self._path).st_mode
+        self.assertEqual(stat.S_IMODE(mode) & 0077, 0)
+
+    def test_existing(self):
+        os.makedirs(self._path, 0755)
+        self.assertIsNone(make_private_dir(self._path))
+
+    def test_group_writable(self):
+        os.makedirs(self._path)
+        os.chmod(self._path, 0770)
+        self.assertIsNotNone(make_private_dir(self._path))
+
+    def test_other_owner(self):
+        os.makedirs(self._path)
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            self.assertIsNotNone(make_private_dir(self._path))
+
+    def test_not_a_directory(self):
+        open(os.path.join(self._tmpdir, 'file'), 'w').close()
+        self.assertIsNotNone(
+                make_private_dir(os.path.join(self._tmpdir, 'file')))
+
+    def test_error(self):
+        open(os.path.join(self._tmpdir, 'file'), 'w').close()
+        with self.assertRaises(OSError):
+            make_private_dir(os.path.join(self._tmpdir, 'file', 'sub'))
+
+if __name__ == '__main__':
+    unittest.main()
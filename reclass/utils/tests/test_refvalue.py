@@ -7,12 +7,17 @@
 # Released under the terms of the Artistic Licence 2.0
 #
 
+from reclass.utils.boundedcache import BoundedCache
 from reclass.utils.refvalue import RefValue
 from reclass.defaults import PARAMETER_INTERPOLATION_SENTINELS, \
         PARAMETER_INTERPOLATION_DELIMITER
 from reclass.errors import UndefinedVariableError, \
         IncompleteInterpolationError
 import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
 
 def _var(s):
     return '%s%s%s' % (PARAMETER_INTERPOLATION_SENTINELS[0], s,
@@ -123,5 +128,28 @@ class TestRefValue(unittest.TestCase):
         with self.assertRaises(IncompleteInterpolationError):
             tv = RefValue(s)
 
+    def test_template_parsed_once(self):
+        s = _var('favcolour') + ' and ' + _var('int')
+        tv1 = RefValue(s)
+        tv2 = RefValue(s)
+        self.assertIs(tv1._strings, tv2._strings)
+        self.assertIs(tv1._paths, tv2._paths)
+        self.assertEqual(tv2.render(CONTEXT), 'yellow and 1')
+
+    def test_template_per_delimiter(self):
+        s = _var('motd/greeting')
+        self.assertEqual(RefValue(s, '/').render(CONTEXT),
+                         CONTEXT['motd']['greeting'])
+        with self.assertRaises(UndefinedVariableError):
+            RefValue(s, ':').render(CONTEXT)
+
+    def test_template_cache_bounded(self):
+        with mock.patch.object(RefValue, '_templates', BoundedCache(4)):
+            for i in range(100):
+                RefValue(_var('ref%d' % i))
+            self.assertLessEqual(len(RefValue._templates), 4)
+            self.assertIn((_var('ref99'), PARAMETER_INTERPOLATION_DELIMITER),
+                          RefValue._templates)
+
 if __name__ == '__main__':
     unittest.main()